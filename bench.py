@@ -0,0 +1,570 @@
+"""
+Benchmarks of the search paths, run against a project database.
+
+    python bench.py corpus --out tickets.jsonl [--tickets 5000] [--project PRJ]
+    python bench.py search --project PRJ [--corpus tickets.jsonl] [--samples 200] [--top-n 5]
+    python bench.py storage --project PRJ [--corpus tickets.jsonl] [--samples 200] [--top-n 5]
+    python bench.py vectors (--project PRJ | --synthetic 100000) [--options float:384 int8:384 bit:384 int8:128] [--samples 200] [--top-n 10]
+    python bench.py backends (--project PRJ | --synthetic 100000) [--samples 200] [--top-n 10] [--batch 32]
+    python bench.py ann (--project PRJ | --synthetic 1000000) [--lists 0] [--probes 1 2 4 8 16 32] [--top-n 10]
+    python bench.py batching [--clients 8] [--windows 0 1 2 5 10] [--queries 400]
+
+The queries are derived from the project's own tickets and each query's relevant
+ticket is the one it was derived from, so recall@k needs no labelled data.
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import re
+import statistics
+import tempfile
+import threading
+import time
+from dotenv import load_dotenv
+
+# Load environment variables from .env file
+load_dotenv()
+
+import numpy as np
+from embedding import QueryBatcher, make_query_vector, make_vectors, query_cache
+from quantization import FULL_DIMS, is_compact
+from search_backends import IvfIndex, NumpyIndex
+from sqlite import (
+    JSON_FIELD,
+    SEARCH_MODES,
+    TICKET_COLUMNS,
+    db_pool,
+    del_project_db,
+    full_vectors,
+    indexed_search,
+    init_project_db,
+    insert_tickets,
+    load_full_json,
+    lookup_tickets,
+    result_cache,
+    search_tickets,
+    upsert_tickets,
+    vector_options,
+    vector_search,
+)
+from util import init_logger
+
+
+def load_corpus(project_name: str, corpus_path: str):
+    """
+    Load a JSON-lines file of tickets into a project, creating the project if needed.
+    """
+    db_path = os.path.join(os.getenv("DB_DIR", "databases"), f"{project_name}.db")
+    if not os.path.exists(db_path):
+        init_project_db(project_name)
+    with open(corpus_path, encoding="utf-8") as f:
+        tickets = [line for line in f if line.strip()]
+    started = time.perf_counter()
+    counts = upsert_tickets(project_name, tickets)
+    print(f"Loaded {len(tickets)} tickets in {time.perf_counter() - started:.1f}s: {counts}")
+
+
+def write_corpus(args):
+    """
+    Write a JSON-lines file of synthetic tickets shaped like parse_issue_2_json output.
+
+    Summaries and descriptions are drawn from a fixed vocabulary, with description
+    lengths spread like those of real tickets: mostly a few sentences, some pages long.
+    """
+    rng = random.Random(args.seed)
+    words = ("login timeout export report billing migration upload crash search dashboard email invoice "
+             "permission cache latency error retry payment account session token database index query "
+             "customer release deploy config webhook sync import schedule mobile browser api service").split()
+    statuses = ["To Do", "In Progress", "In Review", "Done"]
+    priorities = ["Lowest", "Low", "Medium", "High", "Highest"]
+    people = [f"Developer {i}" for i in range(40)]
+    with open(args.out, "w", encoding="utf-8") as f:
+        for i in range(args.tickets):
+            topic = rng.sample(words, 3)
+            sentences = max(1, int(rng.lognormvariate(1.6, 0.9)))
+            description = " ".join(
+                " ".join([rng.choice(topic)] + [rng.choice(words) for _ in range(rng.randint(6, 16))]).capitalize() + "."
+                for _ in range(sentences))
+            created = 1735689600 + rng.randint(0, 300 * 86400)
+            updated = created + rng.randint(0, 60 * 86400)
+            ticket = {
+                "key": f"{args.project}-{i + 1}",
+                "summary": " ".join(topic + [rng.choice(words)]).capitalize(),
+                "description": description,
+                "status": rng.choice(statuses),
+                "assignee": rng.choice(people + [None]),
+                "reporter": rng.choice(people),
+                "created": time.strftime("%Y-%m-%dT%H:%M:%S.000+0000", time.gmtime(created)),
+                "updated": time.strftime("%Y-%m-%dT%H:%M:%S.000+0000", time.gmtime(updated)),
+                "priority": rng.choice(priorities),
+                "labels": rng.sample(words, rng.randint(0, 3)),
+                "components": rng.sample(["Backend", "Frontend", "Billing", "Mobile", "Platform"], rng.randint(1, 2)),
+                "issue_type": rng.choice(["Task", "Bug", "Story"]),
+            }
+            f.write(json.dumps(ticket) + "\n")
+    print(f"Wrote {args.tickets} tickets to {args.out}")
+
+
+def sample_queries(project_name: str, samples: int, seed: int) -> list:
+    """
+    Build (kind, query, expected ticket id) triples from a sample of the project's tickets.
+
+    Kinds: 'key' is the issue key, 'term' the longest word of the summary and 'text'
+    the whole summary.
+    """
+    with db_pool.connection(project_name) as conn:
+        rows = conn.execute("SELECT ticket_id, summary FROM jira_tickets WHERE summary != ''").fetchall()
+    random.Random(seed).shuffle(rows)
+    queries = []
+    for ticket_id, summary in rows[:samples]:
+        queries.append(("key", ticket_id, ticket_id))
+        words = re.findall(r"\w{4,}", summary)
+        if words:
+            queries.append(("term", max(words, key=len), ticket_id))
+        queries.append(("text", summary, ticket_id))
+    return queries
+
+
+def percentile(values: list, fraction: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def bench_search(args):
+    if args.corpus:
+        load_corpus(args.project, args.corpus)
+    queries = sample_queries(args.project, args.samples, args.seed)
+    if not queries:
+        print(f"No tickets to derive queries from in project '{args.project}'")
+        return
+
+    print(f"{len(queries)} queries, recall@{args.top_n}, cold query embedding")
+    print("| mode | kind | queries | recall | p50 ms | p95 ms |")
+    print("|---|---|---|---|---|---|")
+    for mode in args.modes:
+        for kind in ("key", "term", "text"):
+            hits = 0
+            latencies = []
+            selected = [(query, expected) for query_kind, query, expected in queries if query_kind == kind]
+            for query, expected in selected:
+                # Measure uncached searches
+                query_cache.clear()
+                result_cache.bump(args.project)
+                started = time.perf_counter()
+                result = search_tickets(args.project, query, top_n=args.top_n, mode=mode)
+                latencies.append((time.perf_counter() - started) * 1000)
+                if isinstance(result, str) and not result.startswith("Err"):
+                    hits += any(ticket["ticket_id"] == expected for ticket in json.loads(result))
+            if selected:
+                print(f"| {mode} | {kind} | {len(selected)} | {hits / len(selected):.3f} "
+                      f"| {statistics.median(latencies):.1f} | {percentile(latencies, 0.95):.1f} |")
+
+
+def timed_searches(project_name: str, queries: list, top_n: int, fields) -> list:
+    """
+    Run uncached searches and return their latencies in milliseconds.
+    """
+    latencies = []
+    for query in queries:
+        result_cache.bump(project_name)
+        started = time.perf_counter()
+        search_tickets(project_name, query, top_n=top_n, fields=fields)
+        latencies.append((time.perf_counter() - started) * 1000)
+    return latencies
+
+
+def bench_storage(args):
+    if args.corpus:
+        load_corpus(args.project, args.corpus)
+    db_path = os.path.join(os.getenv("DB_DIR", "databases"), f"{args.project}.db")
+
+    with db_pool.connection(args.project) as conn:
+        # Count the pages in the WAL as part of the database file
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        ticket_ids = [ticket_id for ticket_id, in conn.execute("SELECT ticket_id FROM jira_tickets")]
+        stored, = conn.execute("SELECT COALESCE(SUM(LENGTH(data)), 0) FROM jira_ticket_json").fetchone()
+        started = time.perf_counter()
+        texts = load_full_json(conn, args.project, ticket_ids)
+        load_seconds = time.perf_counter() - started
+        try:
+            tables = conn.execute("SELECT name, SUM(pgsize) FROM dbstat GROUP BY name ORDER BY 2 DESC").fetchall()
+        except Exception:
+            # SQLite built without the dbstat table
+            tables = []
+    raw = sum(len(text.encode("utf-8")) for text in texts.values())
+    if not texts:
+        print(f"No tickets in project '{args.project}'")
+        return
+
+    file_size = sum(os.path.getsize(db_path + suffix) for suffix in ("", "-wal") if os.path.exists(db_path + suffix))
+    print(f"{len(texts)} tickets, database file {file_size / 1e6:.2f} MB")
+    print("| full_json | bytes | bytes/ticket |")
+    print("|---|---|---|")
+    print(f"| uncompressed | {raw} | {raw / len(texts):.0f} |")
+    print(f"| compressed | {stored} | {stored / len(texts):.0f} |")
+    print(f"Compression ratio {raw / max(stored, 1):.2f}, read and decompress "
+          f"{load_seconds / len(texts) * 1e6:.1f} us/ticket")
+    if tables:
+        print("| table | bytes |")
+        print("|---|---|")
+        for name, size in tables[:10]:
+            print(f"| {name} | {size} |")
+
+    queries = [text for kind, text, _ in sample_queries(args.project, args.samples, args.seed) if kind == "text"]
+    # Embed every query once, so only the storage path differs between the runs
+    timed_searches(args.project, queries, args.top_n, None)
+    print(f"{len(queries)} searches, top {args.top_n}")
+    print("| fields | p50 ms | p95 ms |")
+    print("|---|---|---|")
+    for label, fields in (("default (no full_json)", None), ("with full_json", TICKET_COLUMNS + [JSON_FIELD, "distance"])):
+        latencies = timed_searches(args.project, queries, args.top_n, fields)
+        print(f"| {label} | {statistics.median(latencies):.2f} | {percentile(latencies, 0.95):.2f} |")
+
+    # get_tickets reads the same rows by key, without the embedding
+    random.Random(args.seed).shuffle(ticket_ids)
+    lookups = [ticket_ids[start:start + args.top_n] for start in range(0, min(len(ticket_ids), args.samples * args.top_n), args.top_n)]
+    print(f"{len(lookups)} get_tickets lookups of {args.top_n} tickets")
+    print("| fields | p50 ms | p95 ms |")
+    print("|---|---|---|")
+    for label, fields in (("default (no full_json)", None), ("with full_json", TICKET_COLUMNS + [JSON_FIELD])):
+        latencies = []
+        for keys in lookups:
+            started = time.perf_counter()
+            lookup_tickets(args.project, keys, fields)
+            latencies.append((time.perf_counter() - started) * 1000)
+        print(f"| {label} | {statistics.median(latencies):.3f} | {percentile(latencies, 0.95):.3f} |")
+
+
+def table_sizes(conn, prefix: str) -> int:
+    """
+    Return the bytes of the tables whose name starts with prefix, or 0 without dbstat.
+    """
+    try:
+        size, = conn.execute("SELECT COALESCE(SUM(pgsize), 0) FROM dbstat WHERE name LIKE ?", (prefix + "%",)).fetchone()
+        return size
+    except Exception:
+        return 0
+
+
+def synthetic_vectors(count: int, samples: int, seed: int) -> tuple:
+    """
+    Build clustered vectors resembling embeddings of tickets on a limited set of topics,
+    and queries close to a sample of them.
+
+    Returns:
+        tuple: (vectors, queries) as float32 matrices.
+    """
+    rng = np.random.RandomState(seed)
+    centers = rng.standard_normal((256, FULL_DIMS)).astype(np.float32)
+    vectors = np.empty((count, FULL_DIMS), dtype=np.float32)
+    for start in range(0, count, 65536):
+        batch = min(65536, count - start)
+        vectors[start:start + batch] = centers[rng.randint(0, 256, batch)] + 0.5 * rng.standard_normal((batch, FULL_DIMS))
+    picked = rng.choice(count, samples, replace=False)
+    queries = vectors[picked] + 0.1 * rng.standard_normal((samples, FULL_DIMS)).astype(np.float32)
+    return vectors, queries
+
+
+def bench_vectors(args):
+    if args.synthetic:
+        vectors, query_vectors = synthetic_vectors(args.synthetic, args.samples, args.seed)
+        query_vectors = query_vectors.tolist()
+        ticket_ids = [f"SYN-{i}" for i in range(1, args.synthetic + 1)]
+        source = "synthetic"
+    else:
+        # Full vectors of the source project
+        with db_pool.connection(args.project) as conn:
+            options = vector_options(conn)
+            if is_compact(options["type"], options["dims"]):
+                rows = conn.execute("SELECT t.ticket_id, v.embedding FROM jira_tickets t JOIN jira_embeddings v ON v.id = t.id")
+            else:
+                rows = conn.execute("SELECT t.ticket_id, v.embedding FROM jira_tickets t JOIN jira_vectors v ON v.rowid = t.id")
+            ticket_ids, blobs = zip(*rows.fetchall())
+        vectors = np.frombuffer(b"".join(blobs), dtype=np.float32).reshape(len(blobs), -1)
+        queries = [text for kind, text, _ in sample_queries(args.project, args.samples, args.seed) if kind == "text"]
+        query_vectors = [make_query_vector(text) for text in queries]
+        source = args.project
+    # Exact top-k by brute force over the full vectors
+    expected = [set(np.array(ticket_ids)[np.argsort(np.linalg.norm(vectors - query, axis=1))[:args.top_n]])
+                for query in query_vectors]
+
+    print(f"{len(ticket_ids)} vectors, {len(query_vectors)} queries, recall@{args.top_n} against exact search, "
+          f"rescoring {os.getenv('RESCORE_FACTOR', 8)}x top_n candidates")
+    print("| option | scanned MB | full vectors MB | recall | p50 ms | p95 ms |")
+    print("|---|---|---|---|---|---|")
+    tickets = [{"ticket_id": ticket_id, "summary": ""} for ticket_id in ticket_ids]
+    for option in args.options:
+        vector_type, dims = option.split(":")
+        project_name = f"{source}__bench_{vector_type}{dims}"
+        if os.path.exists(os.path.join(os.getenv("DB_DIR", "databases"), f"{project_name}.db")):
+            del_project_db(project_name)
+        result = init_project_db(project_name, vector_type, int(dims))
+        if result.startswith("Err"):
+            print(f"| {option} | {result} |")
+            continue
+        try:
+            with db_pool.connection(project_name) as conn:
+                for start in range(0, len(tickets), 1000):
+                    insert_tickets(conn, tickets[start:start + 1000], vectors[start:start + 1000].tolist())
+                options = vector_options(conn)
+                hits = 0
+                latencies = []
+                for query, relevant in zip(query_vectors, expected):
+                    started = time.perf_counter()
+                    results = vector_search(conn, query, "", [], args.top_n, ["ticket_id"], options)
+                    latencies.append((time.perf_counter() - started) * 1000)
+                    hits += len(relevant & {result["ticket_id"] for result in results})
+                scanned = table_sizes(conn, "jira_vectors")
+                full = table_sizes(conn, "jira_embeddings")
+            print(f"| {option} | {scanned / 1e6:.2f} | {full / 1e6:.2f} | {hits / (len(expected) * args.top_n):.3f} "
+                  f"| {statistics.median(latencies):.2f} | {percentile(latencies, 0.95):.2f} |")
+        finally:
+            if not args.keep:
+                del_project_db(project_name)
+
+
+def bench_backends(args):
+    if args.synthetic:
+        # The vectors are stored in a scratch project, so vec0 searches them too
+        project_name = "synthetic__bench_backends"
+        if os.path.exists(os.path.join(os.getenv("DB_DIR", "databases"), f"{project_name}.db")):
+            del_project_db(project_name)
+        init_project_db(project_name, "float", FULL_DIMS)
+        vectors, query_vectors = synthetic_vectors(args.synthetic, args.samples, args.seed)
+        query_vectors = query_vectors.tolist()
+        tickets = [{"ticket_id": f"SYN-{i}", "summary": ""} for i in range(1, args.synthetic + 1)]
+        with db_pool.connection(project_name) as conn:
+            for start in range(0, len(tickets), 1000):
+                insert_tickets(conn, tickets[start:start + 1000], vectors[start:start + 1000].tolist())
+    else:
+        project_name = args.project
+        queries = [text for kind, text, _ in sample_queries(project_name, args.samples, args.seed) if kind == "text"]
+        query_vectors = [make_query_vector(text) for text in queries]
+    try:
+        compare_backends(args, project_name, query_vectors)
+    finally:
+        if args.synthetic:
+            del_project_db(project_name)
+
+
+def compare_backends(args, project_name: str, query_vectors: list):
+    with db_pool.connection(project_name) as conn:
+        ids = []
+        blocks = []
+        for batch_ids, batch in full_vectors(conn):
+            ids.extend(batch_ids)
+            blocks.append(batch)
+    vectors = np.concatenate(blocks)
+    # Exact top-k row ids by brute force in memory
+    expected = [set(np.array(ids)[np.argsort(np.linalg.norm(vectors - query, axis=1))[:args.top_n]])
+                for query in query_vectors]
+
+    with tempfile.TemporaryDirectory() as tmp, db_pool.connection(project_name) as conn:
+        started = time.perf_counter()
+        index = NumpyIndex(os.path.join(tmp, project_name), FULL_DIMS)
+        index.clear(len(ids))
+        index.upsert(ids, vectors)
+        index.save(0)
+        build = time.perf_counter() - started
+        size = sum(os.path.getsize(path) for path in index.paths().values())
+        options = vector_options(conn)
+        print(f"{len(ids)} vectors, {len(query_vectors)} queries, recall@{args.top_n} against exact search, "
+              f"numpy index built in {build:.2f}s ({size / 1e6:.2f} MB)")
+        print(f"| backend | recall | p50 ms | p95 ms | batch of {args.batch} ms | queries/sec batched |")
+        print("|---|---|---|---|---|---|")
+        for backend in ("vec0", "numpy"):
+            def search(batch):
+                if backend == "numpy":
+                    return indexed_search(conn, index, batch, "", [], args.top_n, ["ticket_id"])
+                return [vector_search(conn, query, "", [], args.top_n, ["ticket_id"], options) for query in batch]
+
+            # Map the returned ticket keys back to row ids for recall
+            row_ids = dict(conn.execute("SELECT ticket_id, id FROM jira_tickets"))
+            hits = 0
+            latencies = []
+            for query, relevant in zip(query_vectors, expected):
+                started = time.perf_counter()
+                results, = search([query])
+                latencies.append((time.perf_counter() - started) * 1000)
+                hits += len(relevant & {row_ids[result["ticket_id"]] for result in results})
+            batch_latencies = []
+            for start in range(0, len(query_vectors), args.batch):
+                started = time.perf_counter()
+                search(query_vectors[start:start + args.batch])
+                batch_latencies.append((time.perf_counter() - started) * 1000)
+            throughput = len(query_vectors) / (sum(batch_latencies) / 1000)
+            print(f"| {backend} | {hits / (len(expected) * args.top_n):.3f} | {statistics.median(latencies):.2f} "
+                  f"| {percentile(latencies, 0.95):.2f} | {statistics.median(batch_latencies):.2f} | {throughput:.0f} |")
+        index.close()
+
+
+def bench_ann(args):
+    if args.synthetic:
+        vectors, queries = synthetic_vectors(args.synthetic, args.samples, args.seed)
+        ids = list(range(1, args.synthetic + 1))
+    else:
+        with db_pool.connection(args.project) as conn:
+            ids = []
+            blocks = []
+            for batch_ids, batch in full_vectors(conn):
+                ids.extend(batch_ids)
+                blocks.append(batch)
+        vectors = np.concatenate(blocks)
+        texts = [text for kind, text, _ in sample_queries(args.project, args.samples, args.seed) if kind == "text"]
+        queries = np.array([make_query_vector(text) for text in texts], dtype=np.float32)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        exact_index = NumpyIndex(os.path.join(tmp, "exact"), FULL_DIMS)
+        exact_index.clear(len(ids))
+        ivf_index = IvfIndex(os.path.join(tmp, "ivf"), FULL_DIMS, lists=args.lists, min_train=1)
+        ivf_index.clear(len(ids))
+        for start in range(0, len(ids), 65536):
+            exact_index.upsert(ids[start:start + 65536], vectors[start:start + 65536])
+            ivf_index.upsert(ids[start:start + 65536], vectors[start:start + 65536])
+        started = time.perf_counter()
+        ivf_index.maintain()
+        ivf_index.wait_training()
+        train = time.perf_counter() - started
+
+        def measure(index):
+            latencies = []
+            results = []
+            for query in queries:
+                started = time.perf_counter()
+                hits, = index.search(query[None, :], args.top_n)
+                latencies.append((time.perf_counter() - started) * 1000)
+                results.append({row_id for row_id, _ in hits})
+            return results, latencies
+
+        expected, latencies = measure(exact_index)
+        print(f"{len(ids)} vectors, {len(queries)} queries, recall@{args.top_n} against exact search, "
+              f"{ivf_index.clusters} clusters trained in {train:.2f}s")
+        print("| search | probes | recall | p50 ms | p95 ms |")
+        print("|---|---|---|---|---|")
+        print(f"| exact (numpy) | - | 1.000 | {statistics.median(latencies):.2f} | {percentile(latencies, 0.95):.2f} |")
+        for probes in args.probes:
+            ivf_index.probes = probes
+            results, latencies = measure(ivf_index)
+            recall = sum(len(found & relevant) for found, relevant in zip(results, expected)) / (len(expected) * args.top_n)
+            print(f"| ivf | {probes} | {recall:.3f} | {statistics.median(latencies):.2f} | {percentile(latencies, 0.95):.2f} |")
+        exact_index.close()
+        ivf_index.close()
+
+
+def bench_batching(args):
+    # Distinct prompts, so that no query is answered from a cache
+    words = ["login", "timeout", "export", "report", "billing", "migration", "upload", "crash", "docs", "search"]
+    prompts = [f"{words[i % 10]} issue {i} after {words[(i * 7) % 10]} change" for i in range(args.queries)]
+    make_vectors(["warm up"])
+    print(f"{args.clients} concurrent clients, {args.queries} prompts, at most {args.max_batch} prompts per batch")
+    print("| window ms | p50 ms | p99 ms | prompts/sec | mean batch | mean wait ms | p99 wait ms |")
+    print("|---|---|---|---|---|---|---|")
+    for window in args.windows:
+        batcher = QueryBatcher(make_vectors, window, args.max_batch)
+        latencies = []
+        lock = threading.Lock()
+
+        def client(chunk):
+            for prompt in chunk:
+                started = time.perf_counter()
+                batcher.vector(prompt)
+                with lock:
+                    latencies.append((time.perf_counter() - started) * 1000)
+
+        threads = [threading.Thread(target=client, args=(prompts[i::args.clients],)) for i in range(args.clients)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        stats = batcher.stats()
+        print(f"| {window:g} | {statistics.median(latencies):.2f} | {percentile(latencies, 0.99):.2f} "
+              f"| {len(prompts) / elapsed:.0f} | {stats['mean_batch_size']:.2f} | {stats['wait_ms']['mean']:.2f} "
+              f"| {stats['wait_ms']['p99']:.2f} |")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    corpus = commands.add_parser("corpus", help="Write a synthetic corpus of JIRA-like tickets for the other commands")
+    corpus.add_argument("--out", required=True, help="JSON-lines file to write")
+    corpus.add_argument("--tickets", type=int, default=5000, help="Number of tickets")
+    corpus.add_argument("--project", default="BEN", help="Project key of the ticket keys")
+    corpus.add_argument("--seed", type=int, default=0)
+    corpus.set_defaults(run=write_corpus)
+
+    search = commands.add_parser("search", help="Compare recall and latency of the search modes")
+    search.add_argument("--project", required=True, help="Project name")
+    search.add_argument("--corpus", help="JSON-lines file of tickets to load into the project first")
+    search.add_argument("--samples", type=int, default=200, help="Number of tickets to derive queries from")
+    search.add_argument("--top-n", type=int, default=5, help="Number of results per search")
+    search.add_argument("--modes", nargs="+", default=list(SEARCH_MODES), choices=SEARCH_MODES)
+    search.add_argument("--seed", type=int, default=0)
+    search.set_defaults(run=bench_search)
+
+    storage = commands.add_parser("storage", help="Report full_json compression and its effect on search latency")
+    storage.add_argument("--project", required=True, help="Project name")
+    storage.add_argument("--corpus", help="JSON-lines file of tickets to load into the project first")
+    storage.add_argument("--samples", type=int, default=200, help="Number of searches")
+    storage.add_argument("--top-n", type=int, default=5, help="Number of results per search")
+    storage.add_argument("--seed", type=int, default=0)
+    storage.set_defaults(run=bench_storage)
+
+    vectors = commands.add_parser("vectors", help="Compare recall and latency of the vector storage options")
+    vectors_source = vectors.add_mutually_exclusive_group(required=True)
+    vectors_source.add_argument("--project", help="Project whose vectors are copied into one project per option")
+    vectors_source.add_argument("--synthetic", type=int, help="Number of random clustered vectors to use instead of a project")
+    vectors.add_argument("--options", nargs="+", default=["float:384", "int8:384", "bit:384", "float:128", "int8:128", "bit:128"],
+                         help="Vector options as type:dims")
+    vectors.add_argument("--samples", type=int, default=200, help="Number of queries")
+    vectors.add_argument("--top-n", type=int, default=10, help="Number of results per search")
+    vectors.add_argument("--seed", type=int, default=0)
+    vectors.add_argument("--keep", action="store_true", help="Keep the benchmark projects")
+    vectors.set_defaults(run=bench_vectors)
+
+    backends = commands.add_parser("backends", help="Compare the vec0 and numpy search backends")
+    backends_source = backends.add_mutually_exclusive_group(required=True)
+    backends_source.add_argument("--project", help="Project name")
+    backends_source.add_argument("--synthetic", type=int, help="Number of random clustered vectors to search instead of a project")
+    backends.add_argument("--samples", type=int, default=200, help="Number of queries")
+    backends.add_argument("--top-n", type=int, default=10, help="Number of results per search")
+    backends.add_argument("--batch", type=int, default=32, help="Queries per batched search")
+    backends.add_argument("--seed", type=int, default=0)
+    backends.set_defaults(run=bench_backends)
+
+    ann = commands.add_parser("ann", help="Compare recall@k and latency of the ivf backend with exact search")
+    source = ann.add_mutually_exclusive_group(required=True)
+    source.add_argument("--project", help="Project whose vectors are indexed")
+    source.add_argument("--synthetic", type=int, help="Number of random clustered vectors to index instead of a project")
+    ann.add_argument("--lists", type=int, default=0, help="Number of clusters, 0 for 4 * sqrt(vectors)")
+    ann.add_argument("--probes", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32], help="Clusters searched per query")
+    ann.add_argument("--samples", type=int, default=200, help="Number of queries")
+    ann.add_argument("--top-n", type=int, default=10, help="Number of results per search")
+    ann.add_argument("--seed", type=int, default=0)
+    ann.set_defaults(run=bench_ann)
+
+    batching = commands.add_parser("batching", help="Compare query latency and throughput for several batching windows")
+    batching.add_argument("--clients", type=int, default=8, help="Number of concurrent searching clients")
+    batching.add_argument("--windows", type=float, nargs="+", default=[0, 1, 2, 5, 10], help="Batching windows in ms")
+    batching.add_argument("--max-batch", type=int, default=16, help="Maximum number of prompts per batch")
+    batching.add_argument("--queries", type=int, default=400, help="Number of prompts")
+    batching.set_defaults(run=bench_batching)
+
+    args = parser.parse_args()
+    args.run(args)
+
+
+if __name__ == "__main__":
+    try:
+        init_logger()  # Initialize the logger
+
+        main()
+
+    except Exception as e:
+        # Log the error
+        logging.error(f"Benchmark failed: {e}")
+        raise
@@ -0,0 +1,133 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+
+class ConnectionPool:
+    """
+    Keep open SQLite connections per project so the sqlite_vec extension is loaded once
+    per connection instead of once per call.
+
+    A connection is used by one caller at a time. Connections that stay idle longer than
+    idle_timeout seconds are closed by a background reaper thread.
+    """
+
+    def __init__(self, connect, max_idle: int = 4, idle_timeout: float = 300):
+        """
+        Args:
+            connect (callable): Function that opens a new connection for a project name.
+            max_idle (int): Maximum number of idle connections kept per project.
+            idle_timeout (float): Seconds after which an idle connection is closed.
+        """
+        self._connect = connect
+        self._max_idle = max_idle
+        self._idle_timeout = idle_timeout
+        self._idle = {}         # project name -> list of (connection, last used time)
+        self._generations = {}  # project name -> generation, bumped when evicted
+        self._lock = threading.Lock()
+        self._reaper = None
+        self._stop = threading.Event()
+
+    @contextmanager
+    def connection(self, project_name: str):
+        """
+        Borrow a connection for the given project and return it to the pool afterwards.
+
+        Raises:
+            RuntimeError: If the database cannot be opened.
+        """
+        conn, generation = self._acquire(project_name)
+        try:
+            yield conn
+        finally:
+            self._release(project_name, conn, generation)
+
+    def evict(self, project_name: str):
+        """
+        Close the idle connections of a project. Connections in use are closed when they
+        are returned.
+        """
+        with self._lock:
+            self._generations[project_name] = self._generations.get(project_name, 0) + 1
+            idle = self._idle.pop(project_name, [])
+        for conn, _ in idle:
+            self._close(conn)
+
+    def close_idle(self):
+        """
+        Close the connections that have been idle longer than the idle timeout.
+        """
+        deadline = time.monotonic() - self._idle_timeout
+        expired = []
+        with self._lock:
+            for project_name, idle in list(self._idle.items()):
+                keep = [(conn, used) for conn, used in idle if used >= deadline]
+                expired += [conn for conn, used in idle if used < deadline]
+                if keep:
+                    self._idle[project_name] = keep
+                else:
+                    del self._idle[project_name]
+        for conn in expired:
+            self._close(conn)
+
+    def close_all(self):
+        """
+        Close every idle connection and stop the reaper thread.
+        """
+        self._stop.set()
+        with self._lock:
+            projects = list(self._idle.keys())
+        for project_name in projects:
+            self.evict(project_name)
+
+    def _acquire(self, project_name: str):
+        self._start_reaper()
+        with self._lock:
+            generation = self._generations.get(project_name, 0)
+            idle = self._idle.get(project_name)
+            if idle:
+                conn, _ = idle.pop()
+                return conn, generation
+
+        conn = self._connect(project_name)
+        if conn is None:
+            raise RuntimeError(f"Err010: Database for project '{project_name}' is not available")
+        return conn, generation
+
+    def _release(self, project_name: str, conn, generation: int):
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except Exception as e:
+            logging.warning(f"Discarding pooled connection for project '{project_name}': {e}")
+            self._close(conn)
+            return
+
+        with self._lock:
+            idle = self._idle.setdefault(project_name, [])
+            if generation == self._generations.get(project_name, 0) and len(idle) < self._max_idle:
+                idle.append((conn, time.monotonic()))
+                return
+        self._close(conn)
+
+    def _start_reaper(self):
+        if self._reaper is not None:
+            return
+        with self._lock:
+            if self._reaper is not None:
+                return
+            self._reaper = threading.Thread(target=self._reap, name="db-pool-reaper", daemon=True)
+            self._reaper.start()
+
+    def _reap(self):
+        interval = max(self._idle_timeout / 2, 1)
+        while not self._stop.wait(interval):
+            self.close_idle()
+
+    @staticmethod
+    def _close(conn):
+        try:
+            conn.close()
+        except Exception as e:
+            logging.warning(f"Failed to close pooled connection: {e}")
@@ -0,0 +1,574 @@
+import copy
+import logging
+import math
+import os
+import queue
+import re
+import threading
+import time
+import unicodedata
+from collections import Counter, OrderedDict, deque
+from concurrent.futures import Future
+from executors import run_embed
+from util import record_startup
+
+MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+
+# Values accepted by EMBED_BACKEND
+EMBED_BACKENDS = ("torch", "int8", "onnx")
+
+# Texts used by compare_backends when none are given
+AGREEMENT_TEXTS = [
+    "Login page fails with a timeout error after the last deployment",
+    "Add an export button to the monthly report screen",
+    "Database migration for the billing service is stuck in progress",
+    "Crash when uploading an attachment larger than 10 MB",
+    "Update the onboarding documentation for new team members",
+]
+
+# The tokenizer and model are loaded on first use (or by warm_up) instead of at import,
+# so that processes which never embed anything do not pay for torch and the model
+_tokenizer = None
+_model = None
+_model_lock = threading.Lock()
+
+def load_model() -> tuple:
+    """
+    Load the tokenizer and model once and return them.
+
+    Returns:
+        tuple: (tokenizer, model)
+    """
+    global _tokenizer, _model
+    if _model is not None:
+        return _tokenizer, _model
+    with _model_lock:
+        if _model is None:
+            started = time.perf_counter()
+            from transformers import AutoTokenizer, AutoModel
+
+            tokenizer = AutoTokenizer.from_pretrained(MODEL_NAME)
+            model = AutoModel.from_pretrained(MODEL_NAME)
+            model.eval()
+            _tokenizer, _model = tokenizer, model
+            elapsed = time.perf_counter() - started
+            record_startup("model_load", elapsed)
+            logging.info(f"Loaded embedding model '{MODEL_NAME}' in {elapsed:.2f}s")
+    return _tokenizer, _model
+
+class EmbeddingBackend:
+    """
+    Runs the model on a padded batch of tokenized texts and returns mean-pooled vectors.
+    """
+    name = ""
+    # Tensor type the tokenizer should produce for this backend
+    tensor_type = "pt"
+
+    def embed(self, inputs) -> list:
+        """
+        Args:
+            inputs: Padded tokenizer output (input_ids, attention_mask, ...).
+
+        Returns:
+            list: One vector per text, mean-pooled over the attention mask.
+        """
+        raise NotImplementedError
+
+class TorchBackend(EmbeddingBackend):
+    """
+    fp32 PyTorch inference.
+    """
+    name = "torch"
+
+    def __init__(self, model):
+        self.model = model
+
+    def embed(self, inputs) -> list:
+        import torch
+
+        with torch.no_grad():
+            outputs = self.model(**inputs)
+            mask = inputs["attention_mask"].unsqueeze(-1).to(outputs.last_hidden_state.dtype)
+            summed = (outputs.last_hidden_state * mask).sum(dim=1)
+            return (summed / mask.sum(dim=1).clamp(min=1)).tolist()
+
+class QuantizedTorchBackend(TorchBackend):
+    """
+    PyTorch inference with the Linear layers dynamically quantized to int8.
+    """
+    name = "int8"
+
+    def __init__(self, model):
+        import torch
+
+        quantized = torch.ao.quantization.quantize_dynamic(copy.deepcopy(model), {torch.nn.Linear}, dtype=torch.qint8)
+        super().__init__(quantized)
+
+class OnnxBackend(EmbeddingBackend):
+    """
+    ONNX Runtime inference on CPU. The model is exported to onnx_path on first use.
+    """
+    name = "onnx"
+    tensor_type = "np"
+
+    def __init__(self, model, tokenizer, onnx_path: str):
+        try:
+            import onnxruntime
+        except ImportError as e:
+            raise RuntimeError("Err015: EMBED_BACKEND=onnx requires the onnxruntime package") from e
+
+        if not os.path.exists(onnx_path):
+            export_onnx(model, tokenizer, onnx_path)
+        self.session = onnxruntime.InferenceSession(onnx_path, providers=["CPUExecutionProvider"])
+        self.input_names = [model_input.name for model_input in self.session.get_inputs()]
+
+    def embed(self, inputs) -> list:
+        import numpy as np
+
+        feeds = {name: np.asarray(inputs[name], dtype=np.int64) for name in self.input_names}
+        hidden, = self.session.run(["last_hidden_state"], feeds)
+        mask = np.asarray(inputs["attention_mask"], dtype=hidden.dtype)[..., None]
+        return ((hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1, None)).tolist()
+
+def export_onnx(model, tokenizer, onnx_path: str):
+    """
+    Export the model to ONNX with dynamic batch and sequence axes.
+    """
+    import torch
+
+    started = time.perf_counter()
+    # Tracing changes module state, so a copy is exported to keep the torch model intact
+    model = copy.deepcopy(model)
+    sample = tokenizer(["export sample"], return_tensors="pt")
+    input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in sample]
+
+    class LastHiddenState(torch.nn.Module):
+        def __init__(self):
+            super().__init__()
+            self.model = model
+
+        def forward(self, *args):
+            return self.model(**dict(zip(input_names, args))).last_hidden_state
+
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names + ["last_hidden_state"]}
+    onnx_dir = os.path.dirname(onnx_path)
+    if onnx_dir:
+        os.makedirs(onnx_dir, exist_ok=True)
+    tmp_path = onnx_path + ".tmp"
+    torch.onnx.export(LastHiddenState(), tuple(sample[name] for name in input_names), tmp_path,
+                      input_names=input_names, output_names=["last_hidden_state"],
+                      dynamic_axes=dynamic_axes, opset_version=17, dynamo=False)
+    os.replace(tmp_path, onnx_path)
+    logging.info(f"Exported '{MODEL_NAME}' to ONNX at {onnx_path} in {time.perf_counter() - started:.2f}s")
+
+_backends = {}
+_backend_lock = threading.Lock()
+
+def backend_name() -> str:
+    """
+    Return the backend selected by EMBED_BACKEND (torch, int8 or onnx).
+    """
+    return os.getenv("EMBED_BACKEND", "torch").lower()
+
+def model_id(backend: str = None) -> str:
+    """
+    Identify the vectors a backend produces, e.g. for keying the embedding cache.
+    """
+    return f"{MODEL_NAME}:{backend or backend_name()}"
+
+def get_backend(name: str = None) -> EmbeddingBackend:
+    """
+    Create a backend once and return it.
+
+    Args:
+        name (str): Backend name. Defaults to EMBED_BACKEND.
+
+    Raises:
+        ValueError: If the backend name is unknown.
+    """
+    name = name or backend_name()
+    backend = _backends.get(name)
+    if backend is not None:
+        return backend
+    if name not in EMBED_BACKENDS:
+        raise ValueError(f"Err016: Unknown embedding backend '{name}'. Expected one of {', '.join(EMBED_BACKENDS)}.")
+
+    tokenizer, model = load_model()
+    with _backend_lock:
+        if name not in _backends:
+            started = time.perf_counter()
+            if name == "int8":
+                _backends[name] = QuantizedTorchBackend(model)
+            elif name == "onnx":
+                onnx_path = os.getenv("EMBED_ONNX_PATH", os.path.join("models", "all-MiniLM-L6-v2.onnx"))
+                _backends[name] = OnnxBackend(model, tokenizer, onnx_path)
+            else:
+                _backends[name] = TorchBackend(model)
+            if name != "torch":
+                logging.info(f"Prepared embedding backend '{name}' in {time.perf_counter() - started:.2f}s")
+    return _backends[name]
+
+def compare_backends(texts: list = None, backends: list = None) -> dict:
+    """
+    Compare the vectors of each backend with the fp32 torch vectors.
+
+    Args:
+        texts (list): Texts to embed. Defaults to AGREEMENT_TEXTS.
+        backends (list): Backends to compare. Defaults to every backend but torch.
+
+    Returns:
+        dict: For each backend, the mean and minimum cosine similarity to the torch
+              vectors and the seconds it took to embed the texts.
+    """
+    texts = texts or AGREEMENT_TEXTS
+    started = time.perf_counter()
+    reference = make_vectors(texts, backend="torch")
+    report = {"torch": {"mean_cosine": 1.0, "min_cosine": 1.0, "seconds": round(time.perf_counter() - started, 4)}}
+
+    for name in backends or [name for name in EMBED_BACKENDS if name != "torch"]:
+        try:
+            get_backend(name)
+            started = time.perf_counter()
+            vectors = make_vectors(texts, backend=name)
+            elapsed = time.perf_counter() - started
+        except Exception as e:
+            report[name] = {"error": str(e)}
+            continue
+        cosines = [cosine_similarity(a, b) for a, b in zip(reference, vectors)]
+        report[name] = {
+            "mean_cosine": round(sum(cosines) / len(cosines), 6),
+            "min_cosine": round(min(cosines), 6),
+            "seconds": round(elapsed, 4),
+        }
+    logging.info(f"Embedding backend agreement: {report}")
+    return report
+
+def cosine_similarity(a: list, b: list) -> float:
+    """
+    Cosine similarity of two vectors.
+    """
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+class QueryVectorCache:
+    """
+    Bounded LRU cache of query vectors, keyed by model id and normalized prompt.
+    """
+
+    def __init__(self, max_size: int):
+        """
+        Args:
+            max_size (int): Maximum number of vectors kept. 0 disables the cache.
+        """
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._vectors = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            vector = self._vectors.get(key)
+            if vector is None:
+                self.misses += 1
+                return None
+            self._vectors.move_to_end(key)
+            self.hits += 1
+            return vector
+
+    def put(self, key, vector: list):
+        if self.max_size <= 0 or not vector:
+            return
+        with self._lock:
+            self._vectors[key] = vector
+            self._vectors.move_to_end(key)
+            while len(self._vectors) > self.max_size:
+                self._vectors.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._vectors.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._vectors),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+            }
+
+query_cache = QueryVectorCache(int(os.getenv("QUERY_CACHE_SIZE", 256)))
+
+def normalize_query(prompt: str) -> str:
+    """
+    Normalize a prompt for query cache lookup: NFKC, lower case and single spaces.
+
+    The normalized prompt is both the cache key and the text that is embedded, so it
+    can change the vector on purpose: NFKC folds full-width letters, ligatures and
+    other compatibility characters into their plain forms. Case and whitespace make no
+    difference to the model's uncased tokenizer.
+    """
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFKC", prompt)).strip().lower()
+
+class QueryBatcher:
+    """
+    Coalesce the prompts of concurrent searches into one forward pass.
+
+    A caller's prompt waits in a queue. A dispatcher thread takes the first waiting
+    prompt, gathers the ones arriving within window_ms after it or until max_batch
+    prompts are waiting, embeds the distinct texts in one batch and hands each caller
+    its vector. Prompts queued while a batch is embedded form the next batch.
+    """
+
+    def __init__(self, embed, window_ms: float, max_batch: int):
+        """
+        Args:
+            embed (callable): Embeds a list of texts, e.g. make_vectors.
+            window_ms (float): How long the first prompt of a batch waits for others. 0 disables batching.
+            max_batch (int): Maximum number of prompts per batch.
+        """
+        self.embed = embed
+        self.window = window_ms / 1000
+        self.max_batch = max(1, max_batch)
+        self.batches = 0
+        self.prompts = 0
+        self.max_queue_depth = 0
+        self.batch_sizes = Counter()
+        self._waits = deque(maxlen=1000)  # Seconds from submission to the start of the batch
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def vector(self, text: str) -> list:
+        """
+        Embed a text together with the texts of concurrent callers.
+
+        Returns:
+            list: The vector, empty if embedding failed.
+
+        Raises:
+            Exception: The error of the dispatcher if it failed to hand out the batch.
+        """
+        if self.window <= 0:
+            return self._embed([text])[0]
+        future = Future()
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._dispatch, name="query-batcher", daemon=True)
+                self._thread.start()
+            self._queue.put((text, future, time.perf_counter()))
+            self.max_queue_depth = max(self.max_queue_depth, self._queue.qsize())
+        return future.result()
+
+    def stats(self) -> dict:
+        with self._lock:
+            waits = sorted(self._waits)
+            return {
+                "window_ms": self.window * 1000,
+                "max_batch": self.max_batch,
+                "queue_depth": self._queue.qsize(),
+                "max_queue_depth": self.max_queue_depth,
+                "batches": self.batches,
+                "prompts": self.prompts,
+                "mean_batch_size": self.prompts / self.batches if self.batches else 0.0,
+                "batch_sizes": {str(size): count for size, count in sorted(self.batch_sizes.items())},
+                "wait_ms": {
+                    "mean": 1000 * sum(waits) / len(waits) if waits else 0.0,
+                    "p50": 1000 * waits[len(waits) // 2] if waits else 0.0,
+                    "p99": 1000 * waits[min(len(waits) - 1, int(len(waits) * 0.99))] if waits else 0.0,
+                },
+            }
+
+    def _dispatch(self):
+        batch = []
+        try:
+            while True:
+                batch = [self._queue.get()]
+                try:
+                    self._run_batch(batch)
+                except Exception as e:
+                    # Callers wait on their futures, so a failed batch must still complete them
+                    logging.error(f"Err005: Query batcher failed on a batch of {len(batch)} prompts: {e}")
+                    self._fail(batch, e)
+        finally:
+            # The thread is dying: fail the waiting callers and let the next one start a new thread
+            with self._lock:
+                self._thread = None
+                while True:
+                    try:
+                        batch.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+            self._fail(batch, RuntimeError("Err005: Query batcher stopped"))
+
+    def _run_batch(self, batch: list):
+        deadline = batch[0][2] + self.window
+        while len(batch) < self.max_batch:
+            timeout = deadline - time.perf_counter()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=timeout))
+            except queue.Empty:
+                break
+        started = time.perf_counter()
+        with self._lock:
+            self.batches += 1
+            self.prompts += len(batch)
+            self.batch_sizes[len(batch)] += 1
+            self._waits.extend(started - submitted for _, _, submitted in batch)
+        texts = list(dict.fromkeys(text for text, _, _ in batch))
+        vectors = dict(zip(texts, self._embed(texts)))
+        for text, future, _ in batch:
+            future.set_result(vectors[text])
+
+    @staticmethod
+    def _fail(batch: list, error: BaseException):
+        for _, future, _ in batch:
+            if not future.done():
+                future.set_exception(error)
+
+    def _embed(self, texts: list) -> list:
+        try:
+            return self.embed(texts)
+        except Exception as e:
+            logging.error(f"Err005: Failed to generate vectors for {len(texts)} prompts: {e}")
+            return [[] for _ in texts]
+
+query_batcher = QueryBatcher(
+    lambda texts: make_vectors(texts),
+    float(os.getenv("QUERY_BATCH_WINDOW_MS", 2)),
+    int(os.getenv("QUERY_BATCH_MAX", 16)),
+)
+
+def make_query_vector(prompt: str) -> list:
+    """
+    Convert a search prompt into a vector, reusing the vector of an equal prompt.
+
+    Uncached prompts are embedded by query_batcher together with the prompts of
+    concurrent searches.
+
+    Args:
+        prompt (str): The search prompt.
+
+    Returns:
+        list: A list representing the vector.
+    """
+    text = normalize_query(prompt)
+    key = (model_id(), text)
+    vector = query_cache.get(key)
+    if vector is None:
+        vector = query_batcher.vector(text)
+        query_cache.put(key, vector)
+    return vector
+
+def make_query_vectors(prompts: list) -> list:
+    """
+    Convert several search prompts into vectors, embedding the uncached ones in one batch.
+
+    Args:
+        prompts (list): The search prompts.
+
+    Returns:
+        list: The vectors, in the order of the prompts.
+    """
+    keys = [(model_id(), normalize_query(prompt)) for prompt in prompts]
+    vectors = [query_cache.get(key) for key in keys]
+    missing = list(dict.fromkeys(key for key, vector in zip(keys, vectors) if vector is None))
+    embedded = dict(zip(missing, make_vectors([text for _, text in missing])))
+    for key, vector in embedded.items():
+        query_cache.put(key, vector)
+    return [vector if vector is not None else embedded[key] for key, vector in zip(keys, vectors)]
+
+def warm_up(background: bool = True):
+    """
+    Load the model and run one forward pass so the first real call is fast.
+
+    Args:
+        background (bool): Run in a daemon thread and return immediately.
+
+    Returns:
+        threading.Thread: The warm-up thread, or None when run in the foreground.
+    """
+    def run():
+        try:
+            make_vectors(["warm up"])
+        except Exception as e:
+            logging.error(f"Err014: Failed to warm up the embedding model: {e}")
+
+    if not background:
+        run()
+        return None
+    thread = threading.Thread(target=run, name="embedding-warm-up", daemon=True)
+    thread.start()
+    return thread
+
+def make_vector(prompt: str) -> list:
+    """
+    Convert a prompt string into a vector representation using a pre-trained model.
+
+    Args:
+        prompt (str): The input string to convert.
+
+    Returns:
+        list: A list representing the vector.
+    """
+    try:
+        vectors = make_vectors([prompt])
+        return vectors[0] if vectors else []
+    except Exception as e:
+        logging.error(f"Err005: Failed to generate vector for prompt '{prompt}': {e}")
+        return []
+
+def make_vectors(texts: list, batch_size: int = 0, backend: str = None) -> list:
+    """
+    Convert a list of strings into vectors, running the model on batches of texts.
+
+    Texts are bucketed by token length before batching so that each batch is padded
+    to a similar length. The embeddings are mean-pooled over the attention mask, so
+    every vector is the same as the one make_vector returns for that text alone.
+
+    Args:
+        texts (list): The input strings to convert.
+        batch_size (int): Texts per forward pass. Defaults to EMBED_BATCH_SIZE (32).
+        backend (str): Embedding backend. Defaults to EMBED_BACKEND (torch).
+
+    Returns:
+        list: A list of vectors in the same order as texts.
+    """
+    if not texts:
+        return []
+    if batch_size <= 0:
+        batch_size = int(os.getenv("EMBED_BATCH_SIZE", 32))
+
+    started = time.perf_counter()
+
+    # An unknown backend name fails before the model is downloaded
+    embedder = get_backend(backend)
+    tokenizer, _ = load_model()
+
+    # Tokenize once without padding to learn each text's length
+    encodings = tokenizer(list(texts), truncation=True)
+    order = sorted(range(len(texts)), key=lambda i: len(encodings["input_ids"][i]))
+
+    vectors = [None] * len(texts)
+    for start in range(0, len(order), batch_size):
+        bucket = order[start:start + batch_size]
+        features = [{key: encodings[key][i] for key in encodings.keys()} for i in bucket]
+        inputs = tokenizer.pad(features, padding=True, return_tensors=embedder.tensor_type)
+
+        # Forward passes of searches and ingestion take turns in the bounded embedding pool
+        for i, embedding in zip(bucket, run_embed(embedder.embed, inputs)):
+            vectors[i] = embedding
+
+    elapsed = time.perf_counter() - started
+    if len(texts) > 1:
+        logging.info(f"Embedded {len(texts)} texts in {elapsed:.2f}s ({len(texts) / max(elapsed, 1e-9):.1f} texts/sec, batch size {batch_size}, backend {embedder.name})")
+    return vectors
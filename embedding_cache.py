@@ -0,0 +1,96 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+from array import array
+
+
+class EmbeddingCache:
+    """
+    Persistent cache of embeddings keyed by a hash of the embedded text and the model id.
+
+    The cache is a plain SQLite database shared by all projects, so a ticket whose
+    summary and description did not change is never embedded twice.
+    """
+
+    def __init__(self, db_path: str, model_id: str):
+        """
+        Args:
+            db_path (str): Path of the cache database file.
+            model_id (str): Identifier of the model producing the vectors.
+        """
+        self.db_path = db_path
+        self.model_id = model_id
+        self.hits = 0
+        self.misses = 0
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def key(self, text: str) -> str:
+        """
+        Return the cache key of a text for this cache's model.
+        """
+        return hashlib.sha256(f"{self.model_id}\n{text}".encode("utf-8")).hexdigest()
+
+    def get_many(self, texts: list) -> list:
+        """
+        Look up the vectors of texts.
+
+        Returns:
+            list: The cached vector of each text, or None where it is not cached.
+        """
+        keys = [self.key(text) for text in texts]
+        found = {}
+        with self._lock:
+            conn = self._connection()
+            # Stay well below SQLite's limit on the number of host parameters
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                placeholders = ", ".join("?" * len(chunk))
+                for key, blob in conn.execute(f"SELECT key, vector FROM embedding_cache WHERE key IN ({placeholders})", chunk):
+                    found[key] = array("f", blob).tolist()
+            vectors = [found.get(key) for key in keys]
+            hits = sum(1 for vector in vectors if vector is not None)
+            self.hits += hits
+            self.misses += len(keys) - hits
+        return vectors
+
+    def put_many(self, texts: list, vectors: list):
+        """
+        Store the vectors of texts, skipping empty vectors.
+        """
+        rows = [(self.key(text), array("f", vector).tobytes()) for text, vector in zip(texts, vectors) if vector]
+        if not rows:
+            return
+        with self._lock:
+            conn = self._connection()
+            conn.executemany("INSERT OR REPLACE INTO embedding_cache (key, vector) VALUES (?, ?)", rows)
+            conn.commit()
+
+    def stats(self) -> dict:
+        """
+        Return the hit and miss counters and the number of cached vectors.
+        """
+        with self._lock:
+            entries, = self._connection().execute("SELECT COUNT(*) FROM embedding_cache").fetchone()
+            lookups = self.hits + self.misses
+            return {
+                "model": self.model_id,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": entries,
+            }
+
+    def _connection(self):
+        if self._conn is None:
+            db_dir = os.path.dirname(self.db_path)
+            if db_dir:
+                os.makedirs(db_dir, exist_ok=True)
+            self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS embedding_cache (key TEXT PRIMARY KEY, vector BLOB NOT NULL)")
+            self._conn.commit()
+            logging.info(f"Embedding cache opened at {self.db_path}")
+        return self._conn
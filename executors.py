@@ -0,0 +1,71 @@
+import asyncio
+import functools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Blocking JIRA and SQLite calls of the async MCP tools
+IO_WORKERS = int(os.getenv("IO_WORKERS", 8))
+io_executor = ThreadPoolExecutor(max_workers=IO_WORKERS, thread_name_prefix="io")
+
+# Model inference. Each forward pass already uses several cores, so only a few run at once.
+EMBED_WORKERS = int(os.getenv("EMBED_WORKERS", 2))
+embed_executor = ThreadPoolExecutor(max_workers=EMBED_WORKERS, thread_name_prefix="embed")
+
+_embed_thread = threading.local()
+_counters = {"io": 0, "embed": 0}
+_counters_lock = threading.Lock()
+
+
+async def run_io(func, *args, **kwargs):
+    """
+    Run a blocking function in the IO pool without blocking the event loop.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(io_executor, _counted("io", functools.partial(func, *args, **kwargs)))
+
+
+def run_embed(func, *args, **kwargs):
+    """
+    Run a model inference function in the embedding pool and wait for its result.
+
+    Called from any thread, so searches and ingestion share the EMBED_WORKERS slots and
+    wait in one queue. Calls made from an embedding worker run directly.
+    """
+    if getattr(_embed_thread, "active", False):
+        return func(*args, **kwargs)
+    return embed_executor.submit(_counted("embed", _in_embed_worker(functools.partial(func, *args, **kwargs)))).result()
+
+
+def executor_stats() -> dict:
+    """
+    Return the size of each pool and the number of tasks it is running or has queued.
+    """
+    with _counters_lock:
+        return {
+            "io": {"workers": IO_WORKERS, "pending": _counters["io"]},
+            "embed": {"workers": EMBED_WORKERS, "pending": _counters["embed"]},
+        }
+
+
+def _counted(name: str, func):
+    with _counters_lock:
+        _counters[name] += 1
+
+    def run():
+        try:
+            return func()
+        finally:
+            with _counters_lock:
+                _counters[name] -= 1
+    return run
+
+
+def _in_embed_worker(func):
+    def run():
+        _embed_thread.active = True
+        try:
+            return func()
+        finally:
+            _embed_thread.active = False
+    return run
@@ -0,0 +1,91 @@
+import json
+
+# Ticket columns that can be filtered on
+FILTER_FIELDS = ["ticket_id", "summary", "description", "status", "priority", "assignee", "reporter",
+                 "created", "updated", "original_estimate_seconds", "due_date"]
+
+COMPARISON_OPS = ["=", "!=", "<", "<=", ">", ">=", "like", "not like"]
+LIST_OPS = ["in", "not in"]
+NULL_OPS = ["is null", "is not null"]
+OPERATORS = COMPARISON_OPS + LIST_OPS + NULL_OPS + ["between"]
+
+
+def compile_filter(spec, alias: str = "t") -> tuple:
+    """
+    Compile a structured filter into a parameterized SQL expression.
+
+    A filter is a condition, a list of filters (all must match) or a logical group:
+        {"field": "status", "op": "=", "value": "Open"}
+        {"field": "priority", "op": "in", "value": ["High", "Highest"]}
+        {"field": "updated", "op": "between", "value": ["2025-05-01", "2025-05-31T23:59:59"]}
+        {"field": "assignee", "op": "is null"}
+        {"and": [...]}, {"or": [...]}, {"not": {...}}
+
+    Dates are stored as JIRA ISO strings, so date ranges compare as text. Missing values
+    are stored as empty strings, so 'is null' also matches ''.
+
+    Args:
+        spec (dict | list | str): The filter, or its JSON text.
+        alias (str): Alias of the jira_tickets table in the query.
+
+    Returns:
+        tuple: (SQL expression, list of parameters, sorted list of the fields used)
+
+    Raises:
+        ValueError: If the filter is malformed.
+    """
+    if isinstance(spec, str):
+        try:
+            spec = json.loads(spec)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Err017: Filters are not valid JSON: {e}")
+    params = []
+    fields = set()
+    sql = _compile(spec, alias, params, fields)
+    return sql, params, sorted(fields)
+
+
+def _compile(spec, alias: str, params: list, fields: set) -> str:
+    if isinstance(spec, list):
+        spec = {"and": spec}
+    if not isinstance(spec, dict):
+        raise ValueError(f"Err017: Invalid filter {spec!r}, expected an object or a list")
+
+    for group in ("and", "or"):
+        if group in spec:
+            children = spec[group]
+            if not isinstance(children, list) or not children:
+                raise ValueError(f"Err017: '{group}' expects a non-empty list of filters")
+            parts = [_compile(child, alias, params, fields) for child in children]
+            return "(" + f" {group.upper()} ".join(parts) + ")"
+    if "not" in spec:
+        return f"(NOT {_compile(spec['not'], alias, params, fields)})"
+
+    field = spec.get("field")
+    op = str(spec.get("op", "=")).lower().strip()
+    value = spec.get("value")
+    if field not in FILTER_FIELDS:
+        raise ValueError(f"Err017: Unknown filter field {field!r}, expected one of {', '.join(FILTER_FIELDS)}")
+    if op not in OPERATORS:
+        raise ValueError(f"Err017: Unknown filter operator {op!r} for '{field}', expected one of {', '.join(OPERATORS)}")
+    fields.add(field)
+    column = f"{alias}.{field}"
+
+    if op in NULL_OPS:
+        if op == "is null":
+            return f"({column} IS NULL OR {column} = '')"
+        return f"({column} IS NOT NULL AND {column} != '')"
+    if op in LIST_OPS:
+        if not isinstance(value, list) or not value:
+            raise ValueError(f"Err017: '{op}' on '{field}' expects a non-empty list")
+        params.extend(value)
+        return f"{column} {op.upper()} ({', '.join('?' * len(value))})"
+    if op == "between":
+        if not isinstance(value, list) or len(value) != 2:
+            raise ValueError(f"Err017: 'between' on '{field}' expects a list of two values")
+        params.extend(value)
+        return f"{column} BETWEEN ? AND ?"
+    if value is None or isinstance(value, (list, dict)):
+        raise ValueError(f"Err017: '{op}' on '{field}' expects a single value")
+    params.append(value)
+    return f"{column} {op.upper()} ?"
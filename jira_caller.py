@@ -1,6 +1,20 @@
-from jira import JIRA
+from jira import JIRA, JIRAError
+from jira.resources import Issue
+from requests.adapters import HTTPAdapter
+from requests.exceptions import ConnectionError, Timeout
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from email.utils import parsedate_to_datetime
 import os
+import re
+import json
+import time
+import random
 import logging
+import threading
+from itertools import islice
+from util import jira_extra_fields
 
 JIRA_SERVER = os.getenv("JIRA_SERVER")
 JIRA_USERNAME = os.getenv("JIRA_USER")
@@ -10,30 +24,257 @@ if not JIRA_SERVER or not JIRA_USERNAME or not JIRA_API_TOKEN:
     msg = "WARN901:JIRA_SERVER, JIRA_USERNAME, and JIRA_API_TOKEN are not set in environment variables. Only can use local SQLite database."
     logging.warning(msg)
 
+# Fields read by sqlite.parse_issue_2_json
+JIRA_FIELDS = ["summary", "description", "status", "assignee", "reporter", "created", "updated",
+               "priority", "labels", "components", "issuetype"]
+
+def jira_fields() -> list:
+    """
+    Returns the fields requested from JIRA: JIRA_FIELDS plus JIRA_EXTRA_FIELDS.
+    """
+    return JIRA_FIELDS + [field for field in jira_extra_fields() if field not in JIRA_FIELDS]
+
+# Status codes worth retrying: rate limiting and transient server errors
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+_client = None
+_client_lock = threading.Lock()
+# Limits the JIRA requests in flight across all threads of the process
+_request_slots = threading.BoundedSemaphore(int(os.getenv("JIRA_MAX_CONCURRENCY", 4)))
+
 def get_jira_client():
     """
-    Returns a JIRA client instance.
+    Returns the shared JIRA client instance, creating it on first use.
+
+    The client keeps its HTTP connections alive in a pool sized by JIRA_MAX_CONCURRENCY,
+    so authentication and the server info handshake happen once per process.
     """
+    global _client
+    with _client_lock:
+        if _client is not None:
+            return _client
+        try:
+            # Retries are done by call_jira, so the library's own retry loop is disabled
+            jira = call_jira(lambda: JIRA(
+                server=JIRA_SERVER,
+                basic_auth=(JIRA_USERNAME, JIRA_API_TOKEN),
+                max_retries=0,
+                timeout=float(os.getenv("JIRA_TIMEOUT", 30)),
+            ))
+            pool_size = int(os.getenv("JIRA_MAX_CONCURRENCY", 4))
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+            jira._session.mount("https://", adapter)
+            jira._session.mount("http://", adapter)
+            _client = jira
+            return _client
+        except Exception as e:
+            msg = "Err108:Failed to connect to JIRA. Please check your credentials and server URL."
+            logging.error(msg)
+            raise RuntimeError(msg) from e
+
+def close_jira_client():
+    """
+    Closes the shared JIRA client. The next get_jira_client() call creates a new one.
+    """
+    global _client
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+        _client = None
+
+def call_jira(request):
+    """
+    Runs a JIRA request, retrying rate-limited and transient failures with backoff.
+
+    At most JIRA_MAX_CONCURRENCY requests run at the same time. A failed request is
+    retried up to JIRA_MAX_RETRIES times; the delay follows the Retry-After header when
+    JIRA sends one, and otherwise grows exponentially from JIRA_RETRY_BACKOFF seconds
+    with jitter, capped at JIRA_MAX_RETRY_DELAY seconds.
+
+    Args:
+        request (callable): Function without arguments that performs the request.
+
+    Returns:
+        The return value of request.
+    """
+    max_retries = int(os.getenv("JIRA_MAX_RETRIES", 5))
+    backoff = float(os.getenv("JIRA_RETRY_BACKOFF", 0.5))
+    max_delay = float(os.getenv("JIRA_MAX_RETRY_DELAY", 60))
+
+    attempt = 0
+    while True:
+        try:
+            with _request_slots:
+                return request()
+        except (JIRAError, ConnectionError, Timeout) as e:
+            status_code = getattr(e, "status_code", None)
+            retryable = not isinstance(e, JIRAError) or status_code in RETRY_STATUS_CODES
+            if not retryable or attempt >= max_retries:
+                raise
+            attempt += 1
+            delay = retry_after_seconds(e)
+            if delay is None:
+                delay = backoff * (2 ** (attempt - 1)) * random.uniform(0.5, 1.0)
+            delay = min(delay, max_delay)
+            logging.warning(f"JIRA request failed ({status_code or e}), retry {attempt}/{max_retries} in {delay:.2f}s")
+            time.sleep(delay)
+
+def retry_after_seconds(error):
+    """
+    Returns the delay requested by the Retry-After header of a failed response, if any.
+    """
+    response = getattr(error, "response", None)
+    value = response.headers.get("Retry-After") if response is not None else None
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
     try:
-        jira = JIRA(
-            server=JIRA_SERVER,
-            basic_auth=(JIRA_USERNAME, JIRA_API_TOKEN)
-        )
-        return jira
+        retry_at = parsedate_to_datetime(value)
+        return max((retry_at - datetime.now(retry_at.tzinfo)).total_seconds(), 0.0)
+    except (TypeError, ValueError):
+        return None
+    
+def jql_query(jql: str) -> list:
+    """
+    Executes a JQL query and returns the results.
+    """
+    return [issue for page in jql_query_pages(jql) for issue in page]
+
+def jql_query_pages(jql: str, page_size: int = 0, workers: int = 0):
+    """
+    Executes a JQL query and yields the matching issues one page at a time.
+
+    Only the fields returned by jira_fields() are requested.
+
+    Jira Cloud pages are followed with nextPageToken, one after the other. On Jira
+    Server/Data Center the first page reports the total issue count, and the remaining
+    pages are then fetched by startAt offset with up to `workers` requests at a time.
+    Pages are always yielded in offset order.
+
+    Args:
+        jql (str): JQL query string.
+        page_size (int): Issues per request. Defaults to JIRA_PAGE_SIZE (100).
+        workers (int): Pages fetched in parallel. Defaults to JIRA_FETCH_WORKERS (4).
+
+    Yields:
+        list: The issues of one page.
+    """
+    if page_size <= 0:
+        page_size = int(os.getenv("JIRA_PAGE_SIZE", 100))
+    if workers <= 0:
+        workers = int(os.getenv("JIRA_FETCH_WORKERS", 4))
+    jira = get_jira_client()
+
+    if jira._is_cloud:
+        next_page_token = None
+        while True:
+            result = fetch_page(jira, jql, page_size, next_page_token=next_page_token)
+            if result.get("issues"):
+                yield to_issues(jira, result)
+            next_page_token = result.get("nextPageToken")
+            if not next_page_token or result.get("isLast", False):
+                return
+
+    first = fetch_page(jira, jql, page_size, start_at=0)
+    if not first.get("issues"):
+        return
+    yield to_issues(jira, first)
+
+    # JIRA may cap maxResults below the requested page size
+    step = first.get("maxResults") or len(first["issues"])
+    offsets = iter(range(len(first["issues"]), first.get("total", 0), step))
+    if workers <= 1:
+        for start_at in offsets:
+            result = fetch_page(jira, jql, step, start_at=start_at)
+            if not result.get("issues"):
+                return
+            yield to_issues(jira, result)
+        return
+
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="jql-page")
+    try:
+        pending = deque(executor.submit(fetch_page, jira, jql, step, start_at=start_at)
+                        for start_at in islice(offsets, workers))
+        while pending:
+            result = pending.popleft().result()
+            start_at = next(offsets, None)
+            if start_at is not None:
+                pending.append(executor.submit(fetch_page, jira, jql, step, start_at=start_at))
+            if result.get("issues"):
+                yield to_issues(jira, result)
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+def fetch_page(jira, jql: str, page_size: int, start_at: int = 0, next_page_token: str = None) -> dict:
+    """
+    Fetches one page of a JQL query as JSON.
+    """
+    try:
+        if jira._is_cloud:
+            return call_jira(lambda: jira.enhanced_search_issues(jql, nextPageToken=next_page_token, maxResults=page_size,
+                                                                 fields=jira_fields(), json_result=True))
+        return call_jira(lambda: jira.search_issues(jql, startAt=start_at, maxResults=page_size,
+                                                    fields=jira_fields(), json_result=True))
     except Exception as e:
-        msg = "Err108:Failed to connect to JIRA. Please check your credentials and server URL."
+        msg = f"Err109: Failed to execute JQL query: {e}"
         logging.error(msg)
         raise RuntimeError(msg) from e
+
+def to_issues(jira, result: dict) -> list:
+    """
+    Converts the issues of a search result page into Issue resources.
+    """
+    return [Issue(jira._options, jira._session, raw=raw_issue) for raw_issue in result.get("issues", [])]
     
-def jql_query(jql: str) -> list:
+def measure_payload(jql: str, sample_size: int = 50) -> dict:
     """
-    Executes a JQL query and returns the results.
+    Measures the JSON bytes per issue with and without field projection.
+
+    Fetches the first sample_size issues of a JQL query twice, once with all fields
+    and once with jira_fields(), and compares the size of the issue JSON.
+
+    Returns:
+        dict: Issue count, bytes per issue for both fetches and the bytes saved.
     """
     jira = get_jira_client()
     try:
-        issues = jira.search_issues(jql)
-        return issues
+        if jira._is_cloud:
+            full = call_jira(lambda: jira.enhanced_search_issues(jql, maxResults=sample_size, fields="*all", json_result=True))
+            projected = call_jira(lambda: jira.enhanced_search_issues(jql, maxResults=sample_size, fields=jira_fields(), json_result=True))
+        else:
+            full = call_jira(lambda: jira.search_issues(jql, maxResults=sample_size, fields="*all", json_result=True))
+            projected = call_jira(lambda: jira.search_issues(jql, maxResults=sample_size, fields=jira_fields(), json_result=True))
     except Exception as e:
         msg = f"Err109: Failed to execute JQL query: {e}"
         logging.error(msg)
-        raise RuntimeError(msg) from e
\ No newline at end of file
+        raise RuntimeError(msg) from e
+
+    count = len(full.get("issues", []))
+    if count == 0:
+        return {"issues": 0, "all_fields_bytes": 0, "projected_bytes": 0, "saved_bytes": 0, "saved_ratio": 0.0}
+
+    full_bytes = sum(len(json.dumps(issue)) for issue in full.get("issues", [])) / count
+    projected_bytes = sum(len(json.dumps(issue)) for issue in projected.get("issues", [])) / count
+    report = {
+        "issues": count,
+        "all_fields_bytes": round(full_bytes),
+        "projected_bytes": round(projected_bytes),
+        "saved_bytes": round(full_bytes - projected_bytes),
+        "saved_ratio": round(1 - projected_bytes / full_bytes, 3) if full_bytes else 0.0,
+    }
+    logging.info(f"JIRA payload per issue for '{jql}': {report}")
+    return report
+
+def updated_since_jql(jql: str, since: datetime) -> str:
+    """
+    Restrict a JQL query to issues updated at or after since, keeping its ORDER BY clause.
+    """
+    parts = re.split(r"\border\s+by\b", jql, maxsplit=1, flags=re.IGNORECASE)
+    condition = f'updated >= "{since:%Y/%m/%d %H:%M}"'
+    query = f"({parts[0].strip()}) AND {condition}" if parts[0].strip() else condition
+    if len(parts) > 1:
+        query += f" ORDER BY {parts[1].strip()}"
+    return query
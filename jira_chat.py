@@ -104,7 +104,7 @@ async def chat_loop():
         if user_input.startswith("p>"):
             cur_project = user_input[2:]
             # Initialize the project in the database
-            init_result = init_project(cur_project)
+            init_result = await init_project(cur_project)
             if init_result.startswith("Err") and not init_result.startswith("Err001:"):
                 print(f"Bot: Error initializing project '{cur_project}': {init_result}")
                 cur_project = None
@@ -0,0 +1,190 @@
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+JOB_STATES = ("queued", "running", "succeeded", "failed", "cancelled")
+
+# Counters a job reports while it runs
+JOB_COUNTERS = ("fetched", "embedded", "written", "added", "updated", "skipped", "failed")
+
+
+class JobCancelled(Exception):
+    """
+    Raised inside a job when it has been cancelled.
+    """
+
+
+class Job:
+    """
+    A background task writing to one project, with its state and progress counters.
+    """
+
+    def __init__(self, kind: str, project_name: str, func):
+        """
+        Args:
+            kind (str): What the job does, e.g. 'init_project'.
+            project_name (str): The project the job writes to.
+            func (callable): Called with the job when it runs. Its return value is the job's message.
+        """
+        self.id = uuid.uuid4().hex[:12]
+        self.kind = kind
+        self.project_name = project_name
+        self.func = func
+        self.state = "queued"
+        self.message = ""
+        self.counts = dict.fromkeys(JOB_COUNTERS, 0)
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self._cancel = threading.Event()
+        self._done = threading.Event()
+        self._lock = threading.Lock()
+
+    def add(self, **counts):
+        """
+        Add to the progress counters, e.g. job.add(fetched=100).
+        """
+        with self._lock:
+            for name, value in counts.items():
+                self.counts[name] = self.counts.get(name, 0) + value
+
+    def check_cancelled(self):
+        """
+        Raises:
+            JobCancelled: If the job has been cancelled. Jobs call this between steps.
+        """
+        if self._cancel.is_set():
+            raise JobCancelled()
+
+    def wait(self, timeout: float = None) -> bool:
+        """
+        Wait until the job has finished.
+
+        Returns:
+            bool: True if the job has finished.
+        """
+        return self._done.wait(timeout)
+
+    def status(self) -> dict:
+        with self._lock:
+            finished = self.finished or time.time()
+            return {
+                "job_id": self.id,
+                "kind": self.kind,
+                "project": self.project_name,
+                "state": self.state,
+                "message": self.message,
+                "cancel_requested": self._cancel.is_set() and self.state == "running",
+                **self.counts,
+                "queued_seconds": round((self.started or finished) - self.created, 3),
+                "run_seconds": round(finished - self.started, 3) if self.started else 0.0,
+            }
+
+
+class JobManager:
+    """
+    Run jobs in the background, one at a time per project.
+
+    Jobs of different projects run in parallel on up to max_workers threads. Jobs of
+    the same project wait in a queue, so each project has a single writer. The last
+    history_size finished jobs are kept for status queries.
+    """
+
+    def __init__(self, max_workers: int, history_size: int = 100):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self._queues = {}           # project name -> deque of queued jobs
+        self._running = {}          # project name -> running job
+        self._jobs = OrderedDict()  # job id -> job, oldest first
+        self._history_size = history_size
+        self._lock = threading.Lock()
+
+    def submit(self, kind: str, project_name: str, func) -> Job:
+        """
+        Queue a job for a project.
+
+        Returns:
+            Job: The queued job.
+        """
+        job = Job(kind, project_name, func)
+        with self._lock:
+            self._jobs[job.id] = job
+            self._queues.setdefault(project_name, deque()).append(job)
+            self._start_next(project_name)
+        logging.info(f"Queued job {job.id} ({kind}) for project '{project_name}'")
+        return job
+
+    def get(self, job_id: str) -> Job:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def jobs(self, project_name: str = "") -> list:
+        """
+        Return the known jobs, optionally of one project, oldest first.
+        """
+        with self._lock:
+            return [job for job in self._jobs.values() if not project_name or job.project_name == project_name]
+
+    def cancel(self, job_id: str) -> Job:
+        """
+        Cancel a job. A queued job is dropped from its queue, a running job stops at its
+        next check_cancelled call.
+
+        Returns:
+            Job: The job, or None if it is unknown.
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.state not in ("queued", "running"):
+                return job
+            job._cancel.set()
+            queued = self._queues.get(job.project_name)
+            if job.state == "queued" and queued and job in queued:
+                queued.remove(job)
+                self._finish(job, "cancelled", "Cancelled before it started")
+        return job
+
+    def _start_next(self, project_name: str):
+        # Called with the lock held
+        queued = self._queues.get(project_name)
+        if project_name in self._running or not queued:
+            return
+        job = queued.popleft()
+        self._running[project_name] = job
+        job.state = "running"
+        job.started = time.time()
+        self._executor.submit(self._run, job)
+
+    def _run(self, job: Job):
+        try:
+            job.check_cancelled()
+            message = job.func(job)
+            state = "failed" if isinstance(message, str) and message.startswith("Err") else "succeeded"
+        except JobCancelled:
+            state, message = "cancelled", "Cancelled while running"
+        except Exception as e:
+            state, message = "failed", f"Err119: Job {job.id} ({job.kind}) of project '{job.project_name}' failed: {e}"
+            logging.error(message)
+        with self._lock:
+            self._running.pop(job.project_name, None)
+            self._finish(job, state, message)
+            self._start_next(job.project_name)
+        logging.info(f"Job {job.id} ({job.kind}) of project '{job.project_name}' {state}: {message}")
+
+    def _finish(self, job: Job, state: str, message):
+        # Called with the lock held
+        with job._lock:
+            job.state = state
+            job.message = message if isinstance(message, str) else str(message)
+            job.finished = time.time()
+        job._done.set()
+        finished = [job_id for job_id, other in self._jobs.items() if other.state not in ("queued", "running")]
+        for job_id in finished[:max(0, len(finished) - self._history_size)]:
+            del self._jobs[job_id]
+
+
+# Ingestion jobs of the MCP server
+job_manager = JobManager(int(os.getenv("JOB_WORKERS", 2)), int(os.getenv("JOB_HISTORY_SIZE", 100)))
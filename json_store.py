@@ -0,0 +1,59 @@
+import re
+import zlib
+from collections import Counter
+
+# JSON keys together with their value when it is short: '"status": "Open"', '"assignee": null'
+TOKEN_RE = re.compile(r'"[^"\\]{1,40}"\s*:\s*(?:"[^"\\]{0,40}"|[-\w.]+)?')
+
+# zlib only looks back 32 KB, so a larger dictionary would not be used
+MAX_DICTIONARY_SIZE = 32768
+
+
+def train_dictionary(samples: list, size: int = MAX_DICTIONARY_SIZE) -> bytes:
+    """
+    Build a zlib preset dictionary from sample JSON documents.
+
+    Small documents compress poorly on their own because every key has to be spelled
+    out once. The dictionary holds the keys and key/value pairs that recur across the
+    samples, most valuable last where zlib finds them with the shortest distances.
+
+    Args:
+        samples (list): JSON texts of typical documents.
+        size (int): Maximum dictionary size in bytes.
+
+    Returns:
+        bytes: The dictionary, empty if nothing recurs.
+    """
+    counts = Counter()
+    for text in samples:
+        counts.update(set(TOKEN_RE.findall(text)))
+    # Bytes saved per sample by having the token in the dictionary
+    common = sorted((token for token, count in counts.items() if count > 1),
+                    key=lambda token: counts[token] * len(token), reverse=True)
+    chosen = []
+    total = 0
+    for token in common:
+        length = len(token.encode("utf-8"))
+        if total + length <= min(size, MAX_DICTIONARY_SIZE):
+            chosen.append(token)
+            total += length
+    return "".join(reversed(chosen)).encode("utf-8")
+
+
+def compress_json(text: str, zdict: bytes = b"", level: int = 6) -> bytes:
+    """
+    Compress a JSON text as raw deflate, using the preset dictionary if one is given.
+    """
+    if zdict:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -15, zdict=zdict)
+    else:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+    return compressor.compress(text.encode("utf-8")) + compressor.flush()
+
+
+def decompress_json(data: bytes, zdict: bytes = b"") -> str:
+    """
+    Decompress a JSON text written by compress_json with the same dictionary.
+    """
+    decompressor = zlib.decompressobj(-15, zdict=zdict) if zdict else zlib.decompressobj(-15)
+    return (decompressor.decompress(data) + decompressor.flush()).decode("utf-8")
@@ -0,0 +1,81 @@
+import re
+
+# JIRA issue keys such as PRJ-123
+TICKET_KEY_RE = re.compile(r"\b[A-Z][A-Z0-9_]+-\d+\b")
+
+# Identifier-like tokens: error codes, versions, class and component names
+IDENTIFIER_RE = re.compile(r"^(?=.*[0-9_.:/\\-]|.*[a-z][A-Z]|[A-Z]{2,}$)\S+$")
+
+
+def ticket_keys(prompt: str) -> list:
+    """
+    Return the JIRA issue keys mentioned in a prompt, in order and without duplicates.
+    """
+    return list(dict.fromkeys(TICKET_KEY_RE.findall(prompt or "")))
+
+
+def is_lexical_query(prompt: str) -> bool:
+    """
+    Tell whether a prompt is an exact-term lookup that embedding would not help with.
+
+    Lexical prompts are quoted phrases, issue keys, and single identifier-like tokens
+    such as error codes (Err004, ORA-00942), versions or CamelCase component names.
+    Natural-language prompts are not lexical.
+    """
+    prompt = (prompt or "").strip()
+    if len(prompt) > 1 and prompt.startswith('"') and prompt.endswith('"'):
+        return True
+    tokens = prompt.split()
+    if not tokens:
+        return False
+    if all(TICKET_KEY_RE.fullmatch(token.strip(",;")) for token in tokens):
+        return True
+    return len(tokens) == 1 and bool(IDENTIFIER_RE.match(tokens[0].rstrip(".,;:?!")))
+
+
+def fts_match_query(prompt: str) -> str:
+    """
+    Build an FTS5 MATCH expression for a prompt.
+
+    A quoted prompt is searched as one phrase. Otherwise any of the words may match and
+    BM25 ranks tickets matching more of them first. Every term is quoted, so FTS5 query
+    syntax in the prompt is searched for literally.
+
+    Returns:
+        str: The MATCH expression, or "" if the prompt has no terms.
+    """
+    prompt = (prompt or "").strip()
+    if len(prompt) > 1 and prompt.startswith('"') and prompt.endswith('"'):
+        terms = [prompt[1:-1]]
+    else:
+        terms = prompt.split()
+    terms = [term.replace('"', '""') for term in terms if re.search(r"\w", term)]
+    return " OR ".join(f'"{term}"' for term in terms)
+
+
+def reciprocal_rank_fusion(rankings: list, top_n: int, k: int = 60) -> list:
+    """
+    Merge ranked ticket lists with reciprocal rank fusion.
+
+    Each ticket scores the sum of 1 / (k + rank) over the lists it appears in, so tickets
+    ranked well by several searches come first without comparing BM25 scores to vector
+    distances.
+
+    Args:
+        rankings (list): Lists of ticket dictionaries, best first.
+        top_n (int): Number of tickets to return.
+        k (int): Rank offset damping the weight of the first ranks.
+
+    Returns:
+        list: The top_n tickets with their fused 'score', best first. A ticket keeps the
+            fields of the first list it appears in.
+    """
+    scores = {}
+    tickets = {}
+    for ranking in rankings:
+        for rank, ticket in enumerate(ranking, start=1):
+            ticket_id = ticket["ticket_id"]
+            scores[ticket_id] = scores.get(ticket_id, 0.0) + 1.0 / (k + rank)
+            tickets.setdefault(ticket_id, ticket)
+    ordered = sorted(scores, key=lambda ticket_id: scores[ticket_id], reverse=True)[:top_n]
+    return [dict(tickets[ticket_id], score=scores[ticket_id]) for ticket_id in ordered]
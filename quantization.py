@@ -0,0 +1,75 @@
+from functools import lru_cache
+import numpy as np
+
+# Dimensions of the model's vectors
+FULL_DIMS = 384
+
+VECTOR_TYPES = ("float", "int8", "bit")
+
+# sqlite-vec expression converting a bound vector to the stored type
+VECTOR_SQL = {"float": "?", "int8": "vec_int8(?)", "bit": "vec_quantize_binary(?)"}
+
+
+def check_vector_options(vector_type: str, dims: int):
+    """
+    Raises:
+        ValueError: If the vector type or number of dimensions is not supported.
+    """
+    if vector_type not in VECTOR_TYPES:
+        raise ValueError(f"Err022: Unknown vector type '{vector_type}', expected one of {', '.join(VECTOR_TYPES)}")
+    if not 8 <= dims <= FULL_DIMS:
+        raise ValueError(f"Err022: Vector dimensions must be between 8 and {FULL_DIMS}, got {dims}")
+    if vector_type == "bit" and dims % 8 != 0:
+        raise ValueError(f"Err022: Bit vector dimensions must be a multiple of 8, got {dims}")
+
+
+def is_compact(vector_type: str, dims: int) -> bool:
+    """
+    Tell whether vectors are stored in a reduced form that needs rescoring.
+    """
+    return vector_type != "float" or dims != FULL_DIMS
+
+
+def column_sql(vector_type: str, dims: int) -> str:
+    """
+    Return the vec0 column definition of the stored vectors, e.g. 'embedding int8[192]'.
+    """
+    return f"embedding {vector_type}[{dims}]"
+
+
+@lru_cache(maxsize=8)
+def projection_matrix(dims: int, seed: int) -> np.ndarray:
+    """
+    Return the random projection from FULL_DIMS to dims dimensions for a seed.
+
+    Gaussian random projections preserve distances within a small factor
+    (Johnson-Lindenstrauss), and the seed makes them reproducible, so the same matrix
+    is used for the stored vectors and the queries.
+    """
+    rng = np.random.RandomState(seed)
+    return (rng.standard_normal((FULL_DIMS, dims)) / np.sqrt(dims)).astype(np.float32)
+
+
+def compact_vector(vector: list, vector_type: str, dims: int, seed: int) -> bytes:
+    """
+    Encode a full vector for the compact vec0 column.
+
+    The vector is projected to dims dimensions first when dims is below FULL_DIMS.
+    int8 vectors are normalized to unit length and scaled so that four standard
+    deviations of a component fill the int8 range. Bit vectors are returned as float32
+    and quantized by sign in SQL (vec_quantize_binary).
+
+    Returns:
+        bytes: The bytes to bind to VECTOR_SQL[vector_type].
+    """
+    values = np.asarray(vector, dtype=np.float32)
+    if dims != FULL_DIMS:
+        values = values @ projection_matrix(dims, seed)
+    if vector_type == "int8":
+        norm = np.linalg.norm(values)
+        if norm > 0:
+            values = values / norm
+        # A component of a random unit vector has a standard deviation of 1 / sqrt(dims)
+        scale = 127 * np.sqrt(dims) / 4
+        return np.clip(np.round(values * scale), -127, 127).astype(np.int8).tobytes()
+    return values.astype(np.float32).tobytes()
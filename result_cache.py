@@ -0,0 +1,88 @@
+import threading
+from collections import OrderedDict
+
+
+class SearchResultCache:
+    """
+    Bounded LRU cache of search results, invalidated per project by a write generation.
+
+    Every write to a project database bumps the project's generation. A cached result
+    is only returned while the generation it was stored under is still current, so
+    results are dropped exactly when the project's data changes.
+    """
+
+    def __init__(self, max_size: int):
+        """
+        Args:
+            max_size (int): Maximum number of results kept. 0 disables the cache.
+        """
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._results = OrderedDict()  # (project name, key) -> (generation, result)
+        self._generations = {}         # project name -> write generation
+        self._lock = threading.Lock()
+
+    def generation(self, project_name: str) -> int:
+        """
+        Return the current write generation of a project.
+        """
+        with self._lock:
+            return self._generations.get(project_name, 0)
+
+    def bump(self, project_name: str):
+        """
+        Mark the data of a project as changed, invalidating its cached results.
+        """
+        with self._lock:
+            self._generations[project_name] = self._generations.get(project_name, 0) + 1
+
+    def get(self, project_name: str, key):
+        """
+        Return the cached result for key, or None if it is missing or stale.
+        """
+        with self._lock:
+            entry = self._results.get((project_name, key))
+            if entry is None:
+                self.misses += 1
+                return None
+            generation, result = entry
+            if generation != self._generations.get(project_name, 0):
+                del self._results[(project_name, key)]
+                self.invalidations += 1
+                self.misses += 1
+                return None
+            self._results.move_to_end((project_name, key))
+            self.hits += 1
+            return result
+
+    def put(self, project_name: str, key, result, generation: int):
+        """
+        Store a result computed while the project was at the given generation.
+        """
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            # The data changed while the result was computed
+            if generation != self._generations.get(project_name, 0):
+                return
+            self._results[(project_name, key)] = (generation, result)
+            self._results.move_to_end((project_name, key))
+            while len(self._results) > self.max_size:
+                self._results.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._results),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
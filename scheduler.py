@@ -0,0 +1,185 @@
+import json
+import logging
+import os
+import random
+import threading
+import time
+
+# Ticket deltas kept from the job of the last sync
+SYNC_COUNTERS = ("fetched", "added", "updated", "skipped", "failed")
+
+
+class SyncScheduler:
+    """
+    Run incremental syncs of registered projects at their intervals.
+
+    The registry of projects, their JQL and interval and the result of their last sync
+    are kept in a JSON file so they survive restarts. Each due time is spread by a
+    random jitter of up to jitter * interval, so projects registered together do not
+    hit JIRA together, and at most max_concurrent scheduled syncs run at once.
+    """
+
+    def __init__(self, submit, path: str, max_concurrent: int = 2, jitter: float = 0.1, tick: float = 5.0):
+        """
+        Args:
+            submit (callable): Called with (project_name, jql) to start a sync. Returns its Job.
+            path (str): JSON file of the registry.
+            max_concurrent (int): Maximum number of scheduled syncs running at once.
+            jitter (float): Fraction of the interval by which due times are randomly spread.
+            tick (float): Seconds between checks for due projects.
+        """
+        self._submit = submit
+        self.path = path
+        self.max_concurrent = max_concurrent
+        self.jitter = jitter
+        self.tick = tick
+        self._entries = {}  # project name -> registry entry
+        self._jobs = {}     # project name -> job of its running sync
+        self._lock = threading.RLock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._load()
+
+    def register(self, project_name: str, jql: str = "", interval_minutes: float = 60) -> dict:
+        """
+        Add a project to the registry or change its JQL and interval.
+
+        Raises:
+            ValueError: If the interval is below SYNC_MIN_INTERVAL_MINUTES.
+
+        Returns:
+            dict: The project's registry entry.
+        """
+        min_interval = float(os.getenv("SYNC_MIN_INTERVAL_MINUTES", 5))
+        if interval_minutes < min_interval:
+            raise ValueError(f"Err025: Sync interval must be at least {min_interval} minutes, got {interval_minutes}")
+        with self._lock:
+            entry = self._entries.setdefault(project_name, {"last_sync": None, "last_state": "", "last_message": "",
+                                                            "last_duration": None, "syncs": 0, "failures": 0,
+                                                            **dict.fromkeys(SYNC_COUNTERS, 0)})
+            entry["jql"] = jql
+            entry["interval_minutes"] = interval_minutes
+            # The first sync is spread over the jitter window only
+            entry["next_due"] = time.time() + random.uniform(0, self.jitter * interval_minutes * 60)
+            self._save()
+        self._wakeup.set()
+        logging.info(f"Registered project '{project_name}' for a sync every {interval_minutes} minutes")
+        return dict(entry)
+
+    def unregister(self, project_name: str) -> bool:
+        """
+        Remove a project from the registry. A sync already running is not stopped.
+
+        Returns:
+            bool: False if the project was not registered.
+        """
+        with self._lock:
+            if self._entries.pop(project_name, None) is None:
+                return False
+            self._save()
+        logging.info(f"Unregistered project '{project_name}' from scheduled syncs")
+        return True
+
+    def status(self) -> dict:
+        """
+        Return the registry entry of each project, with its job id while a sync runs.
+        """
+        with self._lock:
+            self._collect()
+            return {
+                project_name: {**entry, "running_job": self._jobs[project_name].id if project_name in self._jobs else None}
+                for project_name, entry in self._entries.items()
+            }
+
+    def start(self):
+        """
+        Start the scheduler thread, once.
+        """
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name="sync-scheduler", daemon=True)
+                self._thread.start()
+
+    def run_due(self, now: float = None) -> list:
+        """
+        Record finished syncs and start the due ones, up to max_concurrent running.
+
+        Returns:
+            list: Names of the projects whose sync was started.
+        """
+        now = now or time.time()
+        started = []
+        with self._lock:
+            self._collect()
+            due = sorted((entry["next_due"], project_name) for project_name, entry in self._entries.items()
+                         if entry["next_due"] <= now and project_name not in self._jobs)
+            for _, project_name in due[:max(0, self.max_concurrent - len(self._jobs))]:
+                entry = self._entries[project_name]
+                try:
+                    self._jobs[project_name] = self._submit(project_name, entry["jql"])
+                    started.append(project_name)
+                except Exception as e:
+                    logging.error(f"Err121: Failed to start the scheduled sync of project '{project_name}': {e}")
+                entry["next_due"] = now + self._interval(entry)
+            if started:
+                self._save()
+        return started
+
+    def _loop(self):
+        while True:
+            try:
+                self.run_due()
+            except Exception as e:
+                logging.error(f"Err121: Sync scheduler failed: {e}")
+            self._wakeup.wait(self.tick)
+            self._wakeup.clear()
+
+    def _collect(self):
+        # Called with the lock held. Record the result of the finished syncs.
+        changed = False
+        for project_name, job in list(self._jobs.items()):
+            if not job.wait(0):
+                continue
+            del self._jobs[project_name]
+            entry = self._entries.get(project_name)
+            if entry is None:
+                continue
+            status = job.status()
+            entry["last_sync"] = job.finished
+            entry["last_duration"] = status["run_seconds"]
+            entry["last_state"] = status["state"]
+            entry["last_message"] = status["message"]
+            entry["syncs"] += 1
+            entry["failures"] += status["state"] != "succeeded"
+            for name in SYNC_COUNTERS:
+                entry[name] = status[name]
+            changed = True
+        if changed:
+            self._save()
+
+    def _interval(self, entry: dict) -> float:
+        seconds = entry["interval_minutes"] * 60
+        return seconds * (1 + random.uniform(-self.jitter, self.jitter))
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self._entries = json.load(f)
+        except (OSError, ValueError) as e:
+            logging.error(f"Err121: Failed to read the sync registry {self.path}: {e}")
+            return
+        # Syncs missed while the server was down are spread over the jitter window
+        now = time.time()
+        for entry in self._entries.values():
+            if entry["next_due"] < now:
+                entry["next_due"] = now + random.uniform(0, self.jitter * entry["interval_minutes"] * 60)
+
+    def _save(self):
+        # Called with the lock held. Replace the file atomically.
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._entries, f, indent=2)
+        os.replace(tmp_path, self.path)
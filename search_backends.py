@@ -0,0 +1,487 @@
+import json
+import logging
+import os
+import threading
+import numpy as np
+from executors import io_executor
+
+SEARCH_BACKENDS = ("vec0", "numpy", "ivf")
+
+
+def check_search_backend(backend: str):
+    """
+    Raises:
+        ValueError: If the search backend is not supported.
+    """
+    if backend not in SEARCH_BACKENDS:
+        raise ValueError(f"Err023: Unknown search backend '{backend}', expected one of {', '.join(SEARCH_BACKENDS)}")
+
+
+class NumpyIndex:
+    """
+    Brute-force L2 search over a memory-mapped float32 matrix of a project's vectors.
+
+    The vectors, their row ids and their squared norms are kept in three .npy files next
+    to the project database, so the operating system pages them in and shares them
+    instead of the process loading them. A search is one matrix product over the
+    matrix followed by an argpartition top-k, for any number of queries at once.
+
+    Slots of deleted vectors have id 0 and are reused by later inserts. The files grow
+    by doubling. The state file records the last change of the database applied, see
+    sqlite.sync_vector_index.
+    """
+
+    def __init__(self, path_prefix: str, dims: int = 384):
+        """
+        Args:
+            path_prefix (str): Path of the files without extension, e.g. databases/PRJ.
+            dims (int): Dimensions of the vectors.
+        """
+        self.path_prefix = path_prefix
+        self.dims = dims
+        self.seq = 0  # Last change applied
+        self.lock = threading.RLock()
+        self._vectors = None
+        self._ids = None
+        self._sqnorms = None
+        self._slots = {}  # row id -> slot
+        self._free = []
+        self._size = 0    # Slots in use, including deleted ones
+
+    def paths(self) -> dict:
+        return {
+            "vectors": f"{self.path_prefix}.vec.npy",
+            "ids": f"{self.path_prefix}.ids.npy",
+            "sqnorms": f"{self.path_prefix}.sqn.npy",
+            "state": f"{self.path_prefix}.vec.json",
+        }
+
+    def load(self) -> bool:
+        """
+        Open the files of an existing index.
+
+        Returns:
+            bool: False if the files are missing or do not match, and the index must be rebuilt.
+        """
+        paths = self.paths()
+        try:
+            with open(paths["state"], encoding="utf-8") as f:
+                state = json.load(f)
+            arrays = {name: np.load(paths[name], mmap_mode="r+") for name in self._array_specs(0)}
+        except (OSError, ValueError) as e:
+            logging.info(f"Vector index at {self.path_prefix} is not usable, it will be rebuilt: {e}")
+            return False
+        if arrays["vectors"].shape[1] != self.dims or len({len(array) for array in arrays.values()}) != 1:
+            return False
+        for name, array in arrays.items():
+            setattr(self, f"_{name}", array)
+        ids = self._ids
+        used = np.flatnonzero(ids)
+        self._size = int(used[-1]) + 1 if len(used) else 0
+        self._slots = {int(ids[slot]): int(slot) for slot in used}
+        self._free = [int(slot) for slot in np.flatnonzero(ids[:self._size] == 0)]
+        self.seq = state.get("seq", 0)
+        return self._load_state(state)
+
+    def clear(self, capacity: int = 0):
+        """
+        Empty the index, making room for capacity vectors.
+        """
+        with self.lock:
+            self._size = 0
+            self._slots = {}
+            self._free = []
+            self._allocate(max(capacity, 1024))
+
+    def upsert(self, ids: list, vectors: np.ndarray) -> list:
+        """
+        Insert or replace vectors by row id.
+
+        Returns:
+            list: The slots of the vectors.
+        """
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dims)
+        slots = []
+        with self.lock:
+            for row_id, vector in zip(ids, vectors):
+                slot = self._slots.get(row_id)
+                if slot is None:
+                    slot = self._free.pop() if self._free else self._next_slot()
+                    self._slots[row_id] = slot
+                self._vectors[slot] = vector
+                self._ids[slot] = row_id
+                self._sqnorms[slot] = float(np.dot(vector, vector))
+                slots.append(slot)
+        return slots
+
+    def remove(self, ids: list):
+        """
+        Delete vectors by row id. Unknown ids are ignored.
+        """
+        with self.lock:
+            for row_id in ids:
+                slot = self._slots.pop(row_id, None)
+                if slot is not None:
+                    self._ids[slot] = 0
+                    self._free.append(slot)
+
+    def maintain(self):
+        """
+        Reorganize the index after changes if it needs to. Brute force has nothing to do.
+        """
+
+    def save(self, seq: int):
+        """
+        Flush the files and record the last change applied.
+        """
+        with self.lock:
+            for name in self._array_specs(0):
+                getattr(self, f"_{name}").flush()
+            self.seq = seq
+            state_path = self.paths()["state"]
+            with open(state_path + ".tmp", "w", encoding="utf-8") as f:
+                json.dump(dict(self._state(), seq=seq, dims=self.dims, count=len(self._slots)), f)
+            os.replace(state_path + ".tmp", state_path)
+
+    def search(self, queries: np.ndarray, top_k: int, allowed_ids: list = None) -> list:
+        """
+        Find the nearest vectors of each query.
+
+        Args:
+            queries (np.ndarray): Query vectors, one per row.
+            top_k (int): Number of neighbours per query.
+            allowed_ids (list): Only consider these row ids, e.g. the rows matching a filter.
+
+        Returns:
+            list: For each query, a list of (row id, L2 distance), nearest first.
+        """
+        queries = np.asarray(queries, dtype=np.float32).reshape(-1, self.dims)
+        with self.lock:
+            slots = None
+            if allowed_ids is not None:
+                slots = np.array([self._slots[row_id] for row_id in allowed_ids if row_id in self._slots], dtype=np.int64)
+            return self._nearest(queries, slots, top_k)
+
+    def close(self):
+        with self.lock:
+            for name in self._array_specs(0):
+                setattr(self, f"_{name}", None)
+
+    def delete_files(self):
+        """
+        Close the index and remove its files.
+        """
+        self.close()
+        for path in self.paths().values():
+            if os.path.exists(path):
+                os.remove(path)
+
+    def __len__(self):
+        return len(self._slots)
+
+    def _nearest(self, queries: np.ndarray, slots: np.ndarray, top_k: int) -> list:
+        """
+        Rank the vectors in slots, or all vectors if slots is None, for each query.
+        """
+        if slots is None:
+            vectors = self._vectors[:self._size]
+            sqnorms = self._sqnorms[:self._size]
+            ids = self._ids[:self._size]
+        else:
+            vectors = self._vectors[slots]
+            sqnorms = self._sqnorms[slots]
+            ids = self._ids[slots]
+        if len(ids) == 0:
+            return [[] for _ in queries]
+        # |v - q|^2 = |v|^2 - 2 v.q + |q|^2, one (rows x queries) matrix product
+        distances = sqnorms[:, None] - 2.0 * (vectors @ queries.T) + np.einsum("ij,ij->i", queries, queries)[None, :]
+        distances[ids == 0, :] = np.inf
+        ids = np.array(ids)
+
+        k = min(top_k, len(ids))
+        results = []
+        for column in range(len(queries)):
+            column_distances = distances[:, column]
+            nearest = np.argpartition(column_distances, k - 1)[:k] if k < len(ids) else np.arange(len(ids))
+            nearest = nearest[np.argsort(column_distances[nearest])]
+            results.append([(int(ids[i]), float(np.sqrt(max(column_distances[i], 0.0))))
+                            for i in nearest if np.isfinite(column_distances[i])])
+        return results
+
+    def _array_specs(self, capacity: int) -> dict:
+        """
+        Return the shape and dtype of each capacity-sized array, by its name in paths().
+        """
+        return {
+            "vectors": ((capacity, self.dims), np.float32),
+            "ids": ((capacity,), np.int64),
+            "sqnorms": ((capacity,), np.float32),
+        }
+
+    def _state(self) -> dict:
+        return {}
+
+    def _load_state(self, state: dict) -> bool:
+        return True
+
+    def _next_slot(self) -> int:
+        if self._size == len(self._ids):
+            self._allocate(len(self._ids) * 2)
+        self._size += 1
+        return self._size - 1
+
+    def _allocate(self, capacity: int):
+        """
+        Create the files with room for capacity vectors, keeping the current contents.
+        """
+        paths = self.paths()
+        for name, (shape, dtype) in self._array_specs(capacity).items():
+            current = getattr(self, f"_{name}")
+            tmp_path = paths[name] + ".tmp.npy"
+            array = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=dtype, shape=shape)
+            if current is not None and self._size:
+                array[:self._size] = current[:self._size]
+            array.flush()
+            del array
+            os.replace(tmp_path, paths[name])
+            setattr(self, f"_{name}", np.load(paths[name], mmap_mode="r+"))
+
+
+class IvfIndex(NumpyIndex):
+    """
+    Approximate L2 search with an inverted file (IVF) over the NumpyIndex files.
+
+    The vectors are clustered with k-means, and a search only compares the vectors of
+    the `probes` clusters whose centroids are nearest to the query, so its cost grows
+    with the number of vectors per cluster instead of the number of vectors. More
+    probes give a better recall for a longer search.
+
+    New vectors join the cluster of their nearest centroid. The index searches exactly
+    until it holds min_train vectors, and for filtered searches, whose candidates the
+    ticket indexes already narrowed down. The clusters are retrained once the index
+    holds retrain_factor times the vectors they were trained on. Training runs in the
+    background, and searches use the current clusters until the new ones are ready.
+    """
+
+    def __init__(self, path_prefix: str, dims: int = 384, lists: int = 0, probes: int = 8,
+                 min_train: int = 1000, retrain_factor: float = 4.0):
+        """
+        Args:
+            path_prefix (str): Path of the files without extension, e.g. databases/PRJ.
+            dims (int): Dimensions of the vectors.
+            lists (int): Number of clusters. 0 picks 4 * sqrt(vectors) when training.
+            probes (int): Number of clusters searched per query.
+            min_train (int): Number of vectors needed to train the clusters.
+            retrain_factor (float): Growth since training that triggers retraining.
+        """
+        super().__init__(path_prefix, dims)
+        self.lists = lists
+        self.probes = probes
+        self.min_train = min_train
+        self.retrain_factor = retrain_factor
+        self._assignments = None  # Cluster of each slot, -1 before training
+        self._centroids = None
+        self._trained_count = 0
+        self._members = None      # Slots of each cluster, rebuilt after changes
+        self._training = None     # Future of the background training
+        self._changed = None      # Slots written while training, None when not training
+        self._generation = 0      # Changed by clear and close, which void a training
+
+    def paths(self) -> dict:
+        return dict(super().paths(),
+                    assignments=f"{self.path_prefix}.ivf.npy",
+                    centroids=f"{self.path_prefix}.ivf_centroids.npy")
+
+    @property
+    def clusters(self) -> int:
+        """
+        Number of trained clusters, 0 before training.
+        """
+        return 0 if self._centroids is None else len(self._centroids)
+
+    @property
+    def training(self) -> bool:
+        """
+        Whether the clusters are being trained in the background.
+        """
+        return self._training is not None and not self._training.done()
+
+    def wait_training(self, timeout: float = None):
+        """
+        Wait until the background training, if any, has finished.
+        """
+        training = self._training
+        if training is not None:
+            training.result(timeout)
+
+    def clear(self, capacity: int = 0):
+        with self.lock:
+            self._centroids = None
+            self._trained_count = 0
+            self._members = None
+            self._generation += 1
+            super().clear(capacity)
+
+    def close(self):
+        with self.lock:
+            self._generation += 1
+            super().close()
+
+    def upsert(self, ids: list, vectors: np.ndarray) -> list:
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dims)
+        with self.lock:
+            slots = super().upsert(ids, vectors)
+            if slots:
+                self._assignments[slots] = self._assign(vectors) if self._centroids is not None else -1
+                self._members = None
+                if self._changed is not None:
+                    self._changed.update(slots)
+        return slots
+
+    def remove(self, ids: list):
+        with self.lock:
+            super().remove(ids)
+            self._members = None
+
+    def maintain(self):
+        """
+        Start training the clusters in the background once there are enough vectors,
+        and retraining them after the index has grown by retrain_factor.
+        """
+        with self.lock:
+            count = len(self)
+            if count < self.min_train or self.training:
+                return
+            if self._centroids is None or count > self._trained_count * self.retrain_factor:
+                self._training = io_executor.submit(self._train_in_background)
+
+    def train(self, iterations: int = 10, seed: int = 0):
+        """
+        Cluster a sample of the vectors with k-means and assign every vector to its
+        nearest centroid.
+
+        The lock is only held to take the sample and to swap in the new clusters, so
+        searches and updates go on with the current clusters while k-means runs.
+        Vectors written meanwhile are assigned to the new clusters when they are
+        swapped in.
+        """
+        with self.lock:
+            used = np.flatnonzero(self._ids[:self._size])
+            if len(used) == 0:
+                return
+            lists = max(1, min(self.lists or int(4 * np.sqrt(len(used))), len(used)))
+            rng = np.random.RandomState(seed)
+            # 64 vectors per cluster are plenty to place the centroids
+            sample = np.array(self._vectors[np.sort(rng.choice(used, min(len(used), lists * 64), replace=False))])
+            # A grown index gets new files, the ones read here stay mapped
+            vectors, size, generation = self._vectors, self._size, self._generation
+            self._changed = set()
+
+        centroids = sample[rng.choice(len(sample), lists, replace=False)].copy()
+        for _ in range(iterations):
+            nearest = self._assign(sample, centroids)
+            counts = np.bincount(nearest, minlength=lists)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, nearest, sample)
+            empty = counts == 0
+            centroids[~empty] = sums[~empty] / counts[~empty, None]
+            # Restart empty clusters at random sample vectors
+            centroids[empty] = sample[rng.choice(len(sample), int(empty.sum()))]
+        assignments = np.empty(size, dtype=np.int32)
+        for start in range(0, size, 65536):
+            end = min(start + 65536, size)
+            assignments[start:end] = self._assign(vectors[start:end], centroids)
+
+        with self.lock:
+            changed, self._changed = self._changed, None
+            if generation != self._generation:
+                logging.info(f"Discarded the clusters trained at {self.path_prefix}, the index was cleared meanwhile")
+                return
+            self._assignments[:size] = assignments
+            late = np.array(sorted(slot for slot in changed if slot < size), dtype=np.int64)
+            if len(late):
+                self._assignments[late] = self._assign(self._vectors[late], centroids)
+            for start in range(size, self._size, 65536):
+                end = min(start + 65536, self._size)
+                self._assignments[start:end] = self._assign(self._vectors[start:end], centroids)
+            self._centroids = centroids
+            self._trained_count = len(used)
+            self._members = None
+            np.save(self.paths()["centroids"], centroids)
+            # The assignments on disk must match the centroids
+            self.save(self.seq)
+        logging.info(f"Trained {lists} clusters on {len(sample)} of {len(used)} vectors at {self.path_prefix}")
+
+    def _train_in_background(self):
+        try:
+            self.train()
+        except Exception as e:
+            logging.error(f"Err024: Error training the clusters of the vector index at {self.path_prefix}: {e}")
+            with self.lock:
+                self._changed = None
+
+    def search(self, queries: np.ndarray, top_k: int, allowed_ids: list = None) -> list:
+        queries = np.asarray(queries, dtype=np.float32).reshape(-1, self.dims)
+        with self.lock:
+            if self._centroids is None or allowed_ids is not None:
+                return super().search(queries, top_k, allowed_ids)
+            members = self._cluster_members()
+            probes = min(self.probes, len(self._centroids))
+            centroid_distances = (self._centroids ** 2).sum(axis=1)[None, :] - 2.0 * (queries @ self._centroids.T)
+            results = []
+            for query, distances in zip(queries, centroid_distances):
+                nearest = np.argpartition(distances, probes - 1)[:probes]
+                slots = np.concatenate([members[cluster] for cluster in nearest])
+                results.extend(self._nearest(query[None, :], slots, top_k))
+            return results
+
+    def _cluster_members(self) -> list:
+        if self._members is None:
+            assignments = np.array(self._assignments[:self._size])
+            order = np.argsort(assignments, kind="stable")
+            bounds = np.searchsorted(assignments[order], np.arange(len(self._centroids) + 1))
+            self._members = [order[bounds[i]:bounds[i + 1]] for i in range(len(self._centroids))]
+        return self._members
+
+    def _assign(self, vectors: np.ndarray, centroids: np.ndarray = None) -> np.ndarray:
+        """
+        Return the index of the nearest centroid of each vector.
+        """
+        centroids = self._centroids if centroids is None else centroids
+        vectors = np.asarray(vectors, dtype=np.float32)
+        distances = (centroids ** 2).sum(axis=1)[None, :] - 2.0 * (vectors @ centroids.T)
+        return np.argmin(distances, axis=1).astype(np.int32)
+
+    def _array_specs(self, capacity: int) -> dict:
+        return dict(super()._array_specs(capacity), assignments=((capacity,), np.int32))
+
+    def _state(self) -> dict:
+        return {"trained_count": self._trained_count}
+
+    def _load_state(self, state: dict) -> bool:
+        self._trained_count = state.get("trained_count", 0)
+        self._members = None
+        self._centroids = None
+        if not self._trained_count:
+            return True
+        try:
+            self._centroids = np.load(self.paths()["centroids"])
+        except (OSError, ValueError) as e:
+            logging.info(f"Clusters of the vector index at {self.path_prefix} are not usable, it will be rebuilt: {e}")
+            return False
+        return self._centroids.shape[1] == self.dims
+
+
+def make_index(backend: str, path_prefix: str, dims: int = 384, **options) -> NumpyIndex:
+    """
+    Create the index of a search backend other than vec0.
+
+    Args:
+        backend (str): 'numpy' or 'ivf'.
+        path_prefix (str): Path of the index files without extension.
+        dims (int): Dimensions of the vectors.
+        options: Parameters of IvfIndex, ignored by the other backends.
+    """
+    if backend == "ivf":
+        return IvfIndex(path_prefix, dims, **options)
+    return NumpyIndex(path_prefix, dims)
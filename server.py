@@ -1,24 +1,50 @@
 """
 d MCP server for JIRA implementation
 """
+import time
+
+_import_started = time.perf_counter()
+
+import asyncio
 import logging
 import os
 import json
+import re
+import threading
+from datetime import timedelta
 from fastapi import FastAPI
 from dotenv import load_dotenv
-from mcp.server.fastmcp import FastMCP
+from mcp.server.fastmcp import Context, FastMCP
 
 # Load environment variables from .env file
 load_dotenv()
 
-from jira_caller import jql_query
+from jira_caller import jql_query_pages, updated_since_jql
 from sqlite import (
-    append_tickets,
     create_test_db,
     del_project_db,
+    embedding_cache,
+    get_project_meta,
     init_project_db,
+    lookup_tickets,
+    parse_jira_datetime,
+    result_cache,
+    save_sync_watermark,
+    search_plan,
     search_tickets,
+    search_tickets_batch,
+    set_project_meta,
+    set_search_backend,
+    SyncWatermark,
+    upsert_tickets,
 )
+from embedding import compare_backends, query_batcher, query_cache, warm_up
+from executors import executor_stats, run_io
+from jobs import JobCancelled, job_manager
+from scheduler import SyncScheduler
+from util import prefetch, record_startup, startup_report
+
+record_startup("imports", time.perf_counter() - _import_started)
 
 
 
@@ -66,7 +92,18 @@ logging.getLogger("azure.core.pipeline.policies.http_logging_policy").setLevel(l
 # Example log to verify setup
 logging.info("Logging is configured.")
 
-create_test_db()
+def warm_up_server():
+    """
+    Load the embedding model and create the test database without blocking startup.
+
+    With EMBED_WARMUP=lazy the model is only loaded by the first call that needs it.
+    """
+    if os.getenv("EMBED_WARMUP", "background").lower() == "background":
+        warm_up(background=False)
+    create_test_db()
+
+# Runs while the MCP client connects and performs the handshake
+threading.Thread(target=warm_up_server, name="server-warm-up", daemon=True).start()
 
 # Create server instance
 mcp = FastMCP("d_mcpsvr_jira")
@@ -77,19 +114,30 @@ def echo(message: str) -> str:
     return f"Echo from d_mcpsvr_jira: {message}"
 
 @mcp.tool()
-def search(project: str, prompt: str="", conditions: str="", top_n: int=5, resp_format: str="json") -> str:
+async def search(project: str, prompt: str="", conditions: str="", top_n: int=5, resp_format: str="json", filters: str="", mode: str="", fields: str="") -> str:
     """JIRA search by Vector Search
     Args:
         project (str): Project name
         prompt (str): prompt string
-        conditions (str): SQL-like conditions for filtering
+        conditions (str): Deprecated SQL-like conditions for filtering, use filters instead
         top_n (int): Number of top results to return
         resp_format (str): Response format: 'json', 'readable'
+        filters (str): JSON filter, e.g. {"and": [{"field": "status", "op": "in", "value": ["Open", "In Progress"]},
+            {"field": "updated", "op": "between", "value": ["2025-05-01", "2025-05-31T23:59:59"]}]}.
+            Operators: =, !=, <, <=, >, >=, like, not like, in, not in, between, is null, is not null.
+            Groups: and, or, not
+        mode (str): 'vector' (semantic), 'lexical' (issue keys and exact terms) or 'hybrid' (both). Defaults to the server's SEARCH_MODE
+        fields (str): Comma separated fields to return, e.g. 'ticket_id,summary,status'. Default: all fields except full_json, the raw JIRA JSON
     Returns:
         str: Result of the prompt search
     """
-    result = search_tickets(project, prompt, conditions, top_n)
-    if result is str and result.startswith("Err"):
+    started = time.perf_counter()
+    if resp_format == "readable" and not fields:
+        # The readable format only shows keys and summaries
+        fields = "ticket_id,summary"
+    result = await run_io(search_tickets, project, prompt, conditions, top_n, filters or None, mode, fields or None)
+    record_startup("first_search", time.perf_counter() - started)
+    if isinstance(result, str) and result.startswith("Err"):
         logging.error(f"Error in search: {result}")
         return result
     logging.info(f"Search completed successfully: {result}")
@@ -110,14 +158,68 @@ def search(project: str, prompt: str="", conditions: str="", top_n: int=5, resp_
         return f"Err101: Invalid response format '{resp_format}'. Expected 'json' or 'readable'."
 
 @mcp.tool()
-def init_project(project_name: str) -> str:
+async def search_batch(project: str, prompts: list[str], top_n: int=5, filters: str="", fields: str="") -> str:
+    """JIRA search by Vector Search for several prompts at once
+    Args:
+        project (str): Project name
+        prompts (list[str]): prompt strings
+        top_n (int): Number of top results to return per prompt
+        filters (str): JSON filter applied to every prompt, as for search
+        fields (str): Comma separated fields to return, e.g. 'ticket_id,summary,status'. Default: all fields except full_json, the raw JIRA JSON
+    Returns:
+        str: JSON array with the array of results of each prompt, in the order of the prompts
+    """
+    result = await run_io(search_tickets_batch, project, prompts, top_n, filters or None, fields or None)
+    if isinstance(result, str) and result.startswith("Err"):
+        logging.error(f"Error in search_batch: {result}")
+    return result
+
+@mcp.tool()
+async def get_tickets(project: str, ticket_ids: str, fields: str="") -> str:
+    """Get tickets by key without searching
+    Args:
+        project (str): Project name
+        ticket_ids (str): Comma or space separated ticket keys, e.g. 'PRJ-1, PRJ-2'
+        fields (str): Comma separated fields to return, e.g. 'ticket_id,summary,status'. Default: all fields except full_json, the raw JIRA JSON
+    Returns:
+        str: JSON array of the tickets found
+    """
+    keys = [key for key in re.split(r"[\s,]+", ticket_ids) if key]
+    if not keys:
+        return "Err118: No ticket keys given."
+    return await run_io(lookup_tickets, project, keys, fields or None)
+
+@mcp.tool()
+async def explain_search(project: str, prompt: str="", conditions: str="", top_n: int=5, filters: str="") -> str:
+    """Show the SQLite query plan of a search without running it
+    Args:
+        project (str): Project name
+        prompt (str): prompt string
+        conditions (str): Deprecated SQL-like conditions for filtering
+        top_n (int): Number of top results to return
+        filters (str): JSON filter, as for search
+    Returns:
+        str: JSON object with the plan steps, the filtered fields, the fields without an index and the table scans
+    """
+    try:
+        return json.dumps(await run_io(search_plan, project, prompt, conditions, top_n, filters or None))
+    except Exception as e:
+        msg = str(e) if str(e).startswith("Err") else f"Err117: Failed to explain search: {e}"
+        logging.error(msg)
+        return msg
+
+@mcp.tool()
+async def init_project(project_name: str, vector_type: str = "", vector_dims: int = 0, search_backend: str = "") -> str:
     """Initialize a SQLite database for a given project name
     Args:
         project_name (str): Name of the project
+        vector_type (str): Vector storage: 'float' (exact), 'int8' (4x smaller) or 'bit' (32x smaller). Default: server setting
+        vector_dims (int): Stored vector dimensions, 8 to 384. Fewer dimensions are smaller and faster to scan. Default: server setting
+        search_backend (str): 'vec0' (sqlite-vec), 'numpy' (memory-mapped matrix, for larger projects) or 'ivf' (approximate clustered index, for the largest projects). Default: server setting
     Returns:
-        str: Success message or error
+        str: Success message with the id of the background job loading the tickets, or error
     """
-    rtn = init_project_db(project_name)
+    rtn = await run_io(init_project_db, project_name, vector_type, vector_dims, search_backend)
 
     if rtn.startswith("Err"):
         logging.error(rtn)
@@ -134,47 +236,290 @@ def init_project(project_name: str) -> str:
     and type = Task ORDER BY due ASC
     """
 
-    tickets = jql_query(jql)
-    logging.info(f"JQL query executed successfully: {jql}")
-
-    count = append_tickets(project_name, tickets)
+    await run_io(set_project_meta, project_name, "sync_jql", jql)
+    # The initial load of sync_jql is the starting point of the incremental syncs
+    job = job_manager.submit("init_project", project_name, lambda job: load_job(job, jql, advance_watermark=True))
 
-    msg = f"Succ: Init project DB of {project_name} and appended {count} tickets to the database."
+    msg = f"Succ: Init project DB of {project_name}. Job {job.id} is loading its tickets, follow it with job_status."
     logging.info(msg)
     
     return msg
 
 @mcp.tool()
-def load_tickets(project_name: str, jql: str) -> str:
-    """Load tickets from JIRA using a JQL query
+async def select_search_backend(project_name: str, backend: str) -> str:
+    """Select the vector search backend of a project
+    Args:
+        project_name (str): Name of the project
+        backend (str): 'vec0' (sqlite-vec), 'numpy' (memory-mapped matrix, for larger projects) or 'ivf' (approximate clustered index, for the largest projects)
+    Returns:
+        str: Success message or error
+    """
+    return await run_io(set_search_backend, project_name, backend)
+
+@mcp.tool()
+async def load_tickets(project_name: str, jql: str) -> str:
+    """Load tickets from JIRA using a JQL query, in a background job
     Args:
         jql (str): JQL query string
     Returns:
-        str: Result of the JQL query
+        str: Success message with the job id to follow with job_status
+    """
+    job = job_manager.submit("load_tickets", project_name, lambda job: load_job(job, jql))
+    return f"Succ: Job {job.id} is loading the tickets into project {project_name}, follow it with job_status."
+
+def load_job(job, jql: str, advance_watermark: bool = False) -> str:
+    """
+    Body of the init_project and load_tickets jobs.
+
+    Only the load of the project's sync_jql advances its sync watermark. An ad-hoc
+    query may miss tickets that the next sync_tickets would then skip.
+
+    Returns:
+        str: Success or error message
     """
     try:
-        issues = jql_query(jql)
-        if issues and len(issues) > 0:
-            logging.info(f"Loaded {len(issues)} tickets from JIRA.")
-            count = append_tickets(project_name, issues)
-            msg = f"Succ: Appended {count} tickets to the database."
+        counts = ingest_jql(job.project_name, jql, job, advance_watermark)
+        if counts["fetched"] > 0:
+            logging.info(f"Loaded {counts['fetched']} tickets from JIRA.")
+            msg = f"Succ: Appended {counts['added']} tickets to the database, replaced {counts['updated']} changed and skipped {counts['skipped']} unchanged tickets."
             logging.info(msg)
             return msg
-        
+        return "Succ: No tickets matched the JQL query."
+
+    except JobCancelled:
+        raise
     except Exception as e:
         msg = f"Err111: Failed to load tickets from JIRA: {e}"
         logging.error(msg)
         return msg
 
+def ingest_jql(project_name: str, jql: str, job=None, advance_watermark: bool = False) -> dict:
+    """
+    Stream the issues matching a JQL query into a project database page by page.
+
+    The next page is fetched from JIRA while the current one is embedded and written,
+    so only JIRA_PREFETCH_PAGES + 1 pages are held in memory at a time. A job gets
+    its progress counters updated and can be cancelled between pages. With
+    advance_watermark the project's sync watermark is moved to the tickets synced,
+    once the whole stream has been read: the query is not ordered by 'updated', so
+    a stream cut short by an error or a cancel may not have fetched older tickets.
+
+    Returns:
+        dict: Counts of 'fetched', 'added', 'updated', 'skipped' and 'failed' tickets.
+    """
+    counts = {"fetched": 0, "added": 0, "updated": 0, "skipped": 0, "failed": 0}
+    watermark = SyncWatermark() if advance_watermark else None
+    pages = prefetch(jql_query_pages(jql), depth=int(os.getenv("JIRA_PREFETCH_PAGES", 1)))
+    for page in pages:
+        if job:
+            job.check_cancelled()
+            job.add(fetched=len(page))
+        counts["fetched"] += len(page)
+        page_counts = upsert_tickets(project_name, page, job.add if job else None, watermark)
+        for key, value in page_counts.items():
+            counts[key] += value
+        if job:
+            job.add(**page_counts)
+    if watermark is not None:
+        save_sync_watermark(project_name, watermark)
+    return counts
+
+def sync_project(project_name: str, jql: str = "", job=None) -> dict:
+    """
+    Fetch the tickets changed since the project's sync watermark and upsert them.
+
+    The JQL of the previous sync is reused when jql is empty. The watermark is moved
+    back by SYNC_OVERLAP_MINUTES because JQL dates have minute precision and are read
+    in the JIRA user's time zone; tickets fetched twice are skipped as unchanged.
+
+    Returns:
+        dict: Counts of 'added', 'updated', 'skipped' and 'failed' tickets.
+    """
+    base_jql = jql or get_project_meta(project_name, "sync_jql") or f'project = "{project_name}"'
+    query = base_jql
+    watermark = get_project_meta(project_name, "sync_watermark")
+    if watermark:
+        since = parse_jira_datetime(watermark) - timedelta(minutes=int(os.getenv("SYNC_OVERLAP_MINUTES", 1440)))
+        query = updated_since_jql(base_jql, since)
+
+    counts = ingest_jql(project_name, query, job, advance_watermark=True)
+    logging.info(f"Incremental sync of '{project_name}' fetched {counts['fetched']} tickets: {query}")
+    set_project_meta(project_name, "sync_jql", base_jql)
+    return counts
+
+@mcp.tool()
+async def sync_tickets(project_name: str, jql: str = "") -> str:
+    """Incrementally sync the tickets changed in JIRA since the last sync of a project, in a background job
+    Args:
+        project_name (str): Name of the project
+        jql (str): JQL query selecting the project's tickets. Defaults to the JQL of the previous sync.
+    Returns:
+        str: Success message with the job id to follow with job_status
+    """
+    job = job_manager.submit("sync_tickets", project_name, lambda job: sync_job(job, jql))
+    return f"Succ: Job {job.id} is syncing project {project_name}, follow it with job_status."
+
+def sync_job(job, jql: str = "") -> str:
+    """
+    Body of the sync_tickets jobs.
+
+    Returns:
+        str: Counts of added, updated and unchanged tickets, or error
+    """
+    try:
+        counts = sync_project(job.project_name, jql, job)
+        msg = f"Succ: Synced project {job.project_name}: {counts['added']} added, {counts['updated']} updated, {counts['skipped']} unchanged, {counts['failed']} failed."
+        logging.info(msg)
+        return msg
+    except JobCancelled:
+        raise
+    except Exception as e:
+        msg = f"Err114: Failed to sync tickets of project '{job.project_name}': {e}"
+        logging.error(msg)
+        return msg
+
+# Periodic syncs of the registered projects, run as jobs
+sync_scheduler = SyncScheduler(
+    lambda project_name, jql: job_manager.submit("scheduled_sync", project_name, lambda job: sync_job(job, jql)),
+    os.getenv("SYNC_SCHEDULE_PATH", os.path.join(os.getenv("DB_DIR", "databases"), "sync_schedule.json")),
+    max_concurrent=int(os.getenv("SYNC_MAX_CONCURRENT", 2)),
+    jitter=float(os.getenv("SYNC_JITTER", 0.1)),
+)
+# Started on import, as hosts such as `mcp dev` import this module instead of running it
+sync_scheduler.start()
+
+@mcp.tool()
+async def register_sync(project_name: str, interval_minutes: float = 60, jql: str = "") -> str:
+    """Sync a project periodically in the background, or change its interval
+    Args:
+        project_name (str): Name of the project
+        interval_minutes (float): Minutes between syncs. Each one is randomly spread by SYNC_JITTER of the interval
+        jql (str): JQL query selecting the project's tickets. Defaults to the JQL of the previous sync.
+    Returns:
+        str: Success message or error
+    """
+    try:
+        await run_io(sync_scheduler.register, project_name, jql, interval_minutes)
+    except Exception as e:
+        msg = f"Err121: Failed to register the sync of project '{project_name}': {e}"
+        logging.error(msg)
+        return msg
+    return f"Succ: Project {project_name} will be synced every {interval_minutes} minutes."
+
+@mcp.tool()
+async def unregister_sync(project_name: str) -> str:
+    """Stop syncing a project periodically
+    Args:
+        project_name (str): Name of the project
+    Returns:
+        str: Success message or error
+    """
+    if not await run_io(sync_scheduler.unregister, project_name):
+        return f"Err121: Project '{project_name}' is not registered for scheduled syncs"
+    return f"Succ: Project {project_name} is no longer synced periodically."
+
+@mcp.tool()
+async def sync_schedule_status() -> str:
+    """Report the registered projects with the time, duration and ticket deltas of their last scheduled sync
+    Returns:
+        str: JSON object keyed by project name
+    """
+    return json.dumps(await run_io(sync_scheduler.status))
+
 @mcp.tool()
-def del_project(project_name: str) -> str:
+async def job_status(job_id: str = "", project: str = "", wait_seconds: float = 0, ctx: Context = None) -> str:
+    """Report the state and progress of background jobs loading tickets
+    Args:
+        job_id (str): Job id returned by init_project, load_tickets or sync_tickets. Empty lists the recent jobs
+        project (str): Only list the jobs of this project
+        wait_seconds (float): Wait up to this many seconds for the job to finish, sending progress notifications meanwhile
+    Returns:
+        str: JSON object with the job's state, message and counts of tickets fetched, embedded and written, or a JSON array of them
+    """
+    if not job_id:
+        return json.dumps([job.status() for job in job_manager.jobs(project)])
+    job = job_manager.get(job_id)
+    if job is None:
+        return f"Err120: Unknown job '{job_id}'"
+
+    deadline = time.monotonic() + min(wait_seconds, float(os.getenv("JOB_STATUS_MAX_WAIT", 300)))
+    while not job.wait(0) and time.monotonic() < deadline:
+        if ctx is not None:
+            status = job.status()
+            await ctx.report_progress(status["written"], None,
+                                      f"{status['fetched']} fetched, {status['embedded']} embedded, {status['written']} written")
+        await asyncio.sleep(min(0.5, max(0.0, deadline - time.monotonic())))
+    return json.dumps(job.status())
+
+@mcp.tool()
+async def cancel_job(job_id: str) -> str:
+    """Cancel a background job loading tickets. A running job stops after the page it is writing
+    Args:
+        job_id (str): Job id returned by init_project, load_tickets or sync_tickets
+    Returns:
+        str: Success message or error
+    """
+    job = job_manager.cancel(job_id)
+    if job is None:
+        return f"Err120: Unknown job '{job_id}'"
+    if job.state == "running":
+        return f"Succ: Job {job_id} will stop after its current page."
+    return f"Succ: Job {job_id} is {job.state}." if job.state == "cancelled" else f"Succ: Job {job_id} already {job.state}."
+
+@mcp.tool()
+async def del_project(project_name: str) -> str:
     """Delete a SQLite database for a given project name
     Args:
         project_name (str): Name of the project
     Returns:
         str: Success message or error
     """
-    return del_project_db(project_name)
+    # Stop the project's jobs before its database goes away
+    await run_io(sync_scheduler.unregister, project_name)
+    jobs = [job_manager.cancel(job.id) for job in job_manager.jobs(project_name)]
+    for job in jobs:
+        await run_io(job.wait, 60)
+    return await run_io(del_project_db, project_name)
+
+@mcp.tool()
+async def cache_stats() -> str:
+    """Report the hit and miss counters of the server's caches, the query batching and the load of its worker pools
+    Returns:
+        str: JSON object with the statistics of each cache, the batch sizes and wait times of query embedding, and the workers and pending tasks of each pool
+    """
+    try:
+        return json.dumps({
+            "embedding_cache": await run_io(embedding_cache.stats),
+            "query_cache": query_cache.stats(),
+            "query_batcher": query_batcher.stats(),
+            "result_cache": result_cache.stats(),
+            "executors": executor_stats(),
+        })
+    except Exception as e:
+        msg = f"Err115: Failed to read cache statistics: {e}"
+        logging.error(msg)
+        return msg
+
+@mcp.tool()
+async def check_embedding_backends() -> str:
+    """Compare the vectors of the int8 and ONNX embedding backends with the fp32 torch vectors
+    Returns:
+        str: JSON object with the mean and minimum cosine similarity and the time taken per backend
+    """
+    try:
+        return json.dumps(await run_io(compare_backends))
+    except Exception as e:
+        msg = f"Err116: Failed to compare embedding backends: {e}"
+        logging.error(msg)
+        return msg
+
+@mcp.tool()
+def startup_time() -> str:
+    """Report how long the server took to import its modules, load the embedding model and answer the first search
+    Returns:
+        str: JSON object with the duration of each startup step in seconds
+    """
+    return json.dumps(startup_report())
 
 #app = FastAPI()
 #app.mount("/", mcp.sse_app())
@@ -3,14 +3,150 @@ import sqlite_vec
 import os
 import logging
 import json
-from transformers import AutoTokenizer, AutoModel
-import torch
+import threading
+import time
+import numpy as np
+from contextlib import contextmanager, nullcontext
+from datetime import datetime, timedelta, timezone
+from db_pool import ConnectionPool
+from embedding_cache import EmbeddingCache
+from filters import compile_filter
+from json_store import compress_json, decompress_json, train_dictionary
+from quantization import FULL_DIMS, VECTOR_SQL, check_vector_options, column_sql, compact_vector, is_compact
+from lexical import fts_match_query, is_lexical_query, reciprocal_rank_fusion, ticket_keys
+from search_backends import NumpyIndex, check_search_backend, make_index
+from result_cache import SearchResultCache
+from embedding import make_query_vector, make_query_vectors, make_vectors, model_id
+from util import jira_extra_fields
 
-# Load the model and tokenizer globally to avoid reloading them for every call
-tokenizer = AutoTokenizer.from_pretrained("sentence-transformers/all-MiniLM-L6-v2")
-model = AutoModel.from_pretrained("sentence-transformers/all-MiniLM-L6-v2")
+# Vectors of ticket texts, shared by all projects
+embedding_cache = EmbeddingCache(
+    os.getenv("EMBED_CACHE_PATH", os.path.join(os.getenv("DB_DIR", "databases"), "embedding_cache.sqlite3")),
+    model_id(),
+)
 
-def init_project_db(project_name: str) -> str:
+# Search results, invalidated whenever a project's data changes
+result_cache = SearchResultCache(int(os.getenv("RESULT_CACHE_SIZE", 512)))
+
+# Ticket columns, in table order after the id column
+TICKET_COLUMNS = ["ticket_id", "summary", "description", "status", "priority", "assignee", "reporter",
+                  "created", "updated", "original_estimate_seconds", "due_date"]
+
+# The full JSON of a ticket is stored compressed in jira_ticket_json and only read when asked for
+JSON_FIELD = "full_json"
+
+# Columns with a B-tree index, used by lookups and filters
+INDEXED_COLUMNS = ["ticket_id", "status", "priority", "assignee", "reporter", "created", "updated", "due_date"]
+
+TICKETS_TABLE_SQL = '''
+    CREATE TABLE {table} (
+    id INTEGER PRIMARY KEY,
+    ticket_id TEXT NOT NULL,
+    summary TEXT,
+    description TEXT,
+    status TEXT,
+    priority TEXT,
+    assignee TEXT,
+    reporter TEXT,
+    created TEXT,
+    updated TEXT,
+    original_estimate_seconds INT,
+    due_date TEXT
+    )
+'''
+
+# Compressed full JSON of each ticket, keyed by the ticket id. dict_id is the zlib preset
+# dictionary in jira_json_dicts the row was compressed with, 0 for none.
+JSON_TABLES_SQL = [
+    "CREATE TABLE IF NOT EXISTS jira_ticket_json (id INTEGER PRIMARY KEY, dict_id INTEGER NOT NULL, data BLOB NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS jira_json_dicts (dict_id INTEGER PRIMARY KEY, data BLOB NOT NULL)",
+]
+
+# Vectors live in their own vec0 table; the rowid of a vector is the id of its ticket
+VECTORS_TABLE_SQL = "CREATE VIRTUAL TABLE jira_vectors USING vec0(embedding float[384])"
+
+# Projects storing compact (quantized or reduced) vectors in jira_vectors keep the full
+# float32 vectors here to rescore the candidates of the compact search
+EMBEDDINGS_TABLE_SQL = "CREATE TABLE jira_embeddings (id INTEGER PRIMARY KEY, embedding BLOB NOT NULL)"
+
+# Full-text index over the ticket texts. It stores no copy of the texts (external
+# content) and is kept in sync with jira_tickets by triggers.
+FTS_SQL = [
+    "CREATE VIRTUAL TABLE jira_fts USING fts5(summary, description, content='jira_tickets', content_rowid='id')",
+    '''CREATE TRIGGER jira_fts_insert AFTER INSERT ON jira_tickets BEGIN
+        INSERT INTO jira_fts (rowid, summary, description) VALUES (new.id, new.summary, new.description);
+    END''',
+    '''CREATE TRIGGER jira_fts_delete AFTER DELETE ON jira_tickets BEGIN
+        INSERT INTO jira_fts (jira_fts, rowid, summary, description) VALUES ('delete', old.id, old.summary, old.description);
+    END''',
+    '''CREATE TRIGGER jira_fts_update AFTER UPDATE OF summary, description ON jira_tickets BEGIN
+        INSERT INTO jira_fts (jira_fts, rowid, summary, description) VALUES ('delete', old.id, old.summary, old.description);
+        INSERT INTO jira_fts (rowid, summary, description) VALUES (new.id, new.summary, new.description);
+    END''',
+]
+
+# Row ids of written and deleted tickets, read by the search backend indexes, see sync_vector_index
+CHANGES_SQL = [
+    "CREATE TABLE IF NOT EXISTS jira_changes (seq INTEGER PRIMARY KEY AUTOINCREMENT, id INTEGER NOT NULL)",
+    '''CREATE TRIGGER IF NOT EXISTS jira_changes_insert AFTER INSERT ON jira_tickets BEGIN
+        INSERT INTO jira_changes (id) VALUES (new.id);
+    END''',
+    '''CREATE TRIGGER IF NOT EXISTS jira_changes_delete AFTER DELETE ON jira_tickets BEGIN
+        INSERT INTO jira_changes (id) VALUES (old.id);
+    END''',
+]
+
+def create_schema(conn, vector_type: str = "float", dims: int = FULL_DIMS):
+    """
+    Create the ticket table, its indexes, the vector tables, the full-text index and the
+    JSON side tables, record the vector options in project_meta, and commit.
+    """
+    conn.execute(TICKETS_TABLE_SQL.format(table="jira_tickets"))
+    create_indexes(conn)
+    conn.execute(UNIQUE_TICKET_ID_SQL)
+    conn.execute(f"CREATE VIRTUAL TABLE jira_vectors USING vec0({column_sql(vector_type, dims)})")
+    if is_compact(vector_type, dims):
+        conn.execute(EMBEDDINGS_TABLE_SQL)
+    conn.executemany("INSERT OR REPLACE INTO project_meta (key, value) VALUES (?, ?)", [
+        ("vector_type", vector_type),
+        ("vector_dims", str(dims)),
+        ("vector_seed", os.getenv("VECTOR_SEED", "42")),
+    ])
+    for statement in JSON_TABLES_SQL:
+        conn.execute(statement)
+    for statement in FTS_SQL:
+        conn.execute(statement)
+    conn.commit()
+
+# Each ticket is stored once; this index also serves the lookups by ticket_id
+UNIQUE_TICKET_ID_SQL = "CREATE UNIQUE INDEX IF NOT EXISTS idx_jira_tickets_ticket_id_unique ON jira_tickets (ticket_id)"
+
+def create_indexes(conn):
+    """
+    Create the B-tree indexes on INDEXED_COLUMNS if they are missing. The unique index
+    on ticket_id is created separately, see UNIQUE_TICKET_ID_SQL.
+    """
+    for column in INDEXED_COLUMNS:
+        if column == "ticket_id":
+            continue
+        conn.execute(f"CREATE INDEX IF NOT EXISTS idx_jira_tickets_{column} ON jira_tickets ({column})")
+
+def init_project_db(project_name: str, vector_type: str = "", vector_dims: int = 0, search_backend: str = "") -> str:
+    """
+    Create the database of a project.
+
+    Args:
+        project_name (str): The name of the project (database file).
+        vector_type (str): How jira_vectors stores vectors: 'float', 'int8' or 'bit'.
+            Defaults to VECTOR_TYPE.
+        vector_dims (int): Dimensions stored in jira_vectors. Vectors are reduced with a
+            random projection below 384. Defaults to VECTOR_DIMS.
+        search_backend (str): Backend of vector searches, see set_search_backend.
+            Defaults to SEARCH_BACKEND.
+
+    Returns:
+        str: Success or error message.
+    """
     # get db_dir from the environment variable
     db_dir = os.getenv("DB_DIR", "databases")
     
@@ -21,6 +157,17 @@ def init_project_db(project_name: str) -> str:
         msg = f"Err001: Database for project '{project_name}' already exists at {db_path}"
         logging.error(msg)
         return msg
+
+    vector_type = vector_type or os.getenv("VECTOR_TYPE", "float")
+    vector_dims = int(vector_dims or os.getenv("VECTOR_DIMS", FULL_DIMS))
+    search_backend = search_backend or os.getenv("SEARCH_BACKEND", "vec0")
+    try:
+        check_vector_options(vector_type, vector_dims)
+        check_search_backend(search_backend)
+    except ValueError as e:
+        msg = str(e)
+        logging.error(msg)
+        return msg
     # Create the directory if it doesn't exist
     os.makedirs(db_dir, exist_ok=True)
     
@@ -28,29 +175,10 @@ def init_project_db(project_name: str) -> str:
         conn = sqlite3.connect(db_path)
         conn.close()
         
-        conn = connect_db(project_name)
-        cursor = conn.cursor()
-        cursor.execute('''                       
-            CREATE VIRTUAL TABLE jira_tickets USING vec0(
-            id INTEGER PRIMARY KEY,
-            ticket_id TEXT NOT NULL,
-            summary TEXT,
-            description TEXT,
-            status TEXT,
-            priority TEXT,
-            assignee TEXT,
-            reporter TEXT,
-            created TEXT,
-            updated TEXT,
-            original_estimate_seconds INT,
-            due_date TEXT,
-            full_json TEXT,
-            embedding float[384],
-            );
-        ''')
-        
-        conn.commit()
-        conn.close()
+        with db_pool.connection(project_name) as conn:
+            create_schema(conn, vector_type, vector_dims)
+            if search_backend != "vec0":
+                enable_search_backend(conn, project_name, search_backend)
         msg = f"Succ: Database initialized for project '{project_name}' at {db_path}"
         logging.info(msg)
         return msg
@@ -70,122 +198,509 @@ def get_tickets_count(project_name: str) -> int:
         int: The count of tickets in the database.
     """
     try:
-        conn = connect_db(project_name)
-        cursor = conn.cursor()
-        cursor.execute("SELECT COUNT(*) FROM jira_tickets")
-        count, = cursor.fetchone()
-        conn.close()
+        with db_pool.connection(project_name) as conn:
+            count, = conn.execute("SELECT COUNT(*) FROM jira_tickets").fetchone()
         return count
     except Exception as e:
         msg = f"Err113: Error getting ticket count from database for project '{project_name}': {e}"
         logging.error(msg)
         return 0
 
-def search_tickets(project_name: str, prompt: str, conditions: str = "", top_n: int = 5) -> str:
+SEARCH_MODES = ("vector", "lexical", "hybrid")
+
+def search_tickets(project_name: str, prompt: str, conditions: str = "", top_n: int = 5, filters=None, mode: str = "",
+                   fields=None) -> str:
     """
-    Search for tickets in the database using sqlite-vec for vector similarity.
+    Search for tickets in the database using sqlite-vec for vector similarity, FTS5 for
+    exact terms, or both.
 
     Args:
         project_name (str): The name of the project (database file).
-        prompt_vector (list): The input vector to compare against stored vectors.
+        prompt (str): The text to compare against the stored tickets.
+        conditions (str): Deprecated raw SQL conditions, see raw_conditions_guard.
         top_n (int): The number of top similar tickets to return.
+        filters (dict | list | str): Structured filter, see filters.compile_filter.
+        mode (str): 'vector', 'lexical' (issue keys and BM25 full-text ranking) or
+            'hybrid' (both rankings merged with reciprocal rank fusion). Hybrid searches
+            for a lexical prompt such as an issue key or error code skip the vector
+            search and are not embedded. Defaults to SEARCH_MODE.
+        fields (list | str): Fields to return, see field_list. ticket_id is always
+            returned. full_json is only read and decompressed when it is listed.
 
     Returns:
-        list: A list of tuples containing ticket_id, summary, and similarity score.
+        str: A JSON array of the matching tickets with their distance, and their fused
+            'score' in lexical and hybrid mode.
     """
     try:
-        if (not prompt or prompt.strip() == "") and (not conditions or conditions.strip() == ""):
+        has_prompt = prompt and prompt.strip() != ""
+        if not has_prompt and not filters and (not conditions or conditions.strip() == ""):
             msg = "Err105: Prompt and conditions cannot be empty both."
             logging.error(msg)
             return msg
-        
-        prompt_vector_str = ""
-        if prompt and prompt.strip() !="":            
-            prompt_vector = make_vector(prompt)
-            prompt_vector_str = ", ".join(map(str, prompt_vector)) 
+        if top_n < 0:
+            msg = f"Err026: top_n must not be negative, got {top_n}"
+            logging.error(msg)
+            return msg
 
-        conn = connect_db(project_name)
+        mode = mode or os.getenv("SEARCH_MODE", "vector")
+        if mode not in SEARCH_MODES:
+            msg = f"Err019: Unknown search mode '{mode}', expected one of {', '.join(SEARCH_MODES)}"
+            logging.error(msg)
+            return msg
+        if mode == "hybrid" and is_lexical_query(prompt):
+            mode = "lexical"
 
-        vec_version, = conn.execute("select vec_version()").fetchone()
-        logging.debug(f"sqlite_vec={vec_version}")
+        cache_key = (prompt, conditions, json.dumps(filters, sort_keys=True), top_n, mode, json.dumps(fields))
+        cached = result_cache.get(project_name, cache_key)
+        if cached is not None:
+            return cached
+        generation = result_cache.generation(project_name)
 
-        cursor = conn.cursor()        
+        try:
+            where, where_params, _ = search_where(conditions, filters)
+            fields = field_list(fields)
+        except ValueError as e:
+            msg = str(e)
+            logging.error(msg)
+            return msg
+        prompt_vector = make_query_vector(prompt) if has_prompt and mode != "lexical" else None
+        columns = projected_columns(fields)
 
-        # Query for the top N most similar tickets
-        query = f"""
-        SELECT ticket_id, summary, description, status, priority, assignee, reporter, created, updated, original_estimate_seconds, due_date, full_json, distance
-        FROM jira_tickets
-        WHERE 
-        """
-        if prompt_vector_str and prompt_vector_str.strip() != "":
-            query += f" embedding match '[{prompt_vector_str}]' "
-        else:
-            query += f" 1=1 "
-        if conditions and conditions.strip() != "":
-            query += f" AND {conditions} "
-        query += f"""
-        ORDER BY distance ASC
-        LIMIT {top_n};
-        """
-        
-        cursor.execute(query)
-        results = cursor.fetchall()
-        conn.close()
-        results = [
-            {
-            "ticket_id": row[0],
-            "summary": row[1],
-            "description": row[2],
-            "status": row[3],
-            "priority": row[4],
-            "assignee": row[5],
-            "reporter": row[6],
-            "created": row[7],
-            "updated": row[8],
-            "original_estimate_seconds": row[9],
-            "due_date": row[10],
-            "full_json": row[11],
-            "distance": row[12],
-            }
-            for row in results
-        ]
+        with db_pool.connection(project_name) as conn:
+            options = vector_options(conn)
+            index = vector_index(conn, project_name) if prompt_vector is not None else None
+            raw = conditions and conditions.strip() != ""
+            with raw_conditions_guard(conn) if raw else nullcontext():
+                if not has_prompt or mode == "vector":
+                    results = vector_search(conn, prompt_vector, where, where_params, top_n, columns, options, index)
+                elif mode == "lexical":
+                    results = reciprocal_rank_fusion([lexical_search(conn, prompt, where, where_params, top_n, columns)],
+                                                     top_n, int(os.getenv("RRF_K", 60)))
+                else:
+                    candidates = top_n * int(os.getenv("HYBRID_CANDIDATES", 4))
+                    results = reciprocal_rank_fusion([
+                        vector_search(conn, prompt_vector, where, where_params, candidates, columns, options, index),
+                        lexical_search(conn, prompt, where, where_params, candidates, columns),
+                    ], top_n, int(os.getenv("RRF_K", 60)))
+            if fields and JSON_FIELD in fields:
+                attach_full_json(conn, project_name, results)
+
+        if fields:
+            dropped = [field for field in SCORE_FIELDS if field not in fields]
+            results = [{key: value for key, value in result.items() if key not in dropped} for result in results]
 
         # Convert results to a JSON array
         results_json = json.dumps(results)
+        result_cache.put(project_name, cache_key, results_json, generation)
         return results_json
 
     except Exception as e:
         msg = f"Err004: Error searching tickets in database for project '{project_name}': {e}"
         logging.error(msg)
         return []
-    
-def make_vector(prompt: str) -> list:
+
+def search_tickets_batch(project_name: str, prompts: list, top_n: int = 5, filters=None, fields=None) -> str:
     """
-    Convert a prompt string into a vector representation using a pre-trained model.
+    Search for the tickets nearest to several prompts at once.
+
+    The prompts are embedded in one batch. Projects with the numpy search backend
+    compare all prompts with the vectors in one matrix product, vec0 projects are
+    searched once per prompt.
 
     Args:
-        prompt (str): The input string to convert.
+        project_name (str): The name of the project (database file).
+        prompts (list): The search prompts.
+        top_n (int): The number of top similar tickets to return per prompt.
+        filters (dict | list | str): Structured filter applied to every prompt, see filters.compile_filter.
+        fields (list | str): Fields to return, see field_list.
 
     Returns:
-        list: A list representing the vector.
+        str: A JSON array holding the array of matching tickets of each prompt, in the
+            order of the prompts.
     """
     try:
-        # Tokenize the input text
-        inputs = tokenizer(prompt, return_tensors="pt", truncation=True, padding=True)
+        prompts = [prompt for prompt in prompts or [] if prompt and prompt.strip() != ""]
+        if not prompts:
+            msg = "Err105: Prompts cannot be empty."
+            logging.error(msg)
+            return msg
+        if top_n < 0:
+            msg = f"Err026: top_n must not be negative, got {top_n}"
+            logging.error(msg)
+            return msg
+        try:
+            where, where_params, _ = search_where("", filters)
+            fields = field_list(fields)
+        except ValueError as e:
+            msg = str(e)
+            logging.error(msg)
+            return msg
+        prompt_vectors = make_query_vectors(prompts)
+        columns = projected_columns(fields)
+
+        with db_pool.connection(project_name) as conn:
+            options = vector_options(conn)
+            index = vector_index(conn, project_name)
+            if index is not None:
+                batches = indexed_search(conn, index, prompt_vectors, where, where_params, top_n, columns)
+            else:
+                batches = [vector_search(conn, prompt_vector, where, where_params, top_n, columns, options)
+                           for prompt_vector in prompt_vectors]
+            if fields and JSON_FIELD in fields:
+                attach_full_json(conn, project_name, [result for results in batches for result in results])
 
-        # Generate embeddings
-        with torch.no_grad():
-            outputs = model(**inputs)
-            embeddings = outputs.last_hidden_state.mean(dim=1).squeeze().tolist()
+        if fields and "distance" not in fields:
+            batches = [[{key: value for key, value in result.items() if key != "distance"} for result in results]
+                       for results in batches]
+        return json.dumps(batches)
 
-        return embeddings
     except Exception as e:
-        logging.error(f"Err005: Failed to generate vector for prompt '{prompt}': {e}")
+        msg = f"Err004: Error searching tickets in database for project '{project_name}': {e}"
+        logging.error(msg)
         return []
-    
+
+def lookup_tickets(project_name: str, ticket_ids: list, fields=None) -> str:
+    """
+    Look up tickets by key through the ticket_id index, without embedding anything.
+
+    Args:
+        project_name (str): The name of the project (database file).
+        ticket_ids (list): Ticket keys, e.g. ["PRJ-1", "PRJ-2"].
+        fields (list | str): Fields to return, see field_list.
+
+    Returns:
+        str: A JSON array of the tickets found, in the order of ticket_ids, or an error message.
+    """
+    try:
+        fields = field_list(fields)
+    except ValueError as e:
+        msg = str(e)
+        logging.error(msg)
+        return msg
+
+    columns = projected_columns(fields)
+    ticket_ids = list(dict.fromkeys(ticket_ids))
+    try:
+        select = ", ".join(columns)
+        found = {}
+        with db_pool.connection(project_name) as conn:
+            # Stay well below SQLite's limit on the number of host parameters
+            for start in range(0, len(ticket_ids), 500):
+                chunk = ticket_ids[start:start + 500]
+                query = f"SELECT {select} FROM jira_tickets WHERE ticket_id IN ({', '.join('?' * len(chunk))})"
+                for row in conn.execute(query, chunk):
+                    found[row[0]] = dict(zip(columns, row))
+            if fields and JSON_FIELD in fields:
+                attach_full_json(conn, project_name, list(found.values()))
+        missing = [ticket_id for ticket_id in ticket_ids if ticket_id not in found]
+        if missing:
+            logging.info(f"Tickets not found in project '{project_name}': {', '.join(missing)}")
+        return json.dumps([found[ticket_id] for ticket_id in ticket_ids if ticket_id in found])
+    except Exception as e:
+        msg = f"Err021: Error getting tickets from database for project '{project_name}': {e}"
+        logging.error(msg)
+        return msg
+
+# Search result fields computed by the search rather than stored
+SCORE_FIELDS = ["distance", "score"]
+
+def field_list(fields=None) -> list:
+    """
+    Parse and check a field projection.
+
+    Args:
+        fields (list | str): Wanted fields, or a comma separated string of them.
+
+    Returns:
+        list: The fields, or None for the default fields: every ticket column and the
+            scores, but not full_json.
+
+    Raises:
+        ValueError: If a field is unknown.
+    """
+    if not fields:
+        return None
+    if isinstance(fields, str):
+        fields = [field.strip() for field in fields.split(",") if field.strip()]
+    known = TICKET_COLUMNS + [JSON_FIELD] + SCORE_FIELDS
+    unknown = [field for field in fields if field not in known]
+    if unknown:
+        raise ValueError(f"Err020: Unknown fields {', '.join(unknown)}, expected some of {', '.join(known)}")
+    return fields or None
+
+def projected_columns(fields: list = None) -> list:
+    """
+    Return the ticket columns to read for a field list, always starting with ticket_id.
+    """
+    if not fields:
+        return TICKET_COLUMNS
+    return ["ticket_id"] + [column for column in TICKET_COLUMNS[1:] if column in fields]
+
+def attach_full_json(conn, project_name: str, results: list):
+    """
+    Add the decompressed full JSON text to result dictionaries.
+    """
+    texts = load_full_json(conn, project_name, [result["ticket_id"] for result in results])
+    for result in results:
+        result[JSON_FIELD] = texts.get(result["ticket_id"], "")
+
+def ticket_result(row, columns: list = TICKET_COLUMNS) -> dict:
+    """
+    Convert a search row (the columns followed by the distance) to a result dictionary.
+    """
+    return dict(zip(columns + ["distance"], row))
+
+def vector_search(conn, prompt_vector: list, where: str, where_params: list, top_n: int,
+                  columns: list = TICKET_COLUMNS, options: dict = None, index: NumpyIndex = None) -> list:
+    """
+    Rank tickets by vector distance, or by id when there is no prompt vector.
+
+    The distances are computed by the index of the project's search backend when one is
+    given (see vector_index), and by sqlite-vec otherwise.
+    """
+    if index is not None and prompt_vector is not None:
+        return indexed_search(conn, index, [prompt_vector], where, where_params, top_n, columns)[0]
+    query, params = search_query(prompt_vector, where, where_params, top_n, columns, options)
+    return [ticket_result(row, columns) for row in conn.execute(query, params).fetchall()]
+
+def indexed_search(conn, index: NumpyIndex, prompt_vectors: list, where: str, where_params: list, top_n: int,
+                   columns: list = TICKET_COLUMNS) -> list:
+    """
+    Rank tickets for several prompt vectors at once with a search backend index.
+
+    The filter selects the candidate rows through the ticket indexes, and the index
+    only compares the candidates' vectors.
+
+    Returns:
+        list: For each prompt vector, the ranked ticket dictionaries with their distance.
+    """
+    allowed = None
+    if where:
+        allowed = [row_id for row_id, in conn.execute(f"SELECT t.id FROM jira_tickets t WHERE {where}", where_params)]
+    neighbours = index.search(np.asarray(prompt_vectors, dtype=np.float32), int(top_n), allowed)
+
+    row_ids = list(dict.fromkeys(row_id for hits in neighbours for row_id, _ in hits))
+    select = ", ".join(f"t.{column}" for column in columns)
+    rows = {}
+    for start in range(0, len(row_ids), 500):
+        chunk = row_ids[start:start + 500]
+        for row in conn.execute(f"SELECT t.id, {select} FROM jira_tickets t WHERE t.id IN ({', '.join('?' * len(chunk))})", chunk):
+            rows[row[0]] = row[1:]
+    return [[ticket_result(rows[row_id] + (distance,), columns) for row_id, distance in hits if row_id in rows]
+            for hits in neighbours]
+
+def lexical_search(conn, prompt: str, where: str, where_params: list, top_n: int,
+                   columns: list = TICKET_COLUMNS) -> list:
+    """
+    Rank tickets by exact terms: tickets whose key is in the prompt first, then the
+    FTS5 matches of the prompt's words by BM25.
+    """
+    select = ", ".join(f"t.{column}" for column in columns)
+    results = []
+    keys = ticket_keys(prompt)
+    if keys:
+        query = f"""
+        SELECT {select}, NULL AS distance
+        FROM jira_tickets t
+        WHERE t.ticket_id IN ({", ".join("?" * len(keys))}) {f"AND {where}" if where else ""}
+        LIMIT ?
+        """
+        rows = conn.execute(query, keys + where_params + [top_n]).fetchall()
+        rows.sort(key=lambda row: keys.index(row[0]))
+        results += [ticket_result(row, columns) for row in rows]
+
+    match = fts_match_query(prompt)
+    if match and len(results) < top_n:
+        # The conditions are applied in a subquery, where the columns jira_fts shares
+        # with jira_tickets (summary, description) are not ambiguous
+        query = f"""
+        SELECT {select}, NULL AS distance
+        FROM jira_fts JOIN (SELECT * FROM jira_tickets t {f"WHERE {where}" if where else ""}) t ON t.id = jira_fts.rowid
+        WHERE jira_fts MATCH ?
+        ORDER BY bm25(jira_fts)
+        LIMIT ?
+        """
+        found = {result["ticket_id"] for result in results}
+        for row in conn.execute(query, where_params + [match, top_n]).fetchall():
+            if row[0] not in found:
+                results.append(ticket_result(row, columns))
+    return results[:top_n]
+
+def search_where(conditions: str = "", filters=None) -> tuple:
+    """
+    Build the WHERE expression of a search from structured filters and raw conditions.
+
+    Returns:
+        tuple: (SQL expression or "", list of parameters, list of filtered fields)
+
+    Raises:
+        ValueError: If the filters are malformed or raw conditions are disabled.
+    """
+    parts = []
+    params = []
+    fields = []
+    if filters:
+        sql, params, fields = compile_filter(filters)
+        parts.append(sql)
+    if conditions and conditions.strip() != "":
+        if os.getenv("ALLOW_RAW_CONDITIONS", "true").lower() not in ("1", "true", "yes"):
+            raise ValueError("Err018: Raw SQL conditions are disabled, use filters instead")
+        logging.warning("Raw SQL conditions are deprecated, use structured filters instead")
+        parts.append(f"({conditions})")
+    return " AND ".join(parts), params, fields
+
+def search_query(prompt_vector: list, where: str, where_params: list, top_n: int,
+                 columns: list = TICKET_COLUMNS, options: dict = None) -> tuple:
+    """
+    Build the parameterized search statement.
+
+    The SQL text only depends on the shape of the search, so repeated searches reuse the
+    prepared statement from the connection's statement cache.
+
+    Projects with compact vectors (see vector_options) search the compact vectors for
+    top_n * RESCORE_FACTOR candidates and rank those by their full float vectors.
+    Filtered searches compare the full vectors of the candidates the indexes select.
+
+    Returns:
+        tuple: (SQL statement, list of parameters)
+    """
+    select = ", ".join(f"t.{column}" for column in columns)
+    top_n = int(top_n)
+    options = options or {"type": "float", "dims": FULL_DIMS, "seed": 0}
+    if prompt_vector is not None and is_compact(options["type"], options["dims"]):
+        blob = sqlite_vec.serialize_float32(prompt_vector)
+        if where:
+            query = f"""
+            SELECT {select}, vec_distance_l2(v.embedding, ?) AS distance
+            FROM jira_tickets t JOIN jira_embeddings v ON v.id = t.id
+            WHERE {where}
+            ORDER BY distance ASC
+            LIMIT ?
+            """
+            return query, [blob] + where_params + [top_n]
+        query = f"""
+        WITH knn AS (SELECT rowid FROM jira_vectors WHERE embedding MATCH {VECTOR_SQL[options["type"]]} AND k = ?)
+        SELECT {select}, vec_distance_l2(e.embedding, ?) AS distance
+        FROM knn JOIN jira_embeddings e ON e.id = knn.rowid JOIN jira_tickets t ON t.id = knn.rowid
+        ORDER BY distance ASC
+        LIMIT ?
+        """
+        compact = compact_vector(prompt_vector, options["type"], options["dims"], options["seed"])
+        return query, [compact, top_n * int(os.getenv("RESCORE_FACTOR", 8)), blob, top_n]
+    if prompt_vector is not None:
+        blob = sqlite_vec.serialize_float32(prompt_vector)
+        if where:
+            # Prefilter: the indexes select the candidates and only their vectors are compared
+            query = f"""
+            SELECT {select}, vec_distance_l2(v.embedding, ?) AS distance
+            FROM jira_tickets t JOIN jira_vectors v ON v.rowid = t.id
+            WHERE {where}
+            ORDER BY distance ASC
+            LIMIT ?
+            """
+            return query, [blob] + where_params + [top_n]
+        query = f"""
+        WITH knn AS (SELECT rowid, distance FROM jira_vectors WHERE embedding MATCH ? AND k = ?)
+        SELECT {select}, knn.distance
+        FROM knn JOIN jira_tickets t ON t.id = knn.rowid
+        ORDER BY knn.distance ASC
+        """
+        return query, [blob, top_n]
+    query = f"""
+    SELECT {select}, NULL AS distance
+    FROM jira_tickets t
+    WHERE {where}
+    ORDER BY t.id
+    LIMIT ?
+    """
+    return query, where_params + [top_n]
+
+@contextmanager
+def raw_conditions_guard(conn):
+    """
+    Restrict the statements prepared on a connection to reading the ticket tables.
+
+    Raw conditions are spliced into the SQL text, so they run under an authorizer that
+    denies writes, pragmas, attaching databases and reading any other table.
+    """
+    def authorize(action, arg1, arg2, db_name, trigger):
+        if action in (sqlite3.SQLITE_SELECT, sqlite3.SQLITE_FUNCTION, sqlite3.SQLITE_RECURSIVE):
+            return sqlite3.SQLITE_OK
+        if action == sqlite3.SQLITE_READ and (arg1 in ("jira_tickets", "jira_embeddings") or arg1.startswith(("jira_vectors", "jira_fts"))):
+            return sqlite3.SQLITE_OK
+        # knn is the CTE of the vector query
+        if action == sqlite3.SQLITE_READ and arg1 == "knn":
+            return sqlite3.SQLITE_OK
+        # FTS5 checks whether its shadow tables changed before each query
+        if action == sqlite3.SQLITE_PRAGMA and arg1 == "data_version":
+            return sqlite3.SQLITE_OK
+        return sqlite3.SQLITE_DENY
+
+    conn.set_authorizer(authorize)
+    try:
+        yield
+    finally:
+        conn.set_authorizer(None)
+
+def search_plan(project_name: str, prompt: str = "", conditions: str = "", top_n: int = 5, filters=None) -> dict:
+    """
+    Report how SQLite executes a search, without running it.
+
+    Returns:
+        dict: The query plan steps, the filtered fields, the filtered fields without an
+            index and the plan steps that scan the ticket table.
+    """
+    where, where_params, fields = search_where(conditions, filters)
+    # The plan does not depend on the vector, so the prompt is not embedded
+    prompt_vector = [0.0] * 384 if prompt and prompt.strip() != "" else None
+    if prompt_vector is None and not where:
+        raise ValueError("Err105: Prompt and conditions cannot be empty both.")
+    with db_pool.connection(project_name) as conn:
+        query, params = search_query(prompt_vector, where, where_params, top_n, options=vector_options(conn))
+        plan = [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {query}", params).fetchall()]
+    # Without a usable index a filtered vector search walks every vector (v) and looks up
+    # each ticket by id
+    indexed = any(step.startswith("SEARCH t USING") and "INDEX" in step and "PRIMARY KEY" not in step for step in plan)
+    return {
+        "plan": plan,
+        "fields": fields,
+        "unindexed_fields": [field for field in fields if field not in INDEXED_COLUMNS],
+        "table_scans": [step for step in plan
+                        if step.startswith("SCAN t") or (where and not indexed and step.startswith("SCAN v "))],
+    }
+
+def make_cached_vectors(texts: list) -> list:
+    """
+    Convert texts into vectors like make_vectors, reusing vectors from the embedding cache.
+
+    Only the texts missing from the cache are embedded, and their vectors are added to it.
+
+    Args:
+        texts (list): The input strings to convert.
+
+    Returns:
+        list: A list of vectors in the same order as texts.
+    """
+    try:
+        vectors = embedding_cache.get_many(texts)
+    except Exception as e:
+        logging.warning(f"Embedding cache lookup failed: {e}")
+        vectors = [None] * len(texts)
+
+    missing = [i for i, vector in enumerate(vectors) if vector is None]
+    if missing:
+        missing_texts = [texts[i] for i in missing]
+        for i, vector in zip(missing, make_vectors(missing_texts)):
+            vectors[i] = vector
+        try:
+            embedding_cache.put_many(missing_texts, [vectors[i] for i in missing])
+        except Exception as e:
+            logging.warning(f"Embedding cache update failed: {e}")
+    return vectors
+
 def add_ticket(project_name: str, ticket: any) -> str:
     """
-    Add a new ticket to the database.
+    Add a ticket to the database, replacing the stored version of the same ticket_id.
 
     Args:
         project_name (str): The name of the project (database file).
@@ -196,60 +711,17 @@ def add_ticket(project_name: str, ticket: any) -> str:
     """
 
     try:        
-        ticket_data = "{}"
-        # Check if the full_json is String
-        if isinstance(ticket, str):
-            ticket_data = json.loads(ticket)
-        else:
-            ticket_data = parse_issue_2_json(ticket)
-            
-        # Parse the JSON to extract required fields
-        ticket_id = ticket_data.get("key") if ticket_data.get("key") else ticket_data.get("ticket_id")
-        summary = ticket_data.get("summary")
-        
-        if not ticket_id or not summary:
-            msg = "Err008: Missing required fields (ticket_id, summary) in JSON."
-            logging.error(msg)
-            return msg
+        ticket_data = parse_ticket(ticket)
+        if isinstance(ticket_data, str):
+            return ticket_data
 
-        # Generate vector from the description
-        description = ticket_data.get("description", "")
-        if not description:
-            description = ""
-        vector = make_vector(summary + ":" + description)
-        
-        # Convert the vector (list) to float[384] format
-        if len(vector) != 384:
-            msg = f"Err006: Vector length is not 384, got {len(vector)}"
+        ticket_id = ticket_data["ticket_id"]
+        counts = upsert_tickets(project_name, [ticket])
+        if counts["failed"]:
+            msg = f"Err007: Error adding ticket '{ticket_id}' to database for project '{project_name}'"
             logging.error(msg)
             return msg
 
-        vector_array = sqlite3.Binary(torch.tensor(vector).numpy().tobytes())    
-
-        conn = None
-        try:
-            conn = connect_db(project_name)
-            cursor = conn.cursor()
-            cursor.execute('''
-                INSERT INTO jira_tickets (ticket_id, summary, description, status, priority, assignee, reporter, created, updated, original_estimate_seconds, due_date, full_json, embedding)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (ticket_id, summary, 
-                    description or "",
-                    ticket_data.get("status", "") or "",
-                    ticket_data.get("priority", "") or "",
-                    ticket_data.get("assignee", "") or "", 
-                    ticket_data.get("reporter", "") or "", 
-                    ticket_data.get("created", "") or "", 
-                    ticket_data.get("updated", "") or "", 
-                    ticket_data.get("original_estimate_seconds", 0) or 0,
-                    ticket_data.get("due_date", "") or "",
-                  json.dumps(ticket_data) or "",  # Convert ticket_data to a JSON string
-                  vector_array))
-            conn.commit()
-        finally:
-            if conn:
-                conn.close()
-        
         msg = f"Succ: Ticket '{ticket_id}' added to project '{project_name}'"
         logging.debug(msg)
         return msg
@@ -261,7 +733,265 @@ def add_ticket(project_name: str, ticket: any) -> str:
         msg = f"Err007: Error adding ticket to database for project '{project_name}': {e}"
         logging.error(msg)
         return msg
-    
+
+def parse_ticket(ticket: any):
+    """
+    Normalize a ticket (JSON string or JIRA issue) into a dictionary.
+
+    Args:
+        ticket: A ticket JSON string or a JIRA issue object.
+
+    Returns:
+        dict: The ticket data with 'ticket_id' set, or an error message string.
+    """
+    # Check if the full_json is String
+    if isinstance(ticket, str):
+        ticket_data = json.loads(ticket)
+    else:
+        ticket_data = parse_issue_2_json(ticket)
+    if not ticket_data:
+        msg = "Err008: Missing required fields (ticket_id, summary) in JSON."
+        logging.error(msg)
+        return msg
+
+    # Parse the JSON to extract required fields
+    ticket_id = ticket_data.get("key") if ticket_data.get("key") else ticket_data.get("ticket_id")
+    summary = ticket_data.get("summary")
+
+    if not ticket_id or not summary:
+        msg = "Err008: Missing required fields (ticket_id, summary) in JSON."
+        logging.error(msg)
+        return msg
+
+    ticket_data["ticket_id"] = ticket_id
+    return ticket_data
+
+def embedding_text(ticket_data: dict) -> str:
+    """
+    Build the text that is embedded for a ticket.
+    """
+    description = ticket_data.get("description", "")
+    if not description:
+        description = ""
+    return ticket_data.get("summary") + ":" + description
+
+INSERT_TICKET_SQL = '''
+    INSERT INTO jira_tickets (id, ticket_id, summary, description, status, priority, assignee, reporter, created, updated, original_estimate_seconds, due_date)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+'''
+
+INSERT_JSON_SQL = "INSERT INTO jira_ticket_json (id, dict_id, data) VALUES (?, ?, ?)"
+
+INSERT_VECTOR_SQL = "INSERT INTO jira_vectors (rowid, embedding) VALUES (?, {value})"
+
+INSERT_EMBEDDING_SQL = "INSERT INTO jira_embeddings (id, embedding) VALUES (?, ?)"
+
+def ticket_row(ticket_data: dict) -> tuple:
+    """
+    Build the jira_tickets column values of a parsed ticket, without the id.
+    """
+    return (ticket_data.get("ticket_id"), ticket_data.get("summary"), 
+            ticket_data.get("description", "") or "",
+            ticket_data.get("status", "") or "",
+            ticket_data.get("priority", "") or "",
+            ticket_data.get("assignee", "") or "", 
+            ticket_data.get("reporter", "") or "", 
+            ticket_data.get("created", "") or "", 
+            ticket_data.get("updated", "") or "", 
+            ticket_data.get("original_estimate_seconds", 0) or 0,
+            ticket_data.get("due_date", "") or "")
+
+def vector_blob(vector: list):
+    """
+    Serialize a vector for the embedding column.
+
+    Raises:
+        ValueError: If the vector is not 384 floats long.
+    """
+    # Convert the vector (list) to float[384] format
+    if not vector or len(vector) != 384:
+        raise ValueError(f"Err006: Vector length is not 384, got {len(vector) if vector else 0}")
+    return sqlite3.Binary(sqlite_vec.serialize_float32(vector))
+
+def insert_tickets(conn, tickets: list, vectors: list, ids: list = None) -> tuple:
+    """
+    Write a batch of parsed tickets in a single transaction using executemany.
+
+    A row that fails does not roll back the rest of the batch: the batch is retried
+    row by row inside savepoints and only the failing rows are skipped. The
+    transaction is committed here only if it was started here; inside the caller's
+    transaction the caller commits or rolls back.
+
+    Args:
+        conn (sqlite3.Connection): An open connection to the project database.
+        tickets (list): Ticket dictionaries returned by parse_ticket.
+        vectors (list): The embedding of each ticket, in the same order.
+        ids (list): Row id of each ticket, or None to allocate a new one. A ticket
+            with a row id replaces the stored row in place. The row is deleted in the
+            same savepoint as the insert, so a failed insert keeps the old row.
+
+    Returns:
+        tuple: (number of rows written, list of error messages for rows that failed)
+    """
+    entries = []
+    errors = []
+    for ticket_data, vector, row_id in zip(tickets, vectors, ids or [None] * len(tickets)):
+        try:
+            entries.append([row_id, ticket_row(ticket_data), vector_blob(vector), json.dumps(ticket_data), vector])
+        except ValueError as e:
+            errors.append(f"{e} (ticket '{ticket_data.get('ticket_id')}')")
+
+    if not entries:
+        return 0, errors
+
+    # Row ids of the stored rows to replace, in the order of entries
+    replaced = [entry[0] for entry in entries]
+
+    cursor = conn.cursor()
+    owned = not conn.in_transaction
+    if owned:
+        cursor.execute("BEGIN IMMEDIATE")
+    try:
+        # Ids are allocated inside the write transaction, so no other writer can take them
+        max_id, = cursor.execute("SELECT COALESCE(MAX(id), 0) FROM jira_tickets").fetchone()
+        next_id = max([max_id] + [entry[0] for entry in entries if entry[0] is not None]) + 1
+        for entry in entries:
+            if entry[0] is None:
+                entry[0] = next_id
+                next_id += 1
+
+        dict_id, zdict = json_dictionary(conn, [entry[3] for entry in entries])
+        level = int(os.getenv("JSON_COMPRESSION_LEVEL", 6))
+        options = vector_options(conn)
+        compact = is_compact(options["type"], options["dims"])
+        for entry in entries:
+            entry[3] = compress_json(entry[3], zdict, level)
+            entry[4] = compact_vector(entry[4], options["type"], options["dims"], options["seed"]) if compact else entry[2]
+
+        # Rows to insert per statement, in the order of entries
+        rows = {
+            INSERT_TICKET_SQL: [(entry[0],) + entry[1] for entry in entries],
+            INSERT_VECTOR_SQL.format(value=VECTOR_SQL[options["type"]]): [(entry[0], entry[4]) for entry in entries],
+            INSERT_JSON_SQL: [(entry[0], dict_id, entry[3]) for entry in entries],
+        }
+        if compact:
+            rows[INSERT_EMBEDDING_SQL] = [(entry[0], entry[2]) for entry in entries]
+
+        cursor.execute("SAVEPOINT insert_batch")
+        try:
+            delete_tickets(conn, [row_id for row_id in replaced if row_id is not None])
+            for sql, params in rows.items():
+                cursor.executemany(sql, params)
+            cursor.execute("RELEASE SAVEPOINT insert_batch")
+            written = len(entries)
+        except sqlite3.Error as e:
+            logging.warning(f"Batch insert of {len(entries)} tickets failed ({e}), retrying row by row")
+            cursor.execute("ROLLBACK TO SAVEPOINT insert_batch")
+            cursor.execute("RELEASE SAVEPOINT insert_batch")
+            written = 0
+            for index, entry in enumerate(entries):
+                cursor.execute("SAVEPOINT insert_row")
+                try:
+                    if replaced[index] is not None:
+                        delete_tickets(conn, [replaced[index]])
+                    for sql, params in rows.items():
+                        cursor.execute(sql, params[index])
+                    cursor.execute("RELEASE SAVEPOINT insert_row")
+                    written += 1
+                except sqlite3.Error as row_error:
+                    cursor.execute("ROLLBACK TO SAVEPOINT insert_row")
+                    cursor.execute("RELEASE SAVEPOINT insert_row")
+                    errors.append(f"Err007: Error adding ticket '{entry[1][0]}': {row_error}")
+        if owned:
+            conn.commit()
+    except Exception:
+        if owned:
+            conn.rollback()
+        raise
+
+    return written, errors
+
+def delete_tickets(conn, ids: list):
+    """
+    Delete tickets, their vectors and their JSON by row id, inside the caller's transaction.
+    """
+    params = [(row_id,) for row_id in ids]
+    conn.executemany("DELETE FROM jira_vectors WHERE rowid = ?", params)
+    options = vector_options(conn)
+    if is_compact(options["type"], options["dims"]):
+        conn.executemany("DELETE FROM jira_embeddings WHERE id = ?", params)
+    conn.executemany("DELETE FROM jira_ticket_json WHERE id = ?", params)
+    conn.executemany("DELETE FROM jira_tickets WHERE id = ?", params)
+
+def json_dictionary(conn, samples: list) -> tuple:
+    """
+    Return the zlib preset dictionary to compress new ticket JSON with.
+
+    The dictionary is trained once per project, from the first batch of at least
+    JSON_DICT_MIN_SAMPLES tickets. Rows written before keep dict_id 0 (no dictionary).
+    Must be called inside the write transaction.
+
+    Returns:
+        tuple: (dict_id, dictionary bytes), (0, b"") while there is no dictionary.
+    """
+    row = conn.execute("SELECT dict_id, data FROM jira_json_dicts ORDER BY dict_id DESC LIMIT 1").fetchone()
+    if row:
+        return row[0], row[1]
+    if len(samples) < int(os.getenv("JSON_DICT_MIN_SAMPLES", 100)):
+        return 0, b""
+    zdict = train_dictionary(samples, int(os.getenv("JSON_DICT_SIZE", 32768)))
+    if not zdict:
+        return 0, b""
+    conn.execute("INSERT INTO jira_json_dicts (dict_id, data) VALUES (1, ?)", (zdict,))
+    logging.info(f"Trained a {len(zdict)} byte JSON dictionary from {len(samples)} tickets")
+    return 1, zdict
+
+# Preset dictionaries by (project name, dict_id); dictionaries never change once written
+_json_dicts = {}
+
+def load_full_json(conn, project_name: str, ticket_ids: list) -> dict:
+    """
+    Read and decompress the full JSON of tickets.
+
+    Returns:
+        dict: ticket_id -> JSON text, for the tickets that have one.
+    """
+    texts = {}
+    for start in range(0, len(ticket_ids), 500):
+        chunk = ticket_ids[start:start + 500]
+        rows = conn.execute(f"""
+            SELECT t.ticket_id, j.dict_id, j.data FROM jira_tickets t JOIN jira_ticket_json j ON j.id = t.id
+            WHERE t.ticket_id IN ({", ".join("?" * len(chunk))})
+        """, chunk).fetchall()
+        for ticket_id, dict_id, data in rows:
+            zdict = b""
+            if dict_id:
+                zdict = _json_dicts.get((project_name, dict_id))
+                if zdict is None:
+                    zdict, = conn.execute("SELECT data FROM jira_json_dicts WHERE dict_id = ?", (dict_id,)).fetchone()
+                    _json_dicts[(project_name, dict_id)] = zdict
+            texts[ticket_id] = decompress_json(data, zdict)
+    return texts
+
+def move_full_json(conn, source_table: str):
+    """
+    Compress the full_json column of source_table into jira_ticket_json, inside the
+    caller's transaction. Used to migrate databases that stored it uncompressed.
+    """
+    for statement in JSON_TABLES_SQL:
+        conn.execute(statement)
+    samples = [text for text, in conn.execute(
+        f"SELECT full_json FROM {source_table} WHERE full_json != '' LIMIT ?",
+        (int(os.getenv("JSON_DICT_TRAIN_SAMPLES", 1000)),))]
+    dict_id, zdict = json_dictionary(conn, samples)
+    level = int(os.getenv("JSON_COMPRESSION_LEVEL", 6))
+    rows = conn.execute(f"SELECT id, full_json FROM {source_table} WHERE full_json IS NOT NULL AND full_json != ''")
+    while True:
+        batch = rows.fetchmany(500)
+        if not batch:
+            break
+        conn.executemany(INSERT_JSON_SQL, [(row_id, dict_id, compress_json(text, zdict, level)) for row_id, text in batch])
+
 def parse_issue_2_json(issue) -> str:
     """
     Convert a JIRA issue object to a JSON string.
@@ -289,6 +1019,10 @@ def parse_issue_2_json(issue) -> str:
             'issue_type': issue.fields.issuetype.name,
             # Add more fields as needed
         }
+        # Fields configured in JIRA_EXTRA_FIELDS are kept as returned by JIRA
+        raw_fields = issue.raw.get("fields", {}) if issue.raw else {}
+        for field in jira_extra_fields():
+            issue_dict[field] = raw_fields.get(field)
         #issue_json = json.dumps(issue_dict, indent=4, ensure_ascii=False)
         return issue_dict
     
@@ -299,33 +1033,503 @@ def parse_issue_2_json(issue) -> str:
 
 def append_tickets(project_name: str, tickets: list) -> int:
     """
-    Add multiple tickets to the database.
+    Add multiple tickets to the database with upsert_tickets, so a ticket that is
+    already stored is replaced rather than added again.
 
     Args:
         project_name (str): The name of the project (database file).
         tickets (list): A list of ticket JSON strings.
 
     Returns:
-        str: Success or error message.
+        int: The number of tickets added or replaced.
     """
     if not tickets or len(tickets) == 0:
         return 0
-    
-    count = 0
+
+    counts = upsert_tickets(project_name, tickets)
+    return counts["added"] + counts["updated"]
+
+def parse_tickets(tickets: list) -> list:
+    """
+    Parse tickets with parse_ticket, logging and dropping the ones that fail.
+    """
+    parsed = []
     for ticket_json in tickets:
-        result = add_ticket(project_name, ticket_json)
-        if result.startswith("Err"):
-            logging.error(result)
+        try:
+            ticket_data = parse_ticket(ticket_json)
+        except json.JSONDecodeError as e:
+            ticket_data = f"Err009: Failed to parse JSON: {e}"
+        if isinstance(ticket_data, str):
+            logging.error(ticket_data)
         else:
-            count += 1
+            parsed.append(ticket_data)
+    return parsed
+
+def upsert_tickets(project_name: str, tickets: list, progress=None, watermark=None) -> dict:
+    """
+    Insert new tickets and replace changed ones in place, keyed on ticket_id.
+
+    A ticket whose 'updated' value equals the stored one is skipped without being
+    embedded.
+
+    Args:
+        project_name (str): The name of the project (database file).
+        tickets (list): A list of ticket JSON strings or JIRA issues.
+        progress (callable): Called with embedded=n once the changed tickets are
+            embedded and with written=n once they are written, e.g. Job.add.
+        watermark (SyncWatermark): Told the 'updated' value of each ticket that is
+            now stored and of each ticket that failed.
+
+    Returns:
+        dict: Counts of 'added', 'updated', 'skipped' and 'failed' tickets.
+    """
+    counts = {"added": 0, "updated": 0, "skipped": 0, "failed": 0}
+    if not tickets:
+        return counts
+
+    started = time.perf_counter()
+    parsed = parse_tickets(tickets)
+    counts["failed"] = len(tickets) - len(parsed)
+
+    # Keep only the last version of a ticket that appears more than once
+    latest = {}
+    for ticket_data in parsed:
+        latest[ticket_data["ticket_id"]] = ticket_data
+
+    try:
+        with db_pool.connection(project_name) as conn:
+            stored = stored_versions(conn, list(latest.keys()))
+
+            changed = []
+            for ticket_id, ticket_data in latest.items():
+                if ticket_id in stored and stored[ticket_id][1] and stored[ticket_id][1] == (ticket_data.get("updated") or ""):
+                    counts["skipped"] += 1
+                else:
+                    changed.append(ticket_data)
+
+            vectors = make_cached_vectors([embedding_text(ticket_data) for ticket_data in changed])
+            valid = [(ticket_data, vector) for ticket_data, vector in zip(changed, vectors) if vector and len(vector) == 384]
+            counts["failed"] += len(changed) - len(valid)
+            if progress:
+                progress(embedded=len(valid))
+
+            if valid:
+                # Changed tickets are replaced in place, keeping their row id
+                ids = [stored[ticket_data["ticket_id"]][0] if ticket_data["ticket_id"] in stored else None
+                       for ticket_data, _ in valid]
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    written, errors = insert_tickets(conn, [t for t, _ in valid], [v for _, v in valid], ids)
+                    conn.commit()
+                except Exception:
+                    conn.rollback()
+                    raise
+                vector_index(conn, project_name)
+                result_cache.bump(project_name)
+                if progress:
+                    progress(written=written)
+                for error in errors:
+                    logging.error(error)
+
+                counts["failed"] += len(valid) - written
+                # New tickets are stored only if they were written; the rest replaced a row
+                after = stored_versions(conn, [t["ticket_id"] for t, _ in valid if t["ticket_id"] not in stored])
+                counts["added"] = len(after)
+                counts["updated"] = written - len(after)
+
+            if watermark is not None:
+                # A ticket is synced once the stored version is the fetched one
+                stored = stored_versions(conn, list(latest.keys()))
+                for ticket_id, ticket_data in latest.items():
+                    if ticket_data.get("updated"):
+                        synced = ticket_id in stored and stored[ticket_id][1] == ticket_data["updated"]
+                        watermark.add(ticket_data["updated"], synced)
+    except Exception as e:
+        msg = f"Err013: Error upserting tickets for project '{project_name}': {e}"
+        logging.error(msg)
+        counts["failed"] = len(tickets) - counts["added"] - counts["updated"] - counts["skipped"]
+        if watermark is not None:
+            for ticket_data in latest.values():
+                if ticket_data.get("updated"):
+                    watermark.add(ticket_data["updated"], False)
+        return counts
+
+    elapsed = time.perf_counter() - started
+    logging.info(f"Upserted tickets of project '{project_name}' in {elapsed:.2f}s: {counts}")
+    return counts
+
+def stored_versions(conn, ticket_ids: list) -> dict:
+    """
+    Look up the stored tickets among ticket_ids.
+
+    Returns:
+        dict: ticket_id -> (row id, 'updated' value) of each stored ticket.
+    """
+    stored = {}
+    # Stay well below SQLite's limit on the number of host parameters
+    for start in range(0, len(ticket_ids), 500):
+        chunk = ticket_ids[start:start + 500]
+        placeholders = ", ".join("?" * len(chunk))
+        for row_id, ticket_id, updated in conn.execute(f"SELECT id, ticket_id, updated FROM jira_tickets WHERE ticket_id IN ({placeholders})", chunk):
+            stored[ticket_id] = (row_id, updated)
+    return stored
+
+def parse_jira_datetime(value: str) -> datetime:
+    """
+    Parse a JIRA timestamp such as '2025-05-03T10:20:30.000+0900' or a plain date.
+    """
+    for fmt in ("%Y-%m-%dT%H:%M:%S.%f%z", "%Y-%m-%dT%H:%M:%S%z", "%Y-%m-%dT%H:%M:%S.%f", "%Y-%m-%d"):
+        try:
+            parsed = datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+        # Timestamps without an offset are taken as UTC so they compare with the others
+        return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+    raise ValueError(f"Unrecognized JIRA timestamp '{value}'")
+
+def get_project_meta(project_name: str, key: str, default: str = None) -> str:
+    """
+    Read a value from the project_meta table of a project database.
+    """
+    with db_pool.connection(project_name) as conn:
+        row = conn.execute("SELECT value FROM project_meta WHERE key = ?", (key,)).fetchone()
+    return row[0] if row else default
+
+def set_project_meta(project_name: str, key: str, value: str):
+    """
+    Write a value to the project_meta table of a project database.
+    """
+    with db_pool.connection(project_name) as conn:
+        conn.execute("INSERT OR REPLACE INTO project_meta (key, value) VALUES (?, ?)", (key, value))
+        conn.commit()
+
+def vector_options(conn) -> dict:
+    """
+    Read how a project stores its vectors.
+
+    Returns:
+        dict: 'type' ('float', 'int8' or 'bit'), 'dims' and the projection 'seed'.
+            Databases created before the options existed store float[384].
+    """
+    meta = dict(conn.execute(
+        "SELECT key, value FROM project_meta WHERE key IN ('vector_type', 'vector_dims', 'vector_seed')").fetchall())
+    return {
+        "type": meta.get("vector_type", "float"),
+        "dims": int(meta.get("vector_dims", FULL_DIMS)),
+        "seed": int(meta.get("vector_seed", 0)),
+    }
+
+def full_vectors(conn, ids: list = None, batch_size: int = 1000):
+    """
+    Read the full float32 vectors of a project, from jira_embeddings for projects with
+    compact vectors and from jira_vectors otherwise.
+
+    Args:
+        ids (list): Row ids to read. All vectors are read if None.
+        batch_size (int): Number of vectors per batch.
+
+    Yields:
+        tuple: (list of row ids, float32 matrix with one vector per row)
+    """
+    options = vector_options(conn)
+    if is_compact(options["type"], options["dims"]):
+        query = "SELECT id, embedding FROM jira_embeddings"
+    else:
+        query = "SELECT rowid, embedding FROM jira_vectors"
+    if ids is None:
+        cursor = conn.execute(query)
+        batches = iter(lambda: cursor.fetchmany(batch_size), [])
+    else:
+        key = "id" if "jira_embeddings" in query else "rowid"
+        batches = (conn.execute(f"{query} WHERE {key} IN ({', '.join('?' * len(chunk))})", chunk).fetchall()
+                   for chunk in (ids[start:start + 500] for start in range(0, len(ids), 500)))
+    for rows in batches:
+        if rows:
+            yield [row_id for row_id, _ in rows], np.frombuffer(b"".join(blob for _, blob in rows), dtype=np.float32).reshape(len(rows), FULL_DIMS)
+
+# Open search backend indexes by project name
+_vector_indexes = {}
+_vector_indexes_lock = threading.Lock()
+
+def set_search_backend(project_name: str, backend: str) -> str:
+    """
+    Select the backend answering a project's vector searches.
+
+    'vec0' searches the sqlite-vec table. 'numpy' compares the prompt with every vector
+    of a memory-mapped matrix stored next to the database, which is kept up to date
+    from the jira_changes log, see NumpyIndex. 'ivf' only compares the vectors of the
+    clusters nearest to the prompt, see IvfIndex and IVF_PROBES.
+
+    Args:
+        project_name (str): The name of the project (database file).
+        backend (str): One of search_backends.SEARCH_BACKENDS.
+
+    Returns:
+        str: Success or error message.
+    """
+    try:
+        check_search_backend(backend)
+    except ValueError as e:
+        msg = str(e)
+        logging.error(msg)
+        return msg
+    try:
+        with db_pool.connection(project_name) as conn:
+            enable_search_backend(conn, project_name, backend)
+    except Exception as e:
+        msg = f"Err024: Error switching project '{project_name}' to the {backend} search backend: {e}"
+        logging.error(msg)
+        return msg
+    result_cache.bump(project_name)
+    msg = f"Succ: Project '{project_name}' uses the {backend} search backend"
+    logging.info(msg)
+    return msg
+
+def enable_search_backend(conn, project_name: str, backend: str):
+    """
+    Record the search backend in project_meta, create or drop the change log, and build
+    the backend's index.
+    """
+    drop_vector_index(project_name)
+    if backend == "vec0":
+        conn.execute("DROP TRIGGER IF EXISTS jira_changes_insert")
+        conn.execute("DROP TRIGGER IF EXISTS jira_changes_delete")
+        conn.execute("DROP TABLE IF EXISTS jira_changes")
+    else:
+        for statement in CHANGES_SQL:
+            conn.execute(statement)
+    conn.execute("INSERT OR REPLACE INTO project_meta (key, value) VALUES ('search_backend', ?)", (backend,))
+    conn.commit()
+    if backend != "vec0":
+        vector_index(conn, project_name, required=True)
+
+def vector_index(conn, project_name: str, required: bool = False):
+    """
+    Return the index of a project's search backend, brought up to date with the
+    database, or None if the project searches vec0.
+
+    An index whose files are missing or damaged is rebuilt from the database. If the
+    index cannot be used the error is logged and None is returned, so that searches fall
+    back to vec0, unless required is True.
+    """
+    row = conn.execute("SELECT value FROM project_meta WHERE key = 'search_backend'").fetchone()
+    if not row or row[0] == "vec0":
+        return None
+    try:
+        with _vector_indexes_lock:
+            index = _vector_indexes.get(project_name)
+            if index is None:
+                index = make_index(row[0], os.path.join(os.getenv("DB_DIR", "databases"), project_name), FULL_DIMS,
+                                   lists=int(os.getenv("IVF_LISTS", 0)),
+                                   probes=int(os.getenv("IVF_PROBES", 8)),
+                                   min_train=int(os.getenv("IVF_MIN_TRAIN", 1000)),
+                                   retrain_factor=float(os.getenv("IVF_RETRAIN_FACTOR", 4)))
+                if not index.load():
+                    rebuild_vector_index(conn, index)
+                _vector_indexes[project_name] = index
+        sync_vector_index(conn, index)
+        return index
+    except Exception as e:
+        if required:
+            raise
+        logging.error(f"Err024: Error updating the {row[0]} index of project '{project_name}', searching vec0 instead: {e}")
+        return None
+
+def rebuild_vector_index(conn, index: NumpyIndex):
+    """
+    Fill an index with all vectors of the project.
+    """
+    started = time.perf_counter()
+    # Changes after this point are applied by the next sync, which is idempotent
+    seq, = conn.execute("SELECT COALESCE(MAX(seq), 0) FROM jira_changes").fetchone()
+    count, = conn.execute("SELECT COUNT(*) FROM jira_tickets").fetchone()
+    with index.lock:
+        index.clear(count)
+        for ids, vectors in full_vectors(conn):
+            index.upsert(ids, vectors)
+        index.maintain()
+        index.save(seq)
+    logging.info(f"Built the vector index at {index.path_prefix} with {len(index)} vectors in {time.perf_counter() - started:.2f}s")
+
+def sync_vector_index(conn, index: NumpyIndex):
+    """
+    Apply the changes logged in jira_changes since the index was last synced, and
+    prune the applied changes from the log.
+    """
+    with index.lock:
+        changes = conn.execute("SELECT seq, id FROM jira_changes WHERE seq > ? ORDER BY seq", (index.seq,)).fetchall()
+        if not changes:
+            return
+        changed = list(dict.fromkeys(row_id for _, row_id in changes))
+        # The current vectors are read, so a ticket deleted and re-inserted keeps its new vector
+        found = set()
+        for ids, vectors in full_vectors(conn, changed):
+            index.upsert(ids, vectors)
+            found.update(ids)
+        index.remove([row_id for row_id in changed if row_id not in found])
+        index.maintain()
+        index.save(changes[-1][0])
+    if not conn.in_transaction:
+        conn.execute("DELETE FROM jira_changes WHERE seq <= ?", (changes[-1][0],))
+        conn.commit()
+
+def drop_vector_index(project_name: str):
+    """
+    Close the search backend index of a project and delete its files.
+    """
+    with _vector_indexes_lock:
+        index = _vector_indexes.pop(project_name, None)
+    if index is not None:
+        index.close()
+    # The ivf files include those of the numpy backend
+    make_index("ivf", os.path.join(os.getenv("DB_DIR", "databases"), project_name)).delete_files()
+
+class SyncWatermark:
+    """
+    The 'updated' value the next incremental sync of a project can start from.
+
+    It is the newest 'updated' value of the tickets a sync stored or found unchanged,
+    but it stays below the 'updated' value of every ticket that failed, so the next
+    sync fetches those tickets again.
+    """
 
-    return count
+    def __init__(self):
+        self.newest = None
+        self.oldest_failed = None
 
+    def add(self, updated: str, synced: bool):
+        """
+        Record the 'updated' value of a ticket that was synced or that failed.
+        """
+        when = parse_jira_datetime(updated)
+        if synced:
+            if self.newest is None or when > self.newest[0]:
+                self.newest = (when, updated)
+        elif self.oldest_failed is None or when < self.oldest_failed:
+            self.oldest_failed = when
+
+    def value(self) -> str:
+        """
+        Returns:
+            str: The watermark as a JIRA timestamp, or None if nothing was synced.
+        """
+        if self.newest is None:
+            return None
+        if self.oldest_failed is not None and self.newest[0] >= self.oldest_failed:
+            below = self.oldest_failed - timedelta(milliseconds=1)
+            return below.strftime("%Y-%m-%dT%H:%M:%S.") + f"{below.microsecond // 1000:03d}" + below.strftime("%z")
+        return self.newest[1]
+
+def advance_sync_watermark(conn, updated: str):
+    """
+    Move the project's 'sync_watermark' forward to updated if it is newer, and commit.
+    """
+    row = conn.execute("SELECT value FROM project_meta WHERE key = 'sync_watermark'").fetchone()
+    if row and row[0] and parse_jira_datetime(row[0]) >= parse_jira_datetime(updated):
+        return
+    conn.execute("INSERT OR REPLACE INTO project_meta (key, value) VALUES ('sync_watermark', ?)", (updated,))
+    conn.commit()
+
+def save_sync_watermark(project_name: str, watermark: SyncWatermark):
+    """
+    Advance the project's sync watermark to the value a sync has reached, if any.
+    """
+    value = watermark.value()
+    if value:
+        with db_pool.connection(project_name) as conn:
+            advance_sync_watermark(conn, value)
+
+def migrate_db(conn):
+    """
+    Bring the schema of an existing project database up to date.
+
+    Databases created before the ticket columns moved out of the vec0 table get the
+    columns copied into an ordinary indexed table and the vectors into jira_vectors,
+    keeping the row ids. Databases without the full-text index get it built, the
+    full_json column is compressed into jira_ticket_json, and duplicate tickets are
+    deleted before ticket_id gets a unique index.
+    """
+    conn.execute("CREATE TABLE IF NOT EXISTS project_meta (key TEXT PRIMARY KEY, value TEXT)")
+    conn.commit()
+
+    row = conn.execute("SELECT sql FROM sqlite_master WHERE name = 'jira_tickets'").fetchone()
+    if row and "vec0" in row[0].lower():
+        started = time.perf_counter()
+        columns = ", ".join(["id"] + TICKET_COLUMNS)
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(TICKETS_TABLE_SQL.format(table="jira_tickets_new"))
+            conn.execute(f"INSERT INTO jira_tickets_new ({columns}) SELECT {columns} FROM jira_tickets")
+            conn.execute(VECTORS_TABLE_SQL)
+            conn.execute("INSERT INTO jira_vectors (rowid, embedding) SELECT id, embedding FROM jira_tickets")
+            move_full_json(conn, "jira_tickets")
+            conn.execute("DROP TABLE jira_tickets")
+            conn.execute("ALTER TABLE jira_tickets_new RENAME TO jira_tickets")
+            create_indexes(conn)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        count, = conn.execute("SELECT COUNT(*) FROM jira_tickets").fetchone()
+        logging.info(f"Migrated {count} tickets to the indexed ticket table in {time.perf_counter() - started:.2f}s")
+
+    # Databases that stored full_json uncompressed in the ticket table
+    if row and "full_json" in [column[1] for column in conn.execute("PRAGMA table_info(jira_tickets)")]:
+        started = time.perf_counter()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            move_full_json(conn, "jira_tickets")
+            conn.execute("ALTER TABLE jira_tickets DROP COLUMN full_json")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        try:
+            # Give the space of the uncompressed JSON back to the file system
+            conn.execute("VACUUM")
+        except sqlite3.Error as e:
+            logging.warning(f"VACUUM after compressing full_json failed: {e}")
+        logging.info(f"Compressed full_json into jira_ticket_json in {time.perf_counter() - started:.2f}s")
+
+    # Databases created before full-text search get the index built from their tickets
+    if row and not conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'jira_fts'").fetchone():
+        started = time.perf_counter()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for statement in FTS_SQL:
+                conn.execute(statement)
+            conn.execute("INSERT INTO jira_fts (jira_fts) VALUES ('rebuild')")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        logging.info(f"Built the full-text index in {time.perf_counter() - started:.2f}s")
+
+    # Databases created before ticket_id was unique keep the newest row of each ticket
+    if row and not conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'idx_jira_tickets_ticket_id_unique'").fetchone():
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            duplicates = [row_id for row_id, in conn.execute(
+                "SELECT id FROM jira_tickets WHERE id NOT IN (SELECT MAX(id) FROM jira_tickets GROUP BY ticket_id)")]
+            delete_tickets(conn, duplicates)
+            conn.execute("DROP INDEX IF EXISTS idx_jira_tickets_ticket_id")
+            conn.execute(UNIQUE_TICKET_ID_SQL)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        if duplicates:
+            logging.info(f"Deleted {len(duplicates)} older duplicate tickets")
 
 def connect_db(project_name: str):
     """
     Connect to the SQLite database for the given project name.
 
+    The connection is opened in WAL mode with the cache_size and mmap_size pragmas
+    taken from DB_CACHE_SIZE and DB_MMAP_SIZE, and keeps up to DB_STATEMENT_CACHE_SIZE
+    prepared statements. It may be used from any thread, but only
+    by one thread at a time. Prefer db_pool.connection(), which reuses connections.
+
     Args:
         project_name (str): The name of the project (database file).
 
@@ -341,15 +1545,31 @@ def connect_db(project_name: str):
         return None
 
     try:
-        conn = sqlite3.connect(db_path)
+        conn = sqlite3.connect(db_path, check_same_thread=False,
+                               timeout=float(os.getenv("DB_BUSY_TIMEOUT", 5)),
+                               cached_statements=int(os.getenv("DB_STATEMENT_CACHE_SIZE", 256)))
         conn.enable_load_extension(True)
         sqlite_vec.load(conn)
         conn.enable_load_extension(False)
+
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA cache_size={int(os.getenv('DB_CACHE_SIZE', -20000))}")
+        conn.execute(f"PRAGMA mmap_size={int(os.getenv('DB_MMAP_SIZE', 268435456))}")
+
+        migrate_db(conn)
         return conn
     except Exception as e:
         msg = f"Err011: Error connecting to database for project '{project_name}': {e}"
         logging.error(msg)
         return None
+
+# Connections kept open per project and shared by all database calls
+db_pool = ConnectionPool(
+    connect_db,
+    max_idle=int(os.getenv("DB_POOL_SIZE", 4)),
+    idle_timeout=float(os.getenv("DB_POOL_IDLE_SECONDS", 300)),
+)
     
 def del_project_db(project_name: str):
     """
@@ -364,8 +1584,17 @@ def del_project_db(project_name: str):
     db_dir = os.getenv("DB_DIR", "databases")
     db_path = os.path.join(db_dir, f"{project_name}.db")
 
+    db_pool.evict(project_name)
+    result_cache.bump(project_name)
+    drop_vector_index(project_name)
+    for key in [key for key in _json_dicts if key[0] == project_name]:
+        del _json_dicts[key]
+
     if os.path.exists(db_path):
         os.remove(db_path)
+        for suffix in ("-wal", "-shm"):
+            if os.path.exists(db_path + suffix):
+                os.remove(db_path + suffix)
         msg = f"Succ: Database for project '{project_name}' deleted at {db_path}"
         logging.info(msg)
         return msg
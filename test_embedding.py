@@ -0,0 +1,122 @@
+import unittest
+import logging
+import importlib.util
+import threading
+import time
+from unittest.mock import patch
+from util import init_logger
+from embedding import QueryBatcher, QueryVectorCache, compare_backends, make_vectors, normalize_query
+
+class TestEmbeddingBackends(unittest.TestCase):
+
+    def test_int8_agrees_with_torch(self):
+        report = compare_backends(backends=["int8"])
+        self.assertNotIn("error", report["int8"])
+        self.assertGreater(report["int8"]["mean_cosine"], 0.95)
+
+    @unittest.skipUnless(importlib.util.find_spec("onnxruntime"), "onnxruntime is not installed")
+    def test_onnx_agrees_with_torch(self):
+        report = compare_backends(backends=["onnx"])
+        self.assertNotIn("error", report["onnx"])
+        self.assertGreater(report["onnx"]["mean_cosine"], 0.999)
+
+    def test_unknown_backend(self):
+        # Fails before the model is loaded
+        with patch("embedding.load_model") as load_model:
+            with self.assertRaises(ValueError):
+                make_vectors(["text"], backend="unknown")
+            load_model.assert_not_called()
+
+class TestQueryVectorCache(unittest.TestCase):
+
+    def test_normalize_query(self):
+        self.assertEqual(normalize_query("  Login   FAILS\n"), "login fails")
+
+    def test_lru_eviction(self):
+        cache = QueryVectorCache(2)
+        cache.put("a", [1.0])
+        cache.put("b", [2.0])
+        self.assertEqual(cache.get("a"), [1.0])
+        cache.put("c", [3.0])
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("c"), [3.0])
+
+        stats = cache.stats()
+        self.assertEqual(stats["size"], 2)
+        self.assertEqual(stats["evictions"], 1)
+        self.assertEqual(stats["hits"], 2)
+        self.assertEqual(stats["misses"], 1)
+
+class TestQueryBatcher(unittest.TestCase):
+
+    def test_concurrent_prompts_share_a_batch(self):
+        calls = []
+
+        def embed(texts):
+            calls.append(list(texts))
+            time.sleep(0.01)
+            return [[float(len(text))] for text in texts]
+
+        batcher = QueryBatcher(embed, window_ms=50, max_batch=8)
+        results = {}
+        texts = ["a", "bb", "ccc", "bb", "dddd", "eeeee"]
+        threads = [threading.Thread(target=lambda i=i, text=text: results.__setitem__(i, batcher.vector(text)))
+                   for i, text in enumerate(texts)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual([results[i] for i in range(len(texts))], [[float(len(text))] for text in texts])
+        # Duplicates are embedded once, and fewer forward passes than prompts are run
+        self.assertLess(len(calls), len(texts))
+        self.assertTrue(all(len(batch) == len(set(batch)) for batch in calls))
+        stats = batcher.stats()
+        self.assertEqual(stats["prompts"], len(texts))
+        self.assertEqual(sum(size * count for size, count in ((int(k), v) for k, v in stats["batch_sizes"].items())), len(texts))
+        self.assertGreater(stats["wait_ms"]["p99"], 0)
+        self.assertEqual(stats["queue_depth"], 0)
+
+    def test_failures_and_disabled_window(self):
+        def fail(texts):
+            raise RuntimeError("model unavailable")
+
+        self.assertEqual(QueryBatcher(fail, window_ms=1, max_batch=4).vector("x"), [])
+        batcher = QueryBatcher(lambda texts: [[1.0] for _ in texts], window_ms=0, max_batch=4)
+        self.assertEqual(batcher.vector("x"), [1.0])
+        self.assertEqual(batcher.stats()["batches"], 0)
+
+    def test_dispatcher_errors_reach_the_callers(self):
+        calls = []
+
+        def embed(texts):
+            calls.append(texts)
+            # The first batch comes back without its vectors
+            return [] if len(calls) == 1 else [[1.0] for _ in texts]
+
+        batcher = QueryBatcher(embed, window_ms=1, max_batch=4)
+        outcome = []
+
+        def search():
+            try:
+                batcher.vector("x")
+            except Exception as e:
+                outcome.append(e)
+
+        caller = threading.Thread(target=search)
+        caller.start()
+        caller.join(5)
+        self.assertFalse(caller.is_alive(), "the caller should not wait forever")
+        self.assertIsInstance(outcome[0], KeyError)
+        # The dispatcher keeps serving later batches
+        self.assertEqual(batcher.vector("y"), [1.0])
+
+if __name__ == "__main__":
+    try:
+        init_logger()  # Initialize the logger
+
+        unittest.main()
+
+    except Exception as e:
+        # Log the error
+        logging.error(f"Test failed: {e}")
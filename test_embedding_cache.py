@@ -0,0 +1,40 @@
+import unittest
+import os
+import tempfile
+import logging
+from embedding_cache import EmbeddingCache
+from util import init_logger
+
+class TestEmbeddingCache(unittest.TestCase):
+
+    def test_cache_flow(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            cache = EmbeddingCache(os.path.join(tmp_dir, "cache.sqlite3"), "model-a")
+
+            vectors = cache.get_many(["first", "second"])
+            self.assertEqual(vectors, [None, None])
+            self.assertEqual(cache.misses, 2)
+
+            cache.put_many(["first"], [[0.5, -1.0, 2.0]])
+            vectors = cache.get_many(["first", "second"])
+            self.assertEqual(vectors[0], [0.5, -1.0, 2.0])
+            self.assertIsNone(vectors[1])
+
+            stats = cache.stats()
+            self.assertEqual(stats["hits"], 1)
+            self.assertEqual(stats["misses"], 3)
+            self.assertEqual(stats["entries"], 1)
+
+            # The same text embedded by another model is a different entry
+            other = EmbeddingCache(os.path.join(tmp_dir, "cache.sqlite3"), "model-b")
+            self.assertEqual(other.get_many(["first"]), [None])
+
+if __name__ == "__main__":
+    try:
+        init_logger()  # Initialize the logger
+
+        unittest.main()
+
+    except Exception as e:
+        # Log the error
+        logging.error(f"Test failed: {e}")
@@ -0,0 +1,63 @@
+import asyncio
+import logging
+import threading
+import time
+import unittest
+from executors import EMBED_WORKERS, executor_stats, run_embed, run_io
+from util import init_logger
+
+class TestExecutors(unittest.TestCase):
+
+    def test_run_io_does_not_block_the_event_loop(self):
+        async def main():
+            ticks = []
+
+            async def ticker():
+                for _ in range(5):
+                    ticks.append(time.perf_counter())
+                    await asyncio.sleep(0.01)
+
+            # The blocking call runs in the IO pool while the ticker keeps running
+            name, _ = await asyncio.gather(run_io(lambda: time.sleep(0.2) or threading.current_thread().name), ticker())
+            return name, ticks
+
+        name, ticks = asyncio.run(main())
+        self.assertTrue(name.startswith("io"))
+        self.assertEqual(len(ticks), 5)
+        self.assertLess(ticks[-1] - ticks[0], 0.15)
+
+    def test_run_embed_is_bounded(self):
+        running = []
+        peak = []
+        lock = threading.Lock()
+
+        def work():
+            with lock:
+                running.append(1)
+                peak.append(len(running))
+            time.sleep(0.05)
+            with lock:
+                running.pop()
+            # Nested calls run in the same worker instead of waiting for a free one
+            return run_embed(lambda: threading.current_thread().name)
+
+        threads = [threading.Thread(target=lambda: results.append(run_embed(work))) for _ in range(EMBED_WORKERS * 3)]
+        results = []
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(results), EMBED_WORKERS * 3)
+        self.assertTrue(all(name.startswith("embed") for name in results))
+        self.assertLessEqual(max(peak), EMBED_WORKERS)
+        self.assertEqual(executor_stats()["embed"]["pending"], 0)
+
+if __name__ == "__main__":
+    try:
+        init_logger()  # Initialize the logger
+
+        unittest.main()
+
+    except Exception as e:
+        # Log the error
+        logging.error(f"Test failed: {e}")
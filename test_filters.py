@@ -0,0 +1,47 @@
+import unittest
+import logging
+from filters import compile_filter
+from util import init_logger
+
+class TestFilters(unittest.TestCase):
+
+    def test_compiles_to_parameters(self):
+        sql, params, fields = compile_filter({"and": [
+            {"field": "status", "op": "in", "value": ["Open", "In Progress"]},
+            {"or": [
+                {"field": "updated", "op": "between", "value": ["2025-05-01", "2025-05-31"]},
+                {"field": "assignee", "op": "is null"},
+            ]},
+        ]})
+        self.assertEqual(sql, "(t.status IN (?, ?) AND (t.updated BETWEEN ? AND ? OR (t.assignee IS NULL OR t.assignee = '')))")
+        self.assertEqual(params, ["Open", "In Progress", "2025-05-01", "2025-05-31"])
+        self.assertEqual(fields, ["assignee", "status", "updated"])
+
+    def test_values_never_reach_the_sql(self):
+        sql, params, _ = compile_filter('[{"field": "summary", "op": "like", "value": "%\' OR 1=1 --"}]')
+        self.assertEqual(sql, "(t.summary LIKE ?)")
+        self.assertEqual(params, ["%' OR 1=1 --"])
+
+    def test_rejects_unknown_fields_and_operators(self):
+        for spec in [
+            {"field": "full_json", "op": "=", "value": "x"},
+            {"field": "status = 'Open' --", "op": "=", "value": "x"},
+            {"field": "status", "op": "; DROP TABLE jira_tickets", "value": "x"},
+            {"field": "status", "op": "in", "value": []},
+            {"field": "status", "op": "between", "value": ["a"]},
+            {"or": []},
+            "not json",
+        ]:
+            with self.assertRaises(ValueError, msg=str(spec)) as raised:
+                compile_filter(spec)
+            self.assertIn("Err017", str(raised.exception))
+
+if __name__ == "__main__":
+    try:
+        init_logger()  # Initialize the logger
+
+        unittest.main()
+
+    except Exception as e:
+        # Log the error
+        logging.error(f"Test failed: {e}")
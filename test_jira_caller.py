@@ -1,9 +1,98 @@
 import unittest
+import jira_caller
 from jira_caller import *  # Import all functions and classes from jira.py
 import logging.handlers  # Import the handlers module to access RotatingFileHandler
 import os
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
 from util import init_logger
 
+class FakeJiraHandler(BaseHTTPRequestHandler):
+    """
+    Minimal JIRA Server REST API: serverInfo, field and a paged search over 5 issues.
+    The first search request of every page is answered with 429 and Retry-After: 0.
+    """
+    issues = [{"id": str(i), "key": f"FAKE-{i}", "fields": {"summary": f"Fake ticket {i}"}} for i in range(1, 6)]
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        server = self.server
+        with server.lock:
+            server.requests.append(url.path)
+        if url.path == "/rest/api/2/serverInfo":
+            self.send_json(200, {"baseUrl": server.base_url, "version": "9.4.0", "versionNumbers": [9, 4, 0],
+                                 "deploymentType": "Server", "serverTitle": "Fake JIRA"})
+        elif url.path == "/rest/api/2/field":
+            self.send_json(200, [{"id": "summary", "name": "Summary", "clauseNames": ["summary"]}])
+        elif url.path == "/rest/api/2/search":
+            params = parse_qs(url.query)
+            start_at = int(params.get("startAt", ["0"])[0])
+            max_results = int(params.get("maxResults", ["50"])[0])
+            with server.lock:
+                throttled = start_at not in server.throttled
+                server.throttled.add(start_at)
+            if throttled:
+                self.send_json(429, {"errorMessages": ["Rate limit exceeded"]}, {"Retry-After": "0"})
+                return
+            self.send_json(200, {"startAt": start_at, "maxResults": max_results, "total": len(self.issues),
+                                 "issues": self.issues[start_at:start_at + max_results]})
+        else:
+            self.send_json(404, {"errorMessages": [f"Unknown path {url.path}"]})
+
+    def send_json(self, status, body, headers=None):
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+class TestJiraClient(unittest.TestCase):
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), FakeJiraHandler)
+        self.server.base_url = f"http://127.0.0.1:{self.server.server_port}"
+        self.server.lock = threading.Lock()
+        self.server.requests = []
+        self.server.throttled = set()
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+        self.saved = (jira_caller.JIRA_SERVER, jira_caller.JIRA_USERNAME, jira_caller.JIRA_API_TOKEN)
+        jira_caller.JIRA_SERVER = self.server.base_url
+        jira_caller.JIRA_USERNAME = "fake"
+        jira_caller.JIRA_API_TOKEN = "fake-token"
+        close_jira_client()
+
+    def tearDown(self):
+        close_jira_client()
+        jira_caller.JIRA_SERVER, jira_caller.JIRA_USERNAME, jira_caller.JIRA_API_TOKEN = self.saved
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_retries_rate_limited_pages(self):
+        pages = list(jql_query_pages("project = FAKE", page_size=2, workers=1))
+        self.assertEqual([len(page) for page in pages], [2, 2, 1])
+        self.assertEqual([issue.key for page in pages for issue in page], [f"FAKE-{i}" for i in range(1, 6)])
+        # Every page was throttled once and then retried
+        self.assertEqual(self.server.requests.count("/rest/api/2/search"), 6)
+
+    def test_parallel_pages_keep_order(self):
+        pages = list(jql_query_pages("project = FAKE", page_size=1, workers=3))
+        self.assertEqual([issue.key for page in pages for issue in page], [f"FAKE-{i}" for i in range(1, 6)])
+
+    def test_client_is_reused(self):
+        jql_query("project = FAKE")
+        jql_query("project = FAKE")
+        self.assertIs(get_jira_client(), get_jira_client())
+        self.assertEqual(self.server.requests.count("/rest/api/2/serverInfo"), 1)
+
 class TestJiraFeatures(unittest.TestCase):
 
     def test_jira_flow(self):
@@ -12,6 +101,13 @@ class TestJiraFeatures(unittest.TestCase):
         self.assertIsInstance(tickets, list)
         self.assertGreater(len(tickets), 0)
         print("JIRA 1 ticket:", tickets[0])
+
+    def test_measure_payload(self):
+        project = os.getenv("JIRA_PROJECT_NAME", "TEST")
+        report = measure_payload(f"project = {project} order by created DESC", sample_size=20)
+        self.assertGreater(report["issues"], 0)
+        self.assertLessEqual(report["projected_bytes"], report["all_fields_bytes"])
+        print("JIRA payload per issue:", report)
        
 if __name__ == "__main__":
     try:
@@ -0,0 +1,90 @@
+import logging
+import threading
+import time
+import unittest
+from jobs import JobManager
+from util import init_logger
+
+class TestJobManager(unittest.TestCase):
+
+    def setUp(self):
+        self.manager = JobManager(max_workers=4, history_size=100)
+
+    def test_one_writer_per_project(self):
+        running = {"A": 0, "B": 0}
+        peak = {"A": 0, "B": 0}
+        overlap = []
+        lock = threading.Lock()
+
+        def work(job):
+            with lock:
+                running[job.project_name] += 1
+                peak[job.project_name] = max(peak[job.project_name], running[job.project_name])
+                if running["A"] and running["B"]:
+                    overlap.append(job.id)
+            time.sleep(0.05)
+            with lock:
+                running[job.project_name] -= 1
+            return "Succ: done"
+
+        jobs = [self.manager.submit("load_tickets", project, work) for project in ("A", "B") * 3]
+        for job in jobs:
+            self.assertTrue(job.wait(5))
+        self.assertEqual(peak, {"A": 1, "B": 1})
+        self.assertTrue(overlap, "jobs of different projects should run in parallel")
+        self.assertTrue(all(job.state == "succeeded" for job in jobs))
+
+    def test_cancel_queued_and_running(self):
+        started = threading.Event()
+        pages = []
+
+        def work(job):
+            started.set()
+            for page in range(100):
+                job.check_cancelled()
+                job.add(fetched=10, written=10)
+                pages.append(page)
+                time.sleep(0.01)
+            return "Succ: done"
+
+        running = self.manager.submit("sync_tickets", "A", work)
+        queued = self.manager.submit("sync_tickets", "A", work)
+        self.assertTrue(started.wait(5))
+        self.assertEqual(queued.state, "queued")
+
+        self.manager.cancel(queued.id)
+        self.assertEqual(queued.state, "cancelled")
+        self.manager.cancel(running.id)
+        self.assertTrue(running.wait(5))
+        self.assertEqual(running.state, "cancelled")
+        self.assertLess(len(pages), 100)
+        self.assertEqual(running.status()["written"], 10 * len(pages))
+
+    def test_failures(self):
+        def broken(job):
+            raise RuntimeError("JIRA is down")
+
+        failed = self.manager.submit("load_tickets", "A", broken)
+        reported = self.manager.submit("load_tickets", "A", lambda job: "Err111: Failed to load tickets")
+        self.assertTrue(reported.wait(5))
+        self.assertEqual(failed.state, "failed")
+        self.assertTrue(failed.message.startswith("Err119"))
+        self.assertEqual(reported.state, "failed")
+        self.assertIsNone(self.manager.cancel("unknown"))
+
+    def test_history_is_trimmed(self):
+        manager = JobManager(max_workers=1, history_size=3)
+        jobs = [manager.submit("load_tickets", "A", lambda job: "Succ: done") for _ in range(6)]
+        jobs[-1].wait(5)
+        self.assertEqual([job.id for job in manager.jobs()], [job.id for job in jobs[-3:]])
+        self.assertEqual(manager.jobs("B"), [])
+
+if __name__ == "__main__":
+    try:
+        init_logger()  # Initialize the logger
+
+        unittest.main()
+
+    except Exception as e:
+        # Log the error
+        logging.error(f"Test failed: {e}")
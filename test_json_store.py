@@ -0,0 +1,35 @@
+import unittest
+import json
+import logging
+from json_store import compress_json, decompress_json, train_dictionary
+from util import init_logger
+
+class TestJsonStore(unittest.TestCase):
+
+    def test_dictionary_round_trip_and_ratio(self):
+        samples = [json.dumps({"ticket_id": f"PRJ-{i}", "summary": f"Ticket {i}", "status": "In Progress",
+                               "priority": "Medium", "assignee": "dev@example.com", "description": "x" * (i % 7)})
+                   for i in range(200)]
+        zdict = train_dictionary(samples)
+        self.assertIn(b'"status": "In Progress"', zdict)
+        self.assertLessEqual(len(zdict), 32768)
+
+        text = samples[42]
+        with_dict = compress_json(text, zdict)
+        without_dict = compress_json(text)
+        self.assertEqual(decompress_json(with_dict, zdict), text)
+        self.assertEqual(decompress_json(without_dict), text)
+        self.assertLess(len(with_dict), len(without_dict))
+
+    def test_nothing_to_train_on(self):
+        self.assertEqual(train_dictionary(['{"a": 1}']), b"")
+
+if __name__ == "__main__":
+    try:
+        init_logger()  # Initialize the logger
+
+        unittest.main()
+
+    except Exception as e:
+        # Log the error
+        logging.error(f"Test failed: {e}")
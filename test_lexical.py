@@ -0,0 +1,36 @@
+import unittest
+import logging
+from lexical import fts_match_query, is_lexical_query, reciprocal_rank_fusion, ticket_keys
+from util import init_logger
+
+class TestLexical(unittest.TestCase):
+
+    def test_is_lexical_query(self):
+        for prompt in ["PRJ-123", "PRJ-1, PRJ-2", "Err004", "ORA-00942", "NullPointerException", "v2.3.1", "SSO", '"connection reset"']:
+            self.assertTrue(is_lexical_query(prompt), prompt)
+        for prompt in ["login", "login fails after password reset", "why is PRJ-1 blocked", "", "login?"]:
+            self.assertFalse(is_lexical_query(prompt), prompt)
+
+    def test_fts_match_query_quotes_terms(self):
+        self.assertEqual(fts_match_query("login timeout"), '"login" OR "timeout"')
+        self.assertEqual(fts_match_query('"connection reset"'), '"connection reset"')
+        self.assertEqual(fts_match_query('a"b NEAR( -'), '"a""b" OR "NEAR("')
+        self.assertEqual(ticket_keys("PRJ-1 and PRJ-2, PRJ-1"), ["PRJ-1", "PRJ-2"])
+
+    def test_reciprocal_rank_fusion(self):
+        vector = [{"ticket_id": "A", "distance": 0.1}, {"ticket_id": "B", "distance": 0.2}]
+        lexical = [{"ticket_id": "B", "distance": None}, {"ticket_id": "C", "distance": None}]
+        fused = reciprocal_rank_fusion([vector, lexical], top_n=2, k=60)
+        self.assertEqual([ticket["ticket_id"] for ticket in fused], ["B", "A"])
+        self.assertEqual(fused[0]["distance"], 0.2)
+        self.assertAlmostEqual(fused[0]["score"], 1 / 62 + 1 / 61)
+
+if __name__ == "__main__":
+    try:
+        init_logger()  # Initialize the logger
+
+        unittest.main()
+
+    except Exception as e:
+        # Log the error
+        logging.error(f"Test failed: {e}")
@@ -0,0 +1,44 @@
+import unittest
+import logging
+import numpy as np
+from quantization import check_vector_options, compact_vector, is_compact, projection_matrix
+from util import init_logger
+
+class TestQuantization(unittest.TestCase):
+
+    def test_compact_vectors(self):
+        vector = np.random.RandomState(0).standard_normal(384).tolist()
+        int8 = np.frombuffer(compact_vector(vector, "int8", 384, 0), dtype=np.int8)
+        self.assertEqual(len(int8), 384)
+        # The int8 range is used, not just a few levels around zero
+        self.assertGreater(np.abs(int8).max(), 64)
+        reduced = np.frombuffer(compact_vector(vector, "float", 96, 7), dtype=np.float32)
+        self.assertEqual(len(reduced), 96)
+        self.assertTrue(np.array_equal(reduced, np.frombuffer(compact_vector(vector, "float", 96, 7), dtype=np.float32)))
+        self.assertTrue(np.array_equal(projection_matrix(96, 7), projection_matrix(96, 7)))
+        self.assertFalse(is_compact("float", 384))
+        self.assertTrue(is_compact("float", 96))
+
+    def test_projection_preserves_distances(self):
+        rng = np.random.RandomState(1)
+        a, b = rng.standard_normal(384), rng.standard_normal(384)
+        full = np.linalg.norm(a - b)
+        reduced = np.linalg.norm(np.frombuffer(compact_vector(a, "float", 192, 3), dtype=np.float32)
+                                 - np.frombuffer(compact_vector(b, "float", 192, 3), dtype=np.float32))
+        self.assertAlmostEqual(reduced / full, 1.0, delta=0.25)
+
+    def test_invalid_options(self):
+        for vector_type, dims in [("float16", 384), ("int8", 512), ("bit", 100), ("float", 0)]:
+            with self.assertRaises(ValueError) as raised:
+                check_vector_options(vector_type, dims)
+            self.assertIn("Err022", str(raised.exception))
+
+if __name__ == "__main__":
+    try:
+        init_logger()  # Initialize the logger
+
+        unittest.main()
+
+    except Exception as e:
+        # Log the error
+        logging.error(f"Test failed: {e}")
@@ -0,0 +1,37 @@
+import unittest
+import logging
+from result_cache import SearchResultCache
+from util import init_logger
+
+class TestSearchResultCache(unittest.TestCase):
+
+    def test_write_generation_invalidates(self):
+        cache = SearchResultCache(10)
+        key = ("login", "", 5)
+        cache.put("PRJ", key, "[1]", cache.generation("PRJ"))
+        self.assertEqual(cache.get("PRJ", key), "[1]")
+
+        # A write to another project does not invalidate
+        cache.bump("OTHER")
+        self.assertEqual(cache.get("PRJ", key), "[1]")
+
+        cache.bump("PRJ")
+        self.assertIsNone(cache.get("PRJ", key))
+        self.assertEqual(cache.stats()["invalidations"], 1)
+
+    def test_result_computed_before_write_is_not_stored(self):
+        cache = SearchResultCache(10)
+        generation = cache.generation("PRJ")
+        cache.bump("PRJ")
+        cache.put("PRJ", "key", "[stale]", generation)
+        self.assertIsNone(cache.get("PRJ", "key"))
+
+if __name__ == "__main__":
+    try:
+        init_logger()  # Initialize the logger
+
+        unittest.main()
+
+    except Exception as e:
+        # Log the error
+        logging.error(f"Test failed: {e}")
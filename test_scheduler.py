@@ -0,0 +1,86 @@
+import logging
+import os
+import tempfile
+import threading
+import time
+import unittest
+from jobs import JobManager
+from scheduler import SyncScheduler
+from util import init_logger
+
+class TestSyncScheduler(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, "sync_schedule.json")
+        self.manager = JobManager(max_workers=4)
+        self.release = threading.Event()
+        self.synced = []
+
+        def sync(job, jql):
+            self.synced.append((job.project_name, jql))
+            job.add(fetched=3, added=2, skipped=1)
+            self.release.wait(5)
+            return "Succ: synced"
+
+        self.submit = lambda project_name, jql: self.manager.submit("scheduled_sync", project_name, lambda job: sync(job, jql))
+
+    def tearDown(self):
+        self.release.set()
+        self.tmp_dir.cleanup()
+
+    def wait_idle(self):
+        for job in self.manager.jobs():
+            job.wait(5)
+
+    def test_concurrency_cap_and_stats(self):
+        scheduler = SyncScheduler(self.submit, self.path, max_concurrent=2, jitter=0)
+        for project_name in ("A", "B", "C"):
+            scheduler.register(project_name, f"project = {project_name}", interval_minutes=60)
+
+        now = time.time()
+        self.assertEqual(len(scheduler.run_due(now)), 2)
+        # Running syncs count against the cap until they finish
+        self.assertEqual(scheduler.run_due(now), [])
+        self.release.set()
+        self.wait_idle()
+        self.assertEqual(len(scheduler.run_due(now)), 1)
+        self.wait_idle()
+
+        status = scheduler.status()
+        self.assertEqual(sorted(self.synced), [("A", "project = A"), ("B", "project = B"), ("C", "project = C")])
+        for entry in status.values():
+            self.assertEqual((entry["fetched"], entry["added"], entry["skipped"]), (3, 2, 1))
+            self.assertEqual(entry["last_state"], "succeeded")
+            self.assertEqual(entry["syncs"], 1)
+            self.assertIsNone(entry["running_job"])
+            self.assertAlmostEqual(entry["next_due"], now + 3600, delta=1)
+
+    def test_registry_survives_restart(self):
+        scheduler = SyncScheduler(self.submit, self.path, jitter=0.5)
+        entry = scheduler.register("A", interval_minutes=10)
+        self.assertLessEqual(entry["next_due"], time.time() + 300)
+        with self.assertRaises(ValueError):
+            scheduler.register("B", interval_minutes=0.1)
+
+        reloaded = SyncScheduler(self.submit, self.path)
+        self.assertEqual(list(reloaded.status()), ["A"])
+        self.assertTrue(reloaded.unregister("A"))
+        self.assertFalse(reloaded.unregister("A"))
+        self.assertEqual(SyncScheduler(self.submit, self.path).status(), {})
+
+    def test_jitter_spreads_due_times(self):
+        scheduler = SyncScheduler(self.submit, self.path, jitter=0.2)
+        intervals = [scheduler._interval({"interval_minutes": 60}) for _ in range(100)]
+        self.assertTrue(all(2880 <= interval <= 4320 for interval in intervals))
+        self.assertGreater(max(intervals) - min(intervals), 60)
+
+if __name__ == "__main__":
+    try:
+        init_logger()  # Initialize the logger
+
+        unittest.main()
+
+    except Exception as e:
+        # Log the error
+        logging.error(f"Test failed: {e}")
@@ -0,0 +1,149 @@
+import unittest
+import logging
+import os
+import tempfile
+import threading
+import numpy as np
+from unittest.mock import patch
+from search_backends import IvfIndex, NumpyIndex, check_search_backend
+from util import init_logger
+
+class TestNumpyIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.prefix = os.path.join(self.tmp.name, "PRJ")
+        rng = np.random.RandomState(0)
+        self.vectors = rng.standard_normal((300, 16)).astype(np.float32)
+        self.queries = rng.standard_normal((4, 16)).astype(np.float32)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def exact(self, query, ids):
+        return sorted(ids, key=lambda row_id: np.linalg.norm(self.vectors[row_id - 1] - query))
+
+    def test_search_matches_exact_distances(self):
+        index = NumpyIndex(self.prefix, 16)
+        index.clear()
+        index.upsert(list(range(1, 301)), self.vectors)
+        results = index.search(self.queries, 5)
+        self.assertEqual(len(results), 4)
+        for query, hits in zip(self.queries, results):
+            self.assertEqual([row_id for row_id, _ in hits], self.exact(query, range(1, 301))[:5])
+            self.assertAlmostEqual(hits[0][1], float(np.linalg.norm(self.vectors[hits[0][0] - 1] - query)), places=4)
+
+        hits, = index.search(self.queries[:1], 3, allowed_ids=[2, 4, 6, 8, 999])
+        self.assertEqual([row_id for row_id, _ in hits], self.exact(self.queries[0], [2, 4, 6, 8])[:3])
+
+    def test_updates_survive_reload(self):
+        index = NumpyIndex(self.prefix, 16)
+        index.clear(8)
+        # Grows past the initial capacity
+        index.upsert(list(range(1, 2001)), np.resize(self.vectors, (2000, 16)))
+        nearest = index.search(self.queries[:1], 1)[0][0][0]
+        index.remove([nearest])
+        index.upsert([5], self.queries[:1])
+        index.save(42)
+
+        reloaded = NumpyIndex(self.prefix, 16)
+        self.assertTrue(reloaded.load())
+        self.assertEqual(reloaded.seq, 42)
+        self.assertEqual(len(reloaded), 1999)
+        hits, = reloaded.search(self.queries[:1], 2)
+        self.assertEqual(hits[0][0], 5)
+        self.assertAlmostEqual(hits[0][1], 0.0, places=3)
+        self.assertNotIn(nearest, [row_id for row_id, _ in hits])
+
+        # The slot of a deleted vector is reused
+        reloaded.upsert([3000], self.vectors[:1])
+        self.assertEqual(len(reloaded), 2000)
+
+        reloaded.delete_files()
+        self.assertFalse(NumpyIndex(self.prefix, 16).load())
+
+    def test_ivf_recall_and_updates(self):
+        rng = np.random.RandomState(1)
+        centers = rng.standard_normal((20, 16)).astype(np.float32) * 4
+        self.vectors = (centers[rng.randint(0, 20, 3000)] + rng.standard_normal((3000, 16))).astype(np.float32)
+        queries = (centers[:10] + rng.standard_normal((10, 16))).astype(np.float32)
+        index = IvfIndex(self.prefix, 16, lists=20, probes=4, min_train=1000)
+        index.clear()
+        index.upsert(list(range(1, 3001)), self.vectors)
+        index.maintain()
+        index.wait_training()
+        self.assertEqual(index.clusters, 20)
+        index.save(1)
+
+        hits = 0
+        for query, results in zip(queries, index.search(queries, 10)):
+            hits += len(set(self.exact(query, range(1, 3001))[:10]) & {row_id for row_id, _ in results})
+        self.assertGreaterEqual(hits / 100, 0.9)
+        # Searching every cluster is exact
+        index.probes = 20
+        self.assertEqual([row_id for row_id, _ in index.search(queries[:1], 10)[0]], self.exact(queries[0], range(1, 3001))[:10])
+
+        # New vectors join their nearest cluster, deleted ones are not returned
+        index.upsert([5000], queries[:1])
+        index.remove([1])
+        self.assertEqual(index.search(queries[:1], 1)[0][0][0], 5000)
+        index.save(2)
+
+        reloaded = IvfIndex(self.prefix, 16, probes=20)
+        self.assertTrue(reloaded.load())
+        self.assertEqual(reloaded.search(queries[:1], 1)[0][0][0], 5000)
+        self.assertNotIn(1, [row_id for row_id, _ in reloaded.search(self.vectors[:1], 5)[0]])
+        reloaded.delete_files()
+
+    def test_ivf_trains_in_the_background(self):
+        rng = np.random.RandomState(2)
+        index = IvfIndex(self.prefix, 16, lists=10, probes=10, min_train=100)
+        index.clear()
+        index.upsert(list(range(1, 501)), rng.standard_normal((500, 16)).astype(np.float32))
+        index.save(1)
+
+        started = threading.Event()
+        release = threading.Event()
+        assign = index._assign
+
+        def slow_assign(vectors, centroids=None):
+            # Hold k-means until the searches and updates below are done
+            if centroids is not None:
+                started.set()
+                release.wait(5)
+            return assign(vectors, centroids)
+
+        with patch.object(index, "_assign", side_effect=slow_assign):
+            index.maintain()
+            self.assertTrue(started.wait(5))
+            self.assertTrue(index.training)
+            # Searches are served exactly and updates go on while k-means runs
+            query = rng.standard_normal((1, 16)).astype(np.float32)
+            index.upsert([600], query)
+            self.assertEqual(index.search(query, 1)[0][0][0], 600)
+            self.assertEqual(index.clusters, 0)
+            release.set()
+            index.wait_training(5)
+
+        self.assertEqual(index.clusters, 10)
+        # The vector written during training joined its nearest new cluster
+        self.assertEqual(index.search(query, 1)[0][0][0], 600)
+        reloaded = IvfIndex(self.prefix, 16, probes=10)
+        self.assertTrue(reloaded.load())
+        self.assertEqual(reloaded.clusters, 10)
+
+    def test_unknown_backend(self):
+        check_search_backend("numpy")
+        with self.assertRaises(ValueError) as e:
+            check_search_backend("faiss")
+        self.assertIn("Err023", str(e.exception))
+
+if __name__ == "__main__":
+    try:
+        init_logger()  # Initialize the logger
+
+        unittest.main()
+
+    except Exception as e:
+        # Log the error
+        logging.error(f"Test failed: {e}")
@@ -1,13 +1,20 @@
+import asyncio
+import subprocess
+import sys
+import tempfile
 import unittest
 from server import *
 import os
+from unittest.mock import patch
+from scheduler import SyncScheduler
+from sqlite import del_project_db
 from util import init_logger
 
 class TestServerFeatures(unittest.TestCase):
 
     def test_init_project(self):
         project = os.getenv("JIRA_PROJECT_NAME", "TEST")
-        result = init_project(project)
+        result = asyncio.run(init_project(project))
 
         if result.startswith("Err"):
             logging.error(f"Error initializing project: {result}")
@@ -17,6 +24,43 @@ class TestServerFeatures(unittest.TestCase):
         db_dir = os.getenv("DB_DIR", "databases")
         db_path = os.path.join(db_dir, f"{project}.db")
         self.assertTrue(os.path.exists(db_path), f"Database for project {project} was not created.")
+
+    def test_watermark_waits_for_the_whole_stream(self):
+        project = "test_stream_project"
+        self.assertIn("Succ", init_project_db(project))
+        # The newest ticket comes first, as in a query not ordered by 'updated'
+        pages = [
+            ['{"ticket_id": "ST-2", "summary": "Newest", "description": "Newest ticket.", "updated": "2025-05-02T10:00:00.000+0000"}'],
+            ['{"ticket_id": "ST-1", "summary": "Oldest", "description": "Oldest ticket.", "updated": "2025-05-01T10:00:00.000+0000"}'],
+        ]
+
+        def broken_pages(jql):
+            yield pages[0]
+            raise RuntimeError("JIRA is down")
+
+        try:
+            with patch("server.jql_query_pages", side_effect=broken_pages):
+                with self.assertRaises(RuntimeError):
+                    ingest_jql(project, "project = ST", advance_watermark=True)
+            self.assertIsNone(get_project_meta(project, "sync_watermark"))
+
+            with patch("server.jql_query_pages", return_value=iter(pages)):
+                counts = ingest_jql(project, "project = ST", advance_watermark=True)
+            self.assertEqual(counts["fetched"], 2)
+            self.assertEqual(get_project_meta(project, "sync_watermark"), "2025-05-02T10:00:00.000+0000")
+        finally:
+            del_project_db(project)
+
+    def test_import_starts_the_sync_scheduler(self):
+        # Hosts such as `mcp dev server.py` import the module without running __main__
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "sync_schedule.json")
+            SyncScheduler(lambda project_name, jql: None, path).register("REG", "project = REG", interval_minutes=60)
+            env = dict(os.environ, SYNC_SCHEDULE_PATH=path, EMBED_WARMUP="lazy")
+            code = "import server; print(server.sync_scheduler._thread.is_alive(), list(server.sync_scheduler.status()))"
+            result = subprocess.run([sys.executable, "-c", code], env=env, cwd=os.path.dirname(os.path.abspath(__file__)),
+                                    capture_output=True, text=True, timeout=120)
+            self.assertEqual(result.stdout.strip().splitlines()[-1], "True ['REG']", result.stderr)
        
 if __name__ == "__main__":
     try:
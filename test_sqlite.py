@@ -1,11 +1,14 @@
 import unittest
 import os
 from util import init_logger
-from sqlite import init_project_db, add_ticket, search_tickets, del_project_db, get_tickets_count
+from sqlite import init_project_db, add_ticket, search_tickets, del_project_db, get_tickets_count, make_vectors, parse_ticket, insert_tickets, connect_db, db_pool, upsert_tickets, get_project_meta, search_plan, lookup_tickets, vector_search, delete_tickets, search_tickets_batch, set_search_backend, vector_index, SyncWatermark, save_sync_watermark, append_tickets
+from embedding import make_vector
 import sqlite3
 import sqlite_vec
 import json
 import logging
+import numpy as np
+from unittest.mock import patch
 class TestSQLiteFeatures(unittest.TestCase):
 
     def test_db_flow(self):
@@ -86,7 +89,440 @@ class TestSQLiteFeatures(unittest.TestCase):
         # delete the project database
         result = del_project_db(project_name)
         self.assertIn("Succ", result)
+
+    def test_make_vectors_matches_make_vector(self):
+        texts = ["short", "a much longer ticket description with many more tokens in it", "medium length text"]
+        vectors = make_vectors(texts, batch_size=2)
+        self.assertEqual(len(vectors), len(texts))
+        for text, vector in zip(texts, vectors):
+            single = make_vector(text)
+            self.assertEqual(len(vector), 384)
+            for a, b in zip(single, vector):
+                self.assertAlmostEqual(a, b, places=4)
+
+    def test_insert_tickets_reports_row_errors(self):
+        project_name = "test_bulk_project"
+        result = init_project_db(project_name)
+        self.assertIn("Succ", result)
+        try:
+            tickets = [
+                parse_ticket('{"ticket_id": "BULK-1", "summary": "First", "description": "First bulk ticket."}'),
+                parse_ticket('{"ticket_id": "BULK-2", "summary": "Second", "description": "Broken vector."}'),
+                parse_ticket('{"ticket_id": "BULK-3", "summary": "Third", "description": "Third bulk ticket."}'),
+            ]
+            vectors = make_vectors(["First", "Second", "Third"])
+            vectors[1] = [0.0] * 10
+
+            conn = connect_db(project_name)
+            written, errors = insert_tickets(conn, tickets, vectors)
+            conn.close()
+
+            self.assertEqual(written, 2)
+            self.assertEqual(len(errors), 1)
+            self.assertIn("Err006", errors[0])
+            self.assertIn("BULK-2", errors[0])
+            self.assertEqual(get_tickets_count(project_name), 2)
+        finally:
+            del_project_db(project_name)
         
+    def test_upsert_tickets_skips_unchanged(self):
+        project_name = "test_upsert_project"
+        result = init_project_db(project_name)
+        self.assertIn("Succ", result)
+        try:
+            ticket1 = '{"ticket_id": "UP-1", "summary": "First", "description": "First ticket.", "updated": "2025-05-01T10:00:00.000+0000"}'
+            ticket2 = '{"ticket_id": "UP-2", "summary": "Second", "description": "Second ticket.", "updated": "2025-05-02T10:00:00.000+0000"}'
+            counts = upsert_tickets(project_name, [ticket1, ticket2])
+            self.assertEqual(counts["added"], 2)
+            # Only syncs move the watermark
+            self.assertIsNone(get_project_meta(project_name, "sync_watermark"))
+
+            ticket2_changed = '{"ticket_id": "UP-2", "summary": "Second", "description": "Second ticket, changed.", "updated": "2025-05-03T10:00:00.000+0000"}'
+            watermark = SyncWatermark()
+            counts = upsert_tickets(project_name, [ticket1, ticket2_changed], watermark=watermark)
+            self.assertEqual(counts["skipped"], 1)
+            self.assertEqual(counts["updated"], 1)
+            self.assertEqual(counts["added"], 0)
+            self.assertEqual(get_tickets_count(project_name), 2)
+            save_sync_watermark(project_name, watermark)
+            self.assertEqual(get_project_meta(project_name, "sync_watermark"), "2025-05-03T10:00:00.000+0000")
+        finally:
+            del_project_db(project_name)
+
+    def test_watermark_stays_below_failed_tickets(self):
+        project_name = "test_watermark_project"
+        result = init_project_db(project_name)
+        self.assertIn("Succ", result)
+        try:
+            tickets = [
+                '{"ticket_id": "WM-1", "summary": "First", "description": "First ticket.", "updated": "2025-05-01T10:00:00.000+0000"}',
+                '{"ticket_id": "WM-2", "summary": "Second", "description": "Fails to embed.", "updated": "2025-05-02T10:00:00.000+0000"}',
+                '{"ticket_id": "WM-3", "summary": "Third", "description": "Third ticket.", "updated": "2025-05-03T10:00:00.000+0000"}',
+            ]
+
+            def embed(texts):
+                return [[] if "Fails to embed" in text else [0.1] * 384 for text in texts]
+
+            watermark = SyncWatermark()
+            with patch("sqlite.make_cached_vectors", side_effect=embed):
+                counts = upsert_tickets(project_name, tickets, watermark=watermark)
+            self.assertEqual((counts["added"], counts["failed"]), (2, 1))
+            save_sync_watermark(project_name, watermark)
+            stored = get_project_meta(project_name, "sync_watermark")
+            self.assertGreater(stored, "2025-05-01T10:00:00.000+0000")
+            self.assertLess(stored, "2025-05-02T10:00:00.000+0000")
+
+            # Once the failed ticket is stored the watermark moves on
+            watermark = SyncWatermark()
+            upsert_tickets(project_name, tickets, watermark=watermark)
+            save_sync_watermark(project_name, watermark)
+            self.assertEqual(get_project_meta(project_name, "sync_watermark"), "2025-05-03T10:00:00.000+0000")
+        finally:
+            del_project_db(project_name)
+
+    def test_failed_replace_keeps_the_old_row(self):
+        project_name = "test_replace_project"
+        result = init_project_db(project_name)
+        self.assertIn("Succ", result)
+        try:
+            upsert_tickets(project_name, [
+                '{"ticket_id": "RE-1", "summary": "First", "description": "First ticket.", "updated": "2025-05-01T10:00:00.000+0000"}',
+                '{"ticket_id": "RE-2", "summary": "Second", "description": "Second ticket.", "updated": "2025-05-01T10:00:00.000+0000"}',
+            ])
+            with db_pool.connection(project_name) as conn:
+                conn.execute("CREATE TRIGGER reject BEFORE INSERT ON jira_tickets WHEN NEW.summary = 'Broken' BEGIN SELECT RAISE(ABORT, 'rejected'); END")
+                conn.commit()
+
+            counts = upsert_tickets(project_name, [
+                '{"ticket_id": "RE-1", "summary": "First", "description": "First ticket, changed.", "updated": "2025-05-02T10:00:00.000+0000"}',
+                '{"ticket_id": "RE-2", "summary": "Broken", "description": "Fails to insert.", "updated": "2025-05-02T10:00:00.000+0000"}',
+            ])
+            self.assertEqual((counts["updated"], counts["failed"]), (1, 1))
+            self.assertEqual(get_tickets_count(project_name), 2)
+            with db_pool.connection(project_name) as conn:
+                rows = dict(conn.execute("SELECT ticket_id, summary FROM jira_tickets"))
+                self.assertEqual(rows, {"RE-1": "First", "RE-2": "Second"})
+                vectors, = conn.execute("SELECT COUNT(*) FROM jira_vectors").fetchone()
+                self.assertEqual(vectors, 2)
+
+                # Inside the caller's transaction nothing is committed
+                conn.execute("BEGIN IMMEDIATE")
+                ticket = parse_ticket('{"ticket_id": "RE-3", "summary": "Third"}')
+                self.assertEqual(insert_tickets(conn, [ticket], make_vectors(["Third"])), (1, []))
+                self.assertTrue(conn.in_transaction)
+                conn.rollback()
+            self.assertEqual(get_tickets_count(project_name), 2)
+        finally:
+            del_project_db(project_name)
+
+    def test_connection_pool_reuses_connections(self):
+        project_name = "test_pool_project"
+        result = init_project_db(project_name)
+        self.assertIn("Succ", result)
+        try:
+            with db_pool.connection(project_name) as conn:
+                first = conn
+                journal_mode, = conn.execute("PRAGMA journal_mode").fetchone()
+                self.assertEqual(journal_mode.lower(), "wal")
+            with db_pool.connection(project_name) as conn:
+                self.assertIs(conn, first)
+        finally:
+            del_project_db(project_name)
+
+        with self.assertRaises(RuntimeError):
+            with db_pool.connection(project_name):
+                pass
+
+    def test_search_with_filters(self):
+        project_name = "test_filter_project"
+        result = init_project_db(project_name)
+        self.assertIn("Succ", result)
+        try:
+            tickets = [
+                '{"ticket_id": "FLT-1", "summary": "Login fails", "description": "Open bug.", "status": "Open", "updated": "2025-05-01T10:00:00.000+0000"}',
+                '{"ticket_id": "FLT-2", "summary": "Login slow", "description": "Done bug.", "status": "Done", "updated": "2025-05-10T10:00:00.000+0000"}',
+                '{"ticket_id": "FLT-3", "summary": "Logout", "description": "Open task.", "status": "Open", "updated": "2025-06-01T10:00:00.000+0000"}',
+            ]
+            upsert_tickets(project_name, tickets)
+
+            filters = {"and": [{"field": "status", "op": "=", "value": "Open"},
+                               {"field": "updated", "op": "<", "value": "2025-05-31"}]}
+            results = json.loads(search_tickets(project_name, "login", filters=filters))
+            self.assertEqual([r["ticket_id"] for r in results], ["FLT-1"])
+            results = json.loads(search_tickets(project_name, "", filters='{"field": "status", "op": "in", "value": ["Open"]}'))
+            self.assertEqual([r["ticket_id"] for r in results], ["FLT-1", "FLT-3"])
+            self.assertIn("Err017", search_tickets(project_name, "login", filters={"field": "nope", "value": 1}))
+            self.assertIn("Err026", search_tickets(project_name, "login", top_n=-1))
+            self.assertIn("Err026", search_tickets_batch(project_name, ["login"], top_n=-1))
+            self.assertEqual(json.loads(search_tickets(project_name, "login", top_n=0)), [])
+
+            # Raw conditions may only read the ticket tables
+            results = search_tickets(project_name, "", "status = 'Open' AND (SELECT COUNT(*) FROM project_meta) >= 0")
+            self.assertEqual(results, [])
+
+            plan = search_plan(project_name, "login", filters={"field": "summary", "op": "like", "value": "Login%"})
+            self.assertEqual(plan["unindexed_fields"], ["summary"])
+            self.assertTrue(plan["table_scans"])
+            plan = search_plan(project_name, "login", filters={"field": "status", "op": "=", "value": "Open"})
+            self.assertEqual(plan["unindexed_fields"], [])
+            self.assertEqual(plan["table_scans"], [])
+        finally:
+            del_project_db(project_name)
+
+    def test_lexical_and_hybrid_search(self):
+        project_name = "test_hybrid_project"
+        result = init_project_db(project_name)
+        self.assertIn("Succ", result)
+        try:
+            tickets = [
+                '{"ticket_id": "HYB-1", "summary": "Login fails", "description": "Error ORA-00942 on login.", "status": "Open"}',
+                '{"ticket_id": "HYB-2", "summary": "Slow dashboard", "description": "Charts take a minute.", "status": "Open"}',
+                '{"ticket_id": "HYB-3", "summary": "Export", "description": "CSV export is empty.", "status": "Done"}',
+            ]
+            upsert_tickets(project_name, tickets)
+
+            results = json.loads(search_tickets(project_name, "HYB-3", mode="lexical"))
+            self.assertEqual(results[0]["ticket_id"], "HYB-3")
+            results = json.loads(search_tickets(project_name, "ORA-00942", mode="hybrid"))
+            self.assertEqual([r["ticket_id"] for r in results], ["HYB-1"])
+            results = json.loads(search_tickets(project_name, "dashboard charts", mode="hybrid", top_n=3,
+                                                filters={"field": "status", "op": "=", "value": "Open"}))
+            self.assertEqual(results[0]["ticket_id"], "HYB-2")
+            self.assertEqual({r["ticket_id"] for r in results}, {"HYB-1", "HYB-2"})
+            self.assertIn("Err019", search_tickets(project_name, "login", mode="fuzzy"))
+
+            # Raw conditions work in every mode, also on columns of the full-text index
+            for mode in ("lexical", "hybrid"):
+                results = json.loads(search_tickets(project_name, "login dashboard", conditions="status = 'Open'", mode=mode, top_n=3))
+                self.assertEqual({r["ticket_id"] for r in results}, {"HYB-1", "HYB-2"})
+                results = json.loads(search_tickets(project_name, "login dashboard", conditions="summary LIKE 'Slow%'", mode=mode, top_n=3))
+                self.assertEqual([r["ticket_id"] for r in results], ["HYB-2"])
+
+            # The full-text index follows replaced tickets
+            upsert_tickets(project_name, ['{"ticket_id": "HYB-3", "summary": "Export", "description": "PDF export is empty.", "status": "Done", "updated": "2025-06-01T10:00:00.000+0000"}'])
+            self.assertEqual(json.loads(search_tickets(project_name, "csv", mode="lexical")), [])
+            results = json.loads(search_tickets(project_name, "pdf", mode="lexical"))
+            self.assertEqual([r["ticket_id"] for r in results], ["HYB-3"])
+        finally:
+            del_project_db(project_name)
+
+    def test_lookup_and_field_projection(self):
+        project_name = "test_lookup_project"
+        result = init_project_db(project_name)
+        self.assertIn("Succ", result)
+        try:
+            upsert_tickets(project_name, [
+                '{"ticket_id": "KEY-1", "summary": "First", "description": "First ticket.", "status": "Open"}',
+                '{"ticket_id": "KEY-2", "summary": "Second", "description": "Second ticket.", "status": "Done"}',
+            ])
+            tickets = json.loads(lookup_tickets(project_name, ["KEY-2", "KEY-9", "KEY-1"], "status"))
+            self.assertEqual(tickets, [{"ticket_id": "KEY-2", "status": "Done"}, {"ticket_id": "KEY-1", "status": "Open"}])
+            self.assertEqual(len(json.loads(lookup_tickets(project_name, ["KEY-1"]))[0]), 11)
+            self.assertIn("Err020", lookup_tickets(project_name, ["KEY-1"], "status,embedding"))
+
+            results = json.loads(search_tickets(project_name, "first", fields=["summary", "distance"]))
+            self.assertEqual(set(results[0].keys()), {"ticket_id", "summary", "distance"})
+            results = json.loads(search_tickets(project_name, "KEY-1", mode="hybrid", fields="summary"))
+            self.assertEqual(results, [{"ticket_id": "KEY-1", "summary": "First"}])
+        finally:
+            del_project_db(project_name)
+
+    def test_legacy_vec0_table_is_migrated(self):
+        project_name = "test_migrate_project"
+        db_dir = os.getenv("DB_DIR", "databases")
+        os.makedirs(db_dir, exist_ok=True)
+        db_path = os.path.join(db_dir, f"{project_name}.db")
+
+        # Schema used before the ticket columns moved out of the vec0 table
+        conn = sqlite3.connect(db_path)
+        conn.enable_load_extension(True)
+        sqlite_vec.load(conn)
+        conn.execute('''
+            CREATE VIRTUAL TABLE jira_tickets USING vec0(
+            id INTEGER PRIMARY KEY, ticket_id TEXT, summary TEXT, description TEXT, status TEXT, priority TEXT,
+            assignee TEXT, reporter TEXT, created TEXT, updated TEXT, original_estimate_seconds INT,
+            due_date TEXT, full_json TEXT, embedding float[384])
+        ''')
+        # OLD-1 was stored twice before ticket_id was unique
+        vectors = make_vectors(["legacy one", "legacy two", "legacy one again"])
+        for row_id, (ticket_id, status, vector) in enumerate(zip(["OLD-1", "OLD-2", "OLD-1"], ["Open", "Done", "Open"], vectors), start=1):
+            conn.execute(
+                "INSERT INTO jira_tickets (id, ticket_id, summary, description, status, priority, assignee, reporter, "
+                "created, updated, original_estimate_seconds, due_date, full_json, embedding) "
+                "VALUES (?, ?, ?, '', ?, '', '', '', '', '', 0, '', '{}', ?)",
+                (row_id, ticket_id, f"Legacy {ticket_id}", status, sqlite_vec.serialize_float32(vector)))
+        conn.commit()
+        conn.close()
+
+        try:
+            self.assertEqual(get_tickets_count(project_name), 2)
+            with db_pool.connection(project_name) as conn:
+                sql, = conn.execute("SELECT sql FROM sqlite_master WHERE name = 'jira_tickets'").fetchone()
+                self.assertNotIn("vec0", sql)
+                vector_count, = conn.execute("SELECT COUNT(*) FROM jira_vectors").fetchone()
+                self.assertEqual(vector_count, 2)
+                fts_count, = conn.execute("SELECT COUNT(*) FROM jira_fts WHERE jira_fts MATCH 'legacy'").fetchone()
+                self.assertEqual(fts_count, 2)
+                # The newest row of the duplicate ticket is kept
+                row_id, = conn.execute("SELECT id FROM jira_tickets WHERE ticket_id = 'OLD-1'").fetchone()
+                self.assertEqual(row_id, 3)
+                with self.assertRaises(sqlite3.IntegrityError):
+                    conn.execute("INSERT INTO jira_tickets (ticket_id, summary) VALUES ('OLD-2', 'Copy')")
+                conn.rollback()
+            # Adding a stored ticket again replaces it
+            self.assertIn("Succ", add_ticket(project_name, '{"ticket_id": "OLD-2", "summary": "Legacy OLD-2 again", "status": "Done"}'))
+            self.assertEqual(append_tickets(project_name, ['{"ticket_id": "OLD-2", "summary": "Legacy OLD-2", "status": "Done"}']), 1)
+            self.assertEqual(get_tickets_count(project_name), 2)
+            tickets = json.loads(lookup_tickets(project_name, ["OLD-1"], "full_json"))
+            self.assertEqual(tickets[0]["full_json"], "{}")
+
+            results = json.loads(search_tickets(project_name, "legacy one", "status = 'Done'", top_n=5))
+            self.assertEqual([r["ticket_id"] for r in results], ["OLD-2"])
+            results = json.loads(search_tickets(project_name, "legacy one", top_n=1))
+            self.assertEqual(len(results), 1)
+            self.assertIsNotNone(results[0]["distance"])
+        finally:
+            del_project_db(project_name)
+
+    def test_full_json_is_compressed_and_loaded_on_request(self):
+        project_name = "test_json_project"
+        result = init_project_db(project_name)
+        self.assertIn("Succ", result)
+        os.environ["JSON_DICT_MIN_SAMPLES"] = "2"
+        try:
+            tickets = [json.dumps({"ticket_id": f"JSN-{i}", "summary": f"Ticket {i}", "description": "Compressed JSON.",
+                                   "status": "Open", "priority": "Medium"}) for i in range(3)]
+            upsert_tickets(project_name, tickets)
+
+            results = json.loads(search_tickets(project_name, "ticket", top_n=3))
+            self.assertNotIn("full_json", results[0])
+            results = json.loads(search_tickets(project_name, "ticket", top_n=3, fields="summary,full_json"))
+            self.assertEqual(json.loads(results[0]["full_json"])["ticket_id"], results[0]["ticket_id"])
+            tickets = json.loads(lookup_tickets(project_name, ["JSN-2"], ["full_json"]))
+            self.assertEqual(json.loads(tickets[0]["full_json"])["summary"], "Ticket 2")
+
+            with db_pool.connection(project_name) as conn:
+                dict_ids = {dict_id for dict_id, in conn.execute("SELECT dict_id FROM jira_ticket_json")}
+                self.assertEqual(dict_ids, {1})
+        finally:
+            del os.environ["JSON_DICT_MIN_SAMPLES"]
+            del_project_db(project_name)
+
+    def test_full_json_column_is_migrated(self):
+        project_name = "test_json_migrate_project"
+        result = init_project_db(project_name)
+        self.assertIn("Succ", result)
+        try:
+            upsert_tickets(project_name, ['{"ticket_id": "COL-1", "summary": "First", "description": "First ticket."}'])
+            db_pool.evict(project_name)
+
+            # Schema used while full_json was a column of jira_tickets
+            db_path = os.path.join(os.getenv("DB_DIR", "databases"), f"{project_name}.db")
+            conn = sqlite3.connect(db_path)
+            conn.execute("ALTER TABLE jira_tickets ADD COLUMN full_json TEXT")
+            conn.execute("UPDATE jira_tickets SET full_json = '{\"ticket_id\": \"COL-1\", \"legacy\": true}'")
+            conn.execute("DROP TABLE jira_ticket_json")
+            conn.execute("DROP TABLE jira_json_dicts")
+            conn.commit()
+            conn.close()
+
+            tickets = json.loads(lookup_tickets(project_name, ["COL-1"], "summary,full_json"))
+            self.assertEqual(tickets, [{"ticket_id": "COL-1", "summary": "First", "full_json": '{"ticket_id": "COL-1", "legacy": true}'}])
+            with db_pool.connection(project_name) as conn:
+                columns = [column[1] for column in conn.execute("PRAGMA table_info(jira_tickets)")]
+                self.assertNotIn("full_json", columns)
+        finally:
+            del_project_db(project_name)
+
+    def test_compact_vectors_are_rescored(self):
+        rng = np.random.RandomState(0)
+        vectors = rng.standard_normal((50, 384)).astype(np.float32)
+        tickets = [parse_ticket(json.dumps({"ticket_id": f"VEC-{i}", "summary": f"Ticket {i}", "status": "Open" if i % 2 else "Done"}))
+                   for i in range(50)]
+        query = (vectors[7] + 0.1 * rng.standard_normal(384)).tolist()
+        exact = sorted(range(50), key=lambda i: np.linalg.norm(vectors[i] - query))[:5]
+
+        for vector_type, dims in [("int8", 384), ("bit", 384), ("float", 128), ("int8", 128)]:
+            project_name = f"test_vec_{vector_type}_{dims}"
+            result = init_project_db(project_name, vector_type, dims)
+            self.assertIn("Succ", result)
+            try:
+                with db_pool.connection(project_name) as conn:
+                    written, errors = insert_tickets(conn, tickets, vectors.tolist())
+                    self.assertEqual((written, errors), (50, []))
+                    options = {"type": vector_type, "dims": dims, "seed": int(get_project_meta(project_name, "vector_seed"))}
+                    results = vector_search(conn, query, "", [], 5, options=options)
+                    self.assertEqual(results[0]["ticket_id"], "VEC-7")
+                    # Distances come from the full vectors
+                    self.assertAlmostEqual(results[0]["distance"], float(np.linalg.norm(vectors[7] - query)), places=3)
+                    self.assertGreaterEqual(len({r["ticket_id"] for r in results} & {f"VEC-{i}" for i in exact}), 4)
+
+                    results = vector_search(conn, query, "t.status = ?", ["Done"], 3, options=options)
+                    self.assertTrue(all(int(r["ticket_id"][4:]) % 2 == 0 for r in results))
+
+                    conn.execute("BEGIN IMMEDIATE")
+                    delete_tickets(conn, [8])
+                    conn.commit()
+                    count, = conn.execute("SELECT COUNT(*) FROM jira_embeddings").fetchone()
+                    self.assertEqual(count, 49)
+            finally:
+                del_project_db(project_name)
+
+        self.assertIn("Err022", init_project_db("test_vec_invalid", "bit", 100))
+
+    def test_numpy_search_backend(self):
+        self.check_search_backend("numpy")
+
+    def test_ivf_search_backend(self):
+        # Trains on the 50 tickets, and probes every cluster so the results are exact
+        with patch.dict(os.environ, {"IVF_MIN_TRAIN": "20", "IVF_PROBES": "1000"}):
+            self.check_search_backend("ivf")
+
+    def check_search_backend(self, backend: str):
+        rng = np.random.RandomState(0)
+        vectors = rng.standard_normal((50, 384)).astype(np.float32)
+        tickets = [parse_ticket(json.dumps({"ticket_id": f"NPY-{i}", "summary": f"Ticket {i}", "status": "Open" if i % 2 else "Done"}))
+                   for i in range(50)]
+        query = (vectors[7] + 0.1 * rng.standard_normal(384)).tolist()
+        project_name = f"test_{backend}_backend"
+        db_dir = os.getenv("DB_DIR", "databases")
+        self.assertIn("Succ", init_project_db(project_name, search_backend=backend))
+        try:
+            with db_pool.connection(project_name) as conn:
+                self.assertEqual(insert_tickets(conn, tickets, vectors.tolist()), (50, []))
+                index = vector_index(conn, project_name)
+                self.assertEqual(len(index), 50)
+                self.assertTrue(os.path.exists(os.path.join(db_dir, f"{project_name}.vec.npy")))
+
+                # Same ranking and distances as sqlite-vec
+                for where, params in [("", []), ("t.status = ?", ["Done"])]:
+                    expected = vector_search(conn, query, where, params, 5)
+                    results = vector_search(conn, query, where, params, 5, index=index)
+                    self.assertEqual([r["ticket_id"] for r in results], [r["ticket_id"] for r in expected])
+                    for result, other in zip(results, expected):
+                        self.assertAlmostEqual(result["distance"], other["distance"], places=3)
+
+                # Deletes reach the index through the change log, which is pruned
+                conn.execute("BEGIN IMMEDIATE")
+                delete_tickets(conn, [8])
+                conn.commit()
+                index = vector_index(conn, project_name)
+                self.assertEqual(len(index), 49)
+                self.assertNotIn("NPY-7", [r["ticket_id"] for r in vector_search(conn, query, "", [], 5, index=index)])
+                self.assertEqual(conn.execute("SELECT COUNT(*) FROM jira_changes").fetchone()[0], 0)
+
+            batches = json.loads(search_tickets_batch(project_name, ["first prompt", "second prompt"], 3, fields="ticket_id"))
+            self.assertEqual([len(results) for results in batches], [3, 3])
+            self.assertEqual(set(batches[0][0]), {"ticket_id"})
+
+            self.assertIn("Succ", set_search_backend(project_name, "vec0"))
+            self.assertFalse(os.path.exists(os.path.join(db_dir, f"{project_name}.vec.npy")))
+            with db_pool.connection(project_name) as conn:
+                self.assertIsNone(vector_index(conn, project_name))
+            self.assertIn("Err023", set_search_backend(project_name, "faiss"))
+        finally:
+            del_project_db(project_name)
+        self.assertFalse(os.path.exists(os.path.join(db_dir, f"{project_name}.vec.npy")))
 
 if __name__ == "__main__":
     try:
@@ -0,0 +1,29 @@
+import unittest
+import logging
+from util import init_logger, prefetch
+
+class TestUtilFeatures(unittest.TestCase):
+
+    def test_prefetch_keeps_order(self):
+        self.assertEqual(list(prefetch(iter(range(10)), depth=2)), list(range(10)))
+
+    def test_prefetch_reraises_errors(self):
+        def pages():
+            yield [1, 2]
+            raise RuntimeError("Err109: page failed")
+
+        consumed = []
+        with self.assertRaises(RuntimeError):
+            for page in prefetch(pages()):
+                consumed.append(page)
+        self.assertEqual(consumed, [[1, 2]])
+
+if __name__ == "__main__":
+    try:
+        init_logger()  # Initialize the logger
+
+        unittest.main()
+
+    except Exception as e:
+        # Log the error
+        logging.error(f"Test failed: {e}")
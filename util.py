@@ -1,5 +1,7 @@
 import logging
 import os
+import queue
+import threading
 from logging.handlers import RotatingFileHandler
 from dotenv import load_dotenv
 
@@ -26,3 +28,66 @@ def init_logger():
             logging.StreamHandler(),
         ]
     )
+
+_startup_timings = {}
+_startup_lock = threading.Lock()
+
+def record_startup(name: str, seconds: float):
+    """
+    Record how long a startup step took. Only the first measurement of a step is kept.
+    """
+    with _startup_lock:
+        _startup_timings.setdefault(name, round(seconds, 3))
+
+def startup_report() -> dict:
+    """
+    Return the recorded startup steps and their durations in seconds.
+    """
+    with _startup_lock:
+        return dict(_startup_timings)
+
+def jira_extra_fields() -> list:
+    """
+    Return the extra JIRA fields configured in JIRA_EXTRA_FIELDS (comma separated).
+    """
+    return [field.strip() for field in os.getenv("JIRA_EXTRA_FIELDS", "").split(",") if field.strip()]
+
+def prefetch(iterable, depth: int = 1):
+    """
+    Iterate over iterable in a background thread, keeping up to depth items ready.
+
+    This lets the consumer work on one item while the next one is being produced.
+    An exception raised by the iterable is re-raised in the consumer.
+    """
+    items = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+
+    def put(entry):
+        while not stop.is_set():
+            try:
+                items.put(entry, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for item in iterable:
+                if not put(("item", item)):
+                    return
+            put(("done", None))
+        except BaseException as e:
+            put(("error", e))
+
+    threading.Thread(target=produce, name="prefetch", daemon=True).start()
+    try:
+        while True:
+            kind, value = items.get()
+            if kind == "done":
+                return
+            if kind == "error":
+                raise value
+            yield value
+    finally:
+        stop.set()